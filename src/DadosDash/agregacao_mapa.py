@@ -0,0 +1,93 @@
+# agregacao_mapa.py
+"""
+Preparação dos pontos do mapa de cidades.
+
+Abaixo de um limite de linhas, cada contrato vira um ponto; acima dele, os
+contratos são agregados em um ponto por município, com a contagem total, a cor
+do concorrente com mais contratos e o detalhamento por concorrente no hover.
+Assim a figura nunca passa do número de municípios, qualquer que seja o número
+de contratos ou de concorrentes. Pontos na mesma coordenada são espalhados em uma
+espiral determinística (ângulo áureo), em vez de um sorteio, para que a mesma
+entrada gere sempre a mesma figura (e possa ser reaproveitada do cache).
+"""
+import numpy as np
+import pandas as pd
+
+# Acima dessa quantidade de contratos filtrados, o mapa mostra pontos agregados
+LIMITE_PONTOS_INDIVIDUAIS = 5000
+
+# Concorrentes listados no hover de um ponto agregado; os demais somam em "Outros"
+MAX_CONCORRENTES_DETALHE = 5
+
+# Raio (em graus) do círculo em que os pontos de uma mesma coordenada são espalhados
+RAIO_ESPALHAMENTO = 0.040
+
+ANGULO_AUREO = np.pi * (3 - np.sqrt(5))
+
+
+def espalhar_coincidentes(df, raio=RAIO_ESPALHAMENTO):
+    """
+    Retorna `df` com as linhas de mesma latitude/longitude distribuídas em uma
+    espiral de raio `raio` em torno da coordenada original. Linhas com coordenada
+    única não são deslocadas; `df` não é alterado.
+    """
+    grupos = df.groupby(['latitude', 'longitude'], sort=False)
+    ordem = grupos.cumcount().to_numpy()
+    tamanho = grupos['latitude'].transform('size').to_numpy()
+    coincidentes = tamanho > 1
+    if not coincidentes.any():
+        return df
+
+    # Espiral de Vogel: a k-ésima linha do grupo fica no ângulo k * ângulo áureo,
+    # a uma distância que cresce com a raiz de k (preenche o círculo de modo uniforme)
+    distancia = np.where(coincidentes, raio * np.sqrt((ordem + 0.5) / tamanho), 0.0)
+    angulo = ordem * ANGULO_AUREO
+    return df.assign(
+        latitude=df['latitude'].to_numpy(dtype=float) + distancia * np.sin(angulo),
+        longitude=df['longitude'].to_numpy(dtype=float) + distancia * np.cos(angulo)
+    )
+
+
+def agregar_por_municipio(df, max_detalhe=MAX_CONCORRENTES_DETALHE):
+    """
+    Um ponto por município: 'contagem' com o total de contratos, 'concorrente' com
+    o concorrente que tem mais contratos ali (define a cor), 'concorrentes' com a
+    quantidade de concorrentes distintos e 'detalhe' com as contagens dos
+    `max_detalhe` maiores (o restante somado em "Outros"), já formatado para o hover.
+    """
+    contagens = (
+        df.groupby(['codigo_ibge', 'concorrente'], sort=False, observed=True).size()
+        .reset_index(name='contagem')
+        .sort_values(['codigo_ibge', 'contagem'], ascending=[True, False], kind='stable')
+    )
+    posicao = contagens.groupby('codigo_ibge', sort=False).cumcount()
+    principais = contagens[posicao < max_detalhe]
+    linhas = principais['concorrente'].astype(str) + ': ' + principais['contagem'].astype(str)
+
+    por_municipio = contagens.groupby('codigo_ibge', sort=False)
+    df_agregado = df.groupby('codigo_ibge', sort=False).agg(
+        municipio=('municipio', 'first'), latitude=('latitude', 'first'), longitude=('longitude', 'first')
+    ).join(pd.DataFrame({
+        'concorrente': por_municipio['concorrente'].first(),
+        'contagem': por_municipio['contagem'].sum(),
+        'concorrentes': por_municipio.size(),
+        'detalhe': linhas.groupby(principais['codigo_ibge'], sort=False).agg('<br>'.join)
+    }))
+
+    outros = df_agregado['contagem'] - principais.groupby('codigo_ibge')['contagem'].sum().reindex(df_agregado.index)
+    com_outros = outros > 0
+    df_agregado.loc[com_outros, 'detalhe'] += '<br>Outros: ' + outros[com_outros].astype(str)
+
+    df_agregado = df_agregado.reset_index()
+    return df_agregado[['codigo_ibge', 'municipio', 'concorrente', 'latitude', 'longitude',
+                        'contagem', 'concorrentes', 'detalhe']]
+
+
+def preparar_pontos(df, limite=LIMITE_PONTOS_INDIVIDUAIS):
+    """
+    Retorna (df_pontos, agregado): os pontos prontos para o scatter, já espalhados,
+    e se eles representam contratos individuais (False) ou um ponto por município (True).
+    """
+    agregado = len(df) > limite
+    df_pontos = agregar_por_municipio(df) if agregado else df
+    return espalhar_coincidentes(df_pontos), agregado
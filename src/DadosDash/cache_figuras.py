@@ -0,0 +1,149 @@
+# cache_figuras.py
+"""
+Cache das figuras do dashboard.
+
+A chave de cada figura combina o nome da figura, as entradas do callback
+normalizadas (listas ordenadas, listas vazias iguais a None) e a versão do
+artefato de dados, então uma nova versão dos dados nunca reaproveita figuras
+antigas. Backends:
+- 'memoria': dicionário LRU no próprio processo (protegido por lock, já que o
+  servidor atende callbacks em várias threads);
+- 'arquivo': JSON comprimido em uma pasta compartilhada entre os workers, com
+  remoção das entradas menos usadas (LRU pelo horário de acesso);
+- 'desativado': sempre recalcula.
+"""
+import functools
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import plotly.io as pio
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DadosETL'))
+
+from cache_sidra import limitar_tamanho  # noqa: E402
+
+CACHE_FIGURAS = {
+    'backend': os.getenv('DASHBOARD_CACHE_FIGURAS', 'memoria'),
+    'max_itens': 256, # backend 'memoria': acima disso, remove a figura usada há mais tempo
+    'diretorio': os.getenv('DASHBOARD_CACHE_DIR', '.cache_figuras'), # backend 'arquivo'
+    'tamanho_max_mb': 200 # backend 'arquivo': acima disso, remove as entradas menos usadas (LRU)
+}
+
+EXTENSAO = '.json.gz'
+
+# Chave -> figura, da menos para a mais usada recentemente (backend 'memoria')
+_MEMORIA = OrderedDict()
+_TRAVA_MEMORIA = threading.Lock()
+
+
+def _normalizar_entrada(valor):
+    if isinstance(valor, (list, tuple, set)):
+        return sorted(valor) or None
+    return valor
+
+
+def chave_figura(nome, versao, entradas):
+    """Gera a chave da figura a partir do nome, da versão dos dados e das entradas do callback."""
+    identificacao = {
+        'figura': nome,
+        'versao': versao,
+        'entradas': [_normalizar_entrada(v) for v in entradas]
+    }
+    conteudo = json.dumps(identificacao, sort_keys=True, default=str)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+# --- Backend 'memoria' ---
+def _ler_memoria(chave, params):
+    with _TRAVA_MEMORIA:
+        if chave not in _MEMORIA:
+            return None
+        _MEMORIA.move_to_end(chave)
+        return _MEMORIA[chave]
+
+
+def _gravar_memoria(chave, figura, params):
+    with _TRAVA_MEMORIA:
+        _MEMORIA[chave] = figura
+        _MEMORIA.move_to_end(chave)
+        while len(_MEMORIA) > params.get('max_itens', 256):
+            _MEMORIA.popitem(last=False)
+
+
+# --- Backend 'arquivo' ---
+def _caminho(chave, params):
+    return os.path.join(params['diretorio'], chave + EXTENSAO)
+
+
+def _ler_arquivo(chave, params):
+    caminho = _caminho(chave, params)
+    try:
+        with gzip.open(caminho, 'rt', encoding='utf-8') as f:
+            figura = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Aviso: entrada de cache ilegível ({caminho}): {e}")
+        return None
+
+    # Marca o último uso no horário de acesso (LRU)
+    try:
+        os.utime(caminho, None)
+    except FileNotFoundError:
+        pass
+    return figura
+
+
+def _gravar_arquivo(chave, figura, params):
+    os.makedirs(params['diretorio'], exist_ok=True)
+    caminho = _caminho(chave, params)
+    temporario = f"{caminho}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+    conteudo = figura if isinstance(figura, dict) else json.loads(pio.to_json(figura, validate=False))
+    with gzip.open(temporario, 'wt', encoding='utf-8') as f:
+        json.dump(conteudo, f)
+    os.replace(temporario, caminho)
+
+    limitar_tamanho(params, EXTENSAO)
+
+
+# Backend -> (leitura, gravação)
+BACKENDS = {
+    'memoria': (_ler_memoria, _gravar_memoria),
+    'arquivo': (_ler_arquivo, _gravar_arquivo)
+}
+
+
+def limpar():
+    """Esvazia o cache em memória (o backend 'arquivo' é invalidado pela versão dos dados)."""
+    with _TRAVA_MEMORIA:
+        _MEMORIA.clear()
+
+
+def memorizar(nome, versao, params=None):
+    """
+    Decorador que guarda em cache a figura retornada pela função, pela chave
+    (`nome`, `versao()`, argumentos). `versao` é uma função sem argumentos que
+    retorna a versão atual dos dados.
+    """
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envoltorio(*entradas):
+            config = params or CACHE_FIGURAS
+            if config.get('backend') not in BACKENDS:
+                return funcao(*entradas)
+
+            ler, gravar = BACKENDS[config['backend']]
+            chave = chave_figura(nome, versao(), entradas)
+            figura = ler(chave, config)
+            if figura is None:
+                figura = funcao(*entradas)
+                gravar(chave, figura, config)
+            return figura
+        return envoltorio
+    return decorador
@@ -0,0 +1,329 @@
+# dados_dashboard.py
+"""
+Preparação dos dados do dashboard e artefato pré-calculado em disco.
+
+O script monta, a partir dos CSVs, as tabelas usadas pelo app (mapa, população por
+estado e por município) e as grava em Feather sem compressão, cada tabela em um
+único bloco. O app apenas mapeia esses arquivos em memória no primeiro acesso, sem
+refazer merges e melts em cada worker: as colunas numéricas e os textos continuam
+apontando para o arquivo mapeado (páginas compartilhadas entre os workers pelo
+cache do sistema), e só o que o pandas precisa converter vai para a memória do
+processo.
+
+Uso (a partir de src/DadosDash/): python dados_dashboard.py
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import filtros_mapa
+import resolucao_municipios as resolucao
+
+MAPA_CODIGO_UF = {
+    11: 'RO', 12: 'AC', 13: 'AM', 14: 'RR', 15: 'PA', 16: 'AP', 17: 'TO', 21: 'MA',
+    22: 'PI', 23: 'CE', 24: 'RN', 25: 'PB', 26: 'PE', 27: 'AL', 28: 'SE', 29: 'BA',
+    31: 'MG', 32: 'ES', 33: 'RJ', 35: 'SP', 41: 'PR', 42: 'SC', 43: 'RS', 50: 'MS',
+    51: 'MT', 52: 'GO', 53: 'DF'
+}
+
+FAIXAS_ETARIAS_MAP = {
+    'pop_0_14':     '0 a 14 anos',
+    'pop_15_19':    '15 a 19 anos',
+    'pop_20_29':    '20 a 29 anos',
+    'pop_30_39':    '30 a 39 anos',
+    'pop_40_49':    '40 a 49 anos',
+    'pop_50_59':    '50 a 59 anos',
+    'pop_60_74':    '60 a 74 anos',
+    'pop_75_99':    '75 a 99 anos',
+    'pop_100_mais': '100+ anos'
+}
+
+# Resoluções nome -> código IBGE já feitas, reaproveitadas entre execuções
+CACHE_RESOLUCAO = 'resolucao_municipios.json'
+
+# Pasta do artefato pré-calculado e o arquivo com a sua versão
+PASTA_ARTEFATO = os.getenv('DASHBOARD_ARTEFATO', 'dados_dashboard')
+ARQUIVO_VERSAO = 'versao.json'
+
+# Entradas lidas por montar_tabelas; sem artefato, a versão dos dados sai do tamanho e da data delas
+ARQUIVOS_ENTRADA = ['municipios.csv', 'empresas.csv', 'estados.csv',
+                    'populacao_ibge.feather', 'populacao_ibge.parquet', 'populacao_ibge.csv']
+
+# Tabela do artefato -> colunas pelas quais ela é ordenada (linhas do mesmo filtro ficam contíguas).
+# O mapa mantém a ordem original: o plotly atribui as cores dos concorrentes pela ordem de aparição.
+TABELAS = {
+    'mapa': [],
+    'pop_estado': ['uf'],
+    'pop_municipio': ['codigo_ibge'],
+    'estados': ['uf'],
+    'empresas': []
+}
+
+# Colunas de texto com poucos valores distintos, gravadas como categoria
+COLUNAS_CATEGORIA = ['uf', 'tipo_estabelecimento', 'concorrente', 'status', 'faixa_etaria']
+
+# Na leitura do artefato, textos viram strings do pandas apoiadas no próprio buffer
+# do Arrow (sem criar um objeto Python por célula)
+TIPOS_ARROW = {pa.string(): pd.StringDtype('pyarrow'), pa.large_string(): pd.StringDtype('pyarrow')}
+
+
+# --- Funções de Preparação de Dados ---
+def carregar_populacao(caminho_base='populacao_ibge'):
+    """
+    Carrega a população exportada pelo ETL, preferindo os formatos colunares.
+    O Feather é mapeado em memória; o CSV fica como alternativa.
+    """
+    if os.path.exists(f'{caminho_base}.feather'):
+        return feather.read_table(f'{caminho_base}.feather', memory_map=True).to_pandas(split_blocks=True, self_destruct=True)
+    if os.path.exists(f'{caminho_base}.parquet'):
+        return pd.read_parquet(f'{caminho_base}.parquet')
+    return pd.read_csv(f'{caminho_base}.csv', sep=';', dtype={'uf': 'category'})
+
+def carregar_dados_csv():
+    try:
+        df_municipios = pd.read_csv('municipios.csv')
+        df_empresas = pd.read_csv('empresas.csv', sep=';')
+        df_estados = pd.read_csv('estados.csv')
+        df_pop_raw = carregar_populacao()
+        return df_municipios, df_empresas, df_estados, df_pop_raw
+    except FileNotFoundError as e:
+        print(f"ERRO: Arquivo não encontrado. {e}")
+        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+
+# def carregar_dados_db():
+#     try:
+#         con = 'BD'
+#         df_municipios = pd.read_sql('SELECT * FROM municipios', con)
+#         df_empresas = pd.read_sql('SELECT * FROM empresas', con)
+#         df_estados = pd.read_sql('SELECT * FROM estados', con)
+#         df_pop_raw = pd.read_sql('SELECT * FROM populacao_ibge', con)
+#         con.close()
+
+#         return df_municipios, df_empresas, df_estados, df_pop_raw
+#     except Exception as e:
+#         print(f"ERRO: Falha ao conectar ou ler o banco de dados. {e}")
+#         return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+
+def preparar_dados(df_municipios, df_empresas, df_estados, df_pop_raw):
+    """
+    Processa e integra os DataFrames brutos para gerar os dados finais para os gráficos.
+    Retorna os DataFrames processados para o mapa e para os gráficos de população.
+    """
+    if any(df.empty for df in [df_municipios, df_empresas, df_estados, df_pop_raw]):
+        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+
+    # Mapear UFs e montar o índice de resolução de nomes de municípios
+    df_municipios['uf'] = df_municipios['codigo_uf'].map(MAPA_CODIGO_UF)
+    indice_municipios = resolucao.construir_indice(df_municipios)
+
+    # Preparar dados de população por ESTADO
+    df_pop_estado = df_pop_raw.groupby('uf', observed=True).sum(numeric_only=True)
+    df_pop_final_estado = df_pop_estado[list(FAIXAS_ETARIAS_MAP.keys())].reset_index()
+    df_pop_plot_estado = df_pop_final_estado.melt(id_vars='uf', var_name='faixa_etaria', value_name='populacao')
+    df_pop_plot_estado['faixa_etaria'] = df_pop_plot_estado['faixa_etaria'].replace(FAIXAS_ETARIAS_MAP)
+
+    # Preparar dados de população por MUNICÍPIO
+    # Arquivos gerados pelo ETL já trazem o código IBGE; os antigos são resolvidos pelo nome
+    if 'codigo_ibge' in df_pop_raw.columns:
+        df_pop_municipio = df_pop_raw
+    else:
+        df_pop_municipio = df_pop_raw.assign(codigo_ibge=resolucao.resolver_municipios(
+            df_pop_raw['municipio'], df_pop_raw['uf'], indice_municipios, CACHE_RESOLUCAO
+        )['codigo_ibge'])
+    colunas_pop_melt = ['codigo_ibge', 'municipio', 'pop_total'] + list(FAIXAS_ETARIAS_MAP.keys())
+    df_pop_plot_municipio = df_pop_municipio[colunas_pop_melt].melt(
+        id_vars=['codigo_ibge', 'municipio'], var_name='faixa_etaria', value_name='populacao'
+    )
+    df_pop_plot_municipio['faixa_etaria'] = df_pop_plot_municipio['faixa_etaria'].replace(FAIXAS_ETARIAS_MAP)
+
+    # Criar DataFrame principal para o mapa
+    # Sem código IBGE, os nomes dos contratos são resolvidos (exato -> normalizado -> aproximado)
+    if 'codigo_ibge' not in df_empresas.columns:
+        df_empresas = df_empresas.assign(codigo_ibge=resolucao.resolver_municipios(
+            df_empresas['municipio'], df_empresas['uf'], indice_municipios, CACHE_RESOLUCAO
+        )['codigo_ibge'])
+    df_mapa = pd.merge(
+        df_empresas,
+        df_municipios.drop(columns=['uf']),
+        on='codigo_ibge',
+        how='left'
+    )
+    df_mapa.dropna(subset=['latitude', 'longitude', 'uf', 'codigo_ibge'], inplace=True)
+
+    return df_mapa, df_pop_plot_estado, df_pop_plot_municipio, df_estados
+
+
+# --- Artefato pré-calculado ---
+def montar_tabelas():
+    """Lê os CSVs e retorna {nome da tabela: DataFrame} com todas as tabelas do artefato."""
+    df_municipios_raw, df_empresas_raw, df_estados_raw, df_pop_raw = carregar_dados_csv()
+    df_mapa, df_pop_plot_estado, df_pop_plot_municipio, df_estados = preparar_dados(
+        df_municipios_raw, df_empresas_raw, df_estados_raw, df_pop_raw
+    )
+    return {
+        'mapa': df_mapa,
+        'pop_estado': df_pop_plot_estado,
+        'pop_municipio': df_pop_plot_municipio,
+        'estados': df_estados,
+        'empresas': df_empresas_raw
+    }
+
+
+def _compactar(df, ordenacao):
+    """Ordena pelas colunas de filtro e converte os textos repetitivos em categoria."""
+    ordenacao = [col for col in ordenacao if col in df.columns]
+    if ordenacao:
+        df = df.sort_values(ordenacao, kind='stable')
+    tipos = {col: 'category' for col in COLUNAS_CATEGORIA if col in df.columns}
+    # Inteiros anuláveis sem nulos voltam a int64: o Int64 não é lido do Feather sem cópia
+    tipos.update({
+        col: 'int64' for col in df.columns
+        if isinstance(df[col].dtype, pd.Int64Dtype) and not df[col].isna().any()
+    })
+    return df.astype(tipos).reset_index(drop=True)
+
+
+def _umask_atual():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def construir_artefato(pasta=PASTA_ARTEFATO):
+    """
+    Gera o artefato do dashboard: um Feather sem compressão por tabela e um
+    'versao.json' com o hash do conteúdo. Os arquivos são gravados em uma pasta
+    temporária e trocados de uma vez, então o app nunca lê um artefato pela metade.
+    Retorna a versão gerada.
+    """
+    tabelas = montar_tabelas()
+    if any(df.empty for nome, df in tabelas.items() if nome != 'empresas'):
+        raise ValueError("Não foi possível montar os dados do dashboard: algum arquivo de entrada está vazio ou ausente.")
+
+    pasta = os.path.abspath(pasta)
+    temporaria = tempfile.mkdtemp(dir=os.path.dirname(pasta))
+    try:
+        hash_conteudo = hashlib.sha256()
+        for nome, ordenacao in TABELAS.items():
+            caminho = os.path.join(temporaria, f'{nome}.feather')
+            # Sem compressão e em um só bloco, as colunas são lidas direto do arquivo mapeado
+            df = _compactar(tabelas[nome], ordenacao)
+            feather.write_feather(df, caminho, compression='uncompressed', chunksize=max(len(df), 1))
+            with open(caminho, 'rb') as f:
+                hash_conteudo.update(hashlib.file_digest(f, 'sha256').digest())
+
+        versao = hash_conteudo.hexdigest()[:16]
+        with open(os.path.join(temporaria, ARQUIVO_VERSAO), 'w', encoding='utf-8') as f:
+            json.dump({'versao': versao, 'gerado_em': datetime.now().isoformat(timespec='seconds')}, f)
+
+        # mkdtemp cria a pasta só para o dono (0700); o artefato publicado segue a umask, como uma pasta comum
+        os.chmod(temporaria, 0o777 & ~_umask_atual())
+        antiga = f'{pasta}.antigo'
+        # Sobra de uma troca interrompida impediria a renomeação do artefato atual
+        shutil.rmtree(antiga, ignore_errors=True)
+        if os.path.exists(pasta):
+            os.replace(pasta, antiga)
+        os.replace(temporaria, pasta)
+        shutil.rmtree(antiga, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(temporaria, ignore_errors=True)
+        raise
+
+    print(f"Artefato do dashboard gerado em '{pasta}' (versão {versao}).")
+    return versao
+
+
+def _carregar_artefato(pasta):
+    dados = {}
+    for nome in TABELAS:
+        tabela = feather.read_table(os.path.join(pasta, f'{nome}.feather'), memory_map=True)
+        # split_blocks não consolida as colunas em blocos 2D (o que copiaria tudo para o heap)
+        dados[nome] = tabela.to_pandas(split_blocks=True, self_destruct=True, types_mapper=TIPOS_ARROW.get)
+    with open(os.path.join(pasta, ARQUIVO_VERSAO), encoding='utf-8') as f:
+        dados['versao'] = json.load(f)['versao']
+    return dados
+
+
+# Dados carregados por pasta do artefato: {pasta: (assinatura, dados)}; índices de filtros: {pasta: (dados, índice)}
+_DADOS = {}
+_INDICES = {}
+_TRAVA_DADOS = threading.Lock()
+
+
+def _estado_arquivo(caminho):
+    try:
+        info = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+    return [info.st_ino, info.st_size, info.st_mtime_ns]
+
+
+def _assinatura(pasta):
+    """
+    O que identifica os dados disponíveis agora: o 'versao.json' do artefato
+    (substituído a cada geração) ou, sem artefato, os arquivos de entrada.
+    """
+    versao = _estado_arquivo(os.path.join(pasta, ARQUIVO_VERSAO))
+    if versao is not None:
+        return ('artefato', versao)
+    return ('csv', [_estado_arquivo(caminho) for caminho in ARQUIVOS_ENTRADA])
+
+
+def obter_dados(pasta=PASTA_ARTEFATO):
+    """
+    Retorna as tabelas do dashboard ('mapa', 'pop_estado', 'pop_municipio',
+    'estados', 'empresas') e a 'versao' dos dados.
+
+    Usa o artefato pré-calculado quando ele existe; caso contrário, monta as
+    tabelas a partir dos CSVs, como antes. Os dados ficam em memória até o
+    artefato ser gerado de novo (ou, sem ele, até algum CSV mudar): cada
+    chamada confere só a data e o tamanho dos arquivos.
+    """
+    assinatura = _assinatura(pasta)
+    with _TRAVA_DADOS:
+        carregado = _DADOS.get(pasta)
+        if carregado is not None and carregado[0] == assinatura:
+            return carregado[1]
+
+        if assinatura[0] == 'artefato':
+            dados = _carregar_artefato(pasta)
+        else:
+            print(f"Aviso: artefato '{pasta}' não encontrado; preparando os dados a partir dos CSVs.")
+            dados = {nome: _compactar(df, TABELAS[nome]) for nome, df in montar_tabelas().items()}
+            dados['versao'] = 'csv-' + hashlib.sha256(json.dumps(assinatura).encode('utf-8')).hexdigest()[:16]
+        _DADOS[pasta] = (assinatura, dados)
+        return dados
+
+
+def obter_indice_filtros(pasta=PASTA_ARTEFATO):
+    """Índice de filtros (bitmaps por valor) da tabela do mapa, reconstruído quando os dados mudam."""
+    dados = obter_dados(pasta)
+    with _TRAVA_DADOS:
+        carregado = _INDICES.get(pasta)
+        if carregado is None or carregado[0] is not dados:
+            carregado = (dados, filtros_mapa.construir_indice_filtros(dados['mapa']))
+            _INDICES[pasta] = carregado
+        return carregado[1]
+
+
+def limpar_cache():
+    """Descarta os dados e índices em memória (a próxima chamada os carrega de novo)."""
+    with _TRAVA_DADOS:
+        _DADOS.clear()
+        _INDICES.clear()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Gera o artefato pré-calculado do dashboard.")
+    parser.add_argument('--pasta', default=PASTA_ARTEFATO, help="Pasta de saída do artefato.")
+    args = parser.parse_args()
+    construir_artefato(args.pasta)
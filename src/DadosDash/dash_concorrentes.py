@@ -1,30 +1,17 @@
-import pandas as pd
+import os
 import dash
+import flask
 from dash import dcc, html, Input, Output, State
 import plotly.express as px
-import unicodedata
-import numpy as np 
-
-MAPA_CODIGO_UF = {
-    11: 'RO', 12: 'AC', 13: 'AM', 14: 'RR', 15: 'PA', 16: 'AP', 17: 'TO', 21: 'MA',
-    22: 'PI', 23: 'CE', 24: 'RN', 25: 'PB', 26: 'PE', 27: 'AL', 28: 'SE', 29: 'BA',
-    31: 'MG', 32: 'ES', 33: 'RJ', 35: 'SP', 41: 'PR', 42: 'SC', 43: 'RS', 50: 'MS',
-    51: 'MT', 52: 'GO', 53: 'DF'
-}
 
-FAIXAS_ETARIAS_MAP = {
-    'pop_0_14':     '0 a 14 anos',
-    'pop_15_19':    '15 a 19 anos',
-    'pop_20_29':    '20 a 29 anos',
-    'pop_30_39':    '30 a 39 anos',
-    'pop_40_49':    '40 a 49 anos',
-    'pop_50_59':    '50 a 59 anos',
-    'pop_60_74':    '60 a 74 anos',
-    'pop_75_99':    '75 a 99 anos',
-    'pop_100_mais': '100+ anos'
-}
+import agregacao_mapa
+import cache_figuras
+import dados_dashboard as dados
+import filtros_mapa
+import geometrias
 
-GEOJSON_URL = "https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/brazil-states.geojson"
+# Nível de detalhe das fronteiras no mapa de estados (ver geometrias.py)
+NIVEL_GEOMETRIA = os.getenv('DASHBOARD_NIVEL_GEOMETRIA', geometrias.NIVEL_PADRAO)
 
 COLORS = {
     'background': "#AAD3DF",
@@ -33,105 +20,44 @@ COLORS = {
     'bg-bar': "#272727",
 }
 
-# --- Funções de Preparação de Dados ---
-def carregar_dados_csv():
-    try:
-        df_municipios = pd.read_csv('municipios.csv')
-        df_empresas = pd.read_csv('empresas.csv', sep=';')
-        df_estados = pd.read_csv('estados.csv')
-        df_pop_raw = pd.read_csv('populacao_ibge.csv', sep=';')
-        return df_municipios, df_empresas, df_estados, df_pop_raw
-    except FileNotFoundError as e:
-        print(f"ERRO: Arquivo não encontrado. {e}")
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-
-# def carregar_dados_db():
-#     try:
-#         con = 'BD'
-#         df_municipios = pd.read_sql('SELECT * FROM municipios', con)
-#         df_empresas = pd.read_sql('SELECT * FROM empresas', con)
-#         df_estados = pd.read_sql('SELECT * FROM estados', con)
-#         df_pop_raw = pd.read_sql('SELECT * FROM populacao_ibge', con)
-#         con.close()
-        
-#         return df_municipios, df_empresas, df_estados, df_pop_raw
-#     except Exception as e:
-#         print(f"ERRO: Falha ao conectar ou ler o banco de dados. {e}")
-#         return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-
-def normalizar_texto(texto):
-    """
-    Normaliza uma string: remove acentos, converte para minúsculas e remove espaços extras.
-    """
-    if not isinstance(texto, str):
-        return texto
-    texto = texto.lower()
-    return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn').strip()
-
-def preparar_dados(df_municipios, df_empresas, df_estados, df_pop_raw):
-    """
-    Processa e integra os DataFrames brutos para gerar os dados finais para os gráficos.
-    Retorna os DataFrames processados para o mapa e para os gráficos de população.
-    """
-    if any(df.empty for df in [df_municipios, df_empresas, df_estados, df_pop_raw]):
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-
-    # Normalizar textos e mapear UFs
-    df_municipios['uf'] = df_municipios['codigo_uf'].map(MAPA_CODIGO_UF)
-    df_empresas['municipio_normalizado'] = df_empresas['municipio'].apply(normalizar_texto)
-    df_municipios['nome_normalizado'] = df_municipios['nome'].apply(normalizar_texto)
-
-    # Preparar dados de população por ESTADO
-    df_pop_estado = df_pop_raw.groupby('uf').sum(numeric_only=True)
-    df_pop_final_estado = df_pop_estado[list(FAIXAS_ETARIAS_MAP.keys())].reset_index()
-    df_pop_plot_estado = df_pop_final_estado.melt(id_vars='uf', var_name='faixa_etaria', value_name='populacao')
-    df_pop_plot_estado['faixa_etaria'] = df_pop_plot_estado['faixa_etaria'].replace(FAIXAS_ETARIAS_MAP)
-
-    # Preparar dados de população por MUNICÍPIO
-    df_pop_municipio = df_pop_raw.copy()
-    df_pop_municipio['municipio_normalizado'] = df_pop_municipio['municipio'].apply(normalizar_texto)
-    df_pop_municipio = pd.merge(
-        df_pop_municipio,
-        df_municipios[['codigo_ibge', 'nome_normalizado', 'uf']],
-        left_on=['municipio_normalizado', 'uf'],
-        right_on=['nome_normalizado', 'uf'],
-        how='left'
-    )
-    colunas_pop_melt = ['codigo_ibge', 'municipio', 'pop_total'] + list(FAIXAS_ETARIAS_MAP.keys())
-    df_pop_plot_municipio = df_pop_municipio[colunas_pop_melt].melt(
-        id_vars=['codigo_ibge', 'municipio'], var_name='faixa_etaria', value_name='populacao'
-    )
-    df_pop_plot_municipio['faixa_etaria'] = df_pop_plot_municipio['faixa_etaria'].replace(FAIXAS_ETARIAS_MAP)
-
-    # Criar DataFrame principal para o mapa
-    df_mapa = pd.merge(
-        df_empresas,
-        df_municipios,
-        left_on=['municipio_normalizado', 'uf'],
-        right_on=['nome_normalizado', 'uf'],
-        how='left'
-    )
-    df_mapa.dropna(subset=['latitude', 'longitude', 'uf', 'codigo_ibge'], inplace=True)
-
-    return df_mapa, df_pop_plot_estado, df_pop_plot_municipio, df_estados
-
-# --- Carregamento e Preparação Inicial ---
-df_municipios_raw, df_empresas_raw, df_estados_raw, df_pop_raw = carregar_dados_csv()
-# df_municipios_raw, df_empresas_raw, df_estados_raw, df_pop_raw = carregar_dados_db() # Exemplo
-
-df_mapa, df_pop_plot_estado, df_pop_plot_municipio, df_estados = preparar_dados(
-    df_municipios_raw, df_empresas_raw, df_estados_raw, df_pop_raw
-)
-
 # --- Inicialização do App Dash ---
 app = dash.Dash(__name__, suppress_callback_exceptions=True)
 server = app.server # Expor o servidor para a publicação (deploy)
 app.title = 'Distribuição de Concorrentes'
 
 
+# A rota fica sob o prefixo do app; o navegador a acessa pelo caminho relativo (ver url_geometria_estados)
+@server.route(app.config.routes_pathname_prefix + 'geometrias/estados/<nivel>.geojson')
+def servir_geometria_estados(nivel):
+    """Serve o GeoJSON simplificado dos estados, com cache no navegador."""
+    if nivel not in geometrias.NIVEIS_DETALHE:
+        flask.abort(404)
+    return flask.send_from_directory(
+        geometrias.PASTA_GEOMETRIAS, f'estados_{nivel}.geojson',
+        mimetype='application/geo+json', max_age=7 * 24 * 3600
+    )
+
+def url_geometria_estados(nivel=NIVEL_GEOMETRIA):
+    """URL das fronteiras dos estados, servidas pela rota local (respeita o `requests_pathname_prefix` do app)."""
+    caminho = geometrias.caminho_geometria(nivel, geometrias.PASTA_GEOMETRIAS)
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(
+            f"Geometria dos estados não encontrada: '{caminho}'. Gere-a a partir da malha do IBGE "
+            f"com 'python geometrias.py'."
+        )
+    return app.get_relative_path(f'/geometrias/estados/{nivel}.geojson')
+
+
+def versao_dados():
+    """Versão do artefato de dados em uso; faz parte da chave do cache de figuras."""
+    return dados.obter_dados()['versao']
+
+
 # --- Funções de Criação de Layout ---
 def criar_layout_principal():
     """Cria o layout da página principal com o mapa e os filtros."""
+    tabelas = dados.obter_dados()
+    df_mapa, df_estados = tabelas['mapa'], tabelas['estados']
     return html.Div(style={'backgroundColor': COLORS['background'], 'fontFamily': 'Arial, sans-serif', 'margin':'0px auto'}, children=[
         html.H1('Distribuição de Concorrentes', style={'textAlign': 'center', 'color': COLORS['text'], 'margin':'0px auto'}),
         html.Div([
@@ -157,9 +83,24 @@ def criar_layout_principal():
 
 def criar_layout_detalhes_estado(estado_selecionado):
     """Cria o layout da página de detalhes demográficos para um estado."""
+    tabelas = dados.obter_dados()
+    df_pop_plot_estado, df_estados = tabelas['pop_estado'], tabelas['estados']
     if df_pop_plot_estado.empty or estado_selecionado not in df_pop_plot_estado['uf'].unique():
         return html.Div([html.H1("Dados não encontrados.", style={'color': COLORS['text']}), dcc.Link('Voltar ao Mapa', href='/', style={'color': '#7FDBFF'})])
     
+    nome_estado = df_estados[df_estados['uf'] == estado_selecionado]['nome'].iloc[0]
+
+    return html.Div(style={'backgroundColor': COLORS['bg-bar'], 'padding': '20px','margin': '0px' ,'minHeight': '100vh'}, children=[
+        html.H1(f'Detalhes Demográficos: {nome_estado}', style={'textAlign': 'center', 'color': COLORS['text']}),
+        dcc.Graph(figure=criar_figura_estado(estado_selecionado)),
+        dcc.Link('<< Voltar ao Mapa', href='/', style={'textAlign': 'center', 'display': 'block', 'fontSize': '20px', 'color': '#7FDBFF'})
+    ])
+
+@cache_figuras.memorizar('estado', versao_dados)
+def criar_figura_estado(estado_selecionado):
+    """Gráfico de população por faixa etária de um estado."""
+    tabelas = dados.obter_dados()
+    df_pop_plot_estado, df_estados = tabelas['pop_estado'], tabelas['estados']
     df_filtrado = df_pop_plot_estado[df_pop_plot_estado['uf'] == estado_selecionado]
     nome_estado = df_estados[df_estados['uf'] == estado_selecionado]['nome'].iloc[0]
     
@@ -196,27 +137,34 @@ def criar_layout_detalhes_estado(estado_selecionado):
     
     max_pop = df_filtrado['populacao'].max()
     fig.update_yaxes(range=[0, max_pop * 1.15])
-    
-    return html.Div(style={'backgroundColor': COLORS['bg-bar'], 'padding': '20px','margin': '0px' ,'minHeight': '100vh'}, children=[
-        html.H1(f'Detalhes Demográficos: {nome_estado}', style={'textAlign': 'center', 'color': COLORS['text']}),
-        dcc.Graph(figure=fig),
-        dcc.Link('<< Voltar ao Mapa', href='/', style={'textAlign': 'center', 'display': 'block', 'fontSize': '20px', 'color': '#7FDBFF'})
-    ])
+    return fig
+
+def _populacao_cidade(codigo_ibge):
+    """Linhas de população (por faixa etária) do município com o código IBGE informado."""
+    df_pop_plot_municipio = dados.obter_dados()['pop_municipio']
+    return df_pop_plot_municipio[(df_pop_plot_municipio['codigo_ibge'] == codigo_ibge).fillna(False)]
 
-def criar_layout_detalhes_cidade(nome_mun):
-    """Cria o layout da página de detalhes demográficos para uma cidade."""
-    if df_pop_plot_municipio.empty or nome_mun not in df_pop_plot_municipio['municipio'].unique():
+def criar_layout_detalhes_cidade(codigo_ibge):
+    """Cria o layout da página de detalhes demográficos para uma cidade, pelo código IBGE."""
+    codigo_ibge = int(codigo_ibge) if str(codigo_ibge).isdigit() else None
+    df_cidade = _populacao_cidade(codigo_ibge)
+    if df_cidade.empty:
         return html.Div([html.H1("Dados não encontrados.", style={'color': COLORS['text']}), dcc.Link('Voltar ao Mapa', href='/', style={'color': '#7FDBFF'})])
 
-    pop_total = df_pop_plot_municipio[
-        (df_pop_plot_municipio['municipio'] == nome_mun) &
-        (df_pop_plot_municipio['faixa_etaria'] == 'pop_total')
-    ]['populacao'].iloc[0]
+    return html.Div(style={'backgroundColor': COLORS['bg-bar'], 'padding': '10px', 'minHeight': '150vh'}, children=[
+        html.H1(f"{df_cidade['municipio'].iloc[0]}", style={'textAlign': 'center', 'color': COLORS['text']}),
+        dcc.Graph(figure=criar_figura_cidade(codigo_ibge)),
+        dcc.Link('<< Voltar ao Mapa', href='/', style={'textAlign': 'center', 'display': 'block', 'fontSize': '15px', 'color': "#18BEFF"})
+    ])
+
+@cache_figuras.memorizar('cidade', versao_dados)
+def criar_figura_cidade(codigo_ibge):
+    """Gráfico de população por faixa etária de um município (pelo código IBGE), com o total no título."""
+    df_cidade = _populacao_cidade(codigo_ibge)
+    nome_mun = df_cidade['municipio'].iloc[0]
+    pop_total = df_cidade[df_cidade['faixa_etaria'] == 'pop_total']['populacao'].iloc[0]
 
-    df_filtrado = df_pop_plot_municipio[
-        (df_pop_plot_municipio['municipio'] == nome_mun) &
-        (df_pop_plot_municipio['faixa_etaria'] != 'pop_total')
-    ]
+    df_filtrado = df_cidade[df_cidade['faixa_etaria'] != 'pop_total']
 
     fig = px.bar(
         df_filtrado, 
@@ -252,12 +200,7 @@ def criar_layout_detalhes_cidade(nome_mun):
     
     max_pop = df_filtrado['populacao'].max()
     fig.update_yaxes(range=[0, max_pop * 1.15])
-
-    return html.Div(style={'backgroundColor': COLORS['bg-bar'], 'padding': '10px', 'minHeight': '150vh'}, children=[
-        html.H1(f'{nome_mun}', style={'textAlign': 'center', 'color': COLORS['text']}),
-        dcc.Graph(figure=fig),
-        dcc.Link('<< Voltar ao Mapa', href='/', style={'textAlign': 'center', 'display': 'block', 'fontSize': '15px', 'color': "#18BEFF"})
-    ])
+    return fig
 
 app.layout = html.Div([
     dcc.Location(id='url', refresh=False),
@@ -285,41 +228,54 @@ def display_page(pathname):
 )
 def update_map_figure(estados, tipos, concorrentes, status, tipo_mapa):
     """Atualiza a figura do mapa com base nos filtros selecionados."""
-    df_filtrado = df_mapa.copy()
-    if estados: df_filtrado = df_filtrado[df_filtrado['uf'].isin(estados)]
-    if tipos: df_filtrado = df_filtrado[df_filtrado['tipo_estabelecimento'].isin(tipos)]
-    if concorrentes: df_filtrado = df_filtrado[df_filtrado['concorrente'].isin(concorrentes)]
-    if status: df_filtrado = df_filtrado[df_filtrado['status'].isin(status)]
+    return criar_figura_mapa(estados, tipos, concorrentes, status, tipo_mapa)
+
+@cache_figuras.memorizar('mapa', versao_dados)
+def criar_figura_mapa(estados, tipos, concorrentes, status, tipo_mapa):
+    """Monta a figura do mapa (cidades ou estados) para a combinação de filtros."""
+    df_filtrado = filtros_mapa.filtrar(dados.obter_dados()['mapa'], dados.obter_indice_filtros(), {
+        'uf': estados, 'tipo_estabelecimento': tipos, 'concorrente': concorrentes, 'status': status
+    })
 
     if df_filtrado.empty:
         return {"layout": {"paper_bgcolor": COLORS['plot_background'], "plot_bgcolor": COLORS['plot_background'], "font": {"color": COLORS['text']}, "annotations": [{"text": "Nenhum dado para os filtros", "xref": "paper", "yref": "paper", "showarrow": False}]}}
 
     if tipo_mapa == 'scatter':
-        df_scatter = df_filtrado.copy()
-        jitter_amount = 0.040
-        is_duplicated = df_scatter.duplicated(subset=['latitude', 'longitude'], keep=False)
-        num_duplicates = is_duplicated.sum()
-        if num_duplicates > 0:
-            df_scatter.loc[is_duplicated, 'latitude'] += np.random.uniform(-jitter_amount, jitter_amount, size=num_duplicates)
-            df_scatter.loc[is_duplicated, 'longitude'] += np.random.uniform(-jitter_amount, jitter_amount, size=num_duplicates)
-        
+        # Muitos contratos viram um ponto por município (cor do principal concorrente),
+        # com a contagem por concorrente no hover
+        df_scatter, agregado = agregacao_mapa.preparar_pontos(df_filtrado)
+
         fig = px.scatter_mapbox(
             df_scatter,
             lat="latitude", lon="longitude", color="concorrente",
+            size="contagem" if agregado else None, size_max=25,
             zoom=3.8, center={"lat": -14.2350, "lon": -51.9253},
             mapbox_style="open-street-map",
-            hover_name="municipio", custom_data=['municipio']
+            hover_name="municipio",
+            custom_data=['codigo_ibge', 'contagem', 'concorrentes', 'detalhe'] if agregado else ['codigo_ibge']
         )
-        fig.update_traces(
-            marker=dict(
-                size=7.5,
-                opacity=1.0
+        if agregado:
+            fig.update_traces(
+                marker=dict(
+                    sizemin=5,
+                    opacity=0.85
+                ),
+                hovertemplate=(
+                    '<b>%{hovertext}</b><br>%{customdata[1]} contratos de %{customdata[2]} concorrentes'
+                    '<br><br>%{customdata[3]}<extra></extra>'
+                )
+            )
+        else:
+            fig.update_traces(
+                marker=dict(
+                    size=7.5,
+                    opacity=1.0
+                )
             )
-        )
         fig.update_layout(
             margin={"r":0, "t":0, "l":0, "b":0},
             legend=dict(
-                title_text='Concorrentes',
+                title_text='Principal concorrente' if agregado else 'Concorrentes',
                 bgcolor="rgba(255, 255, 255, 0.8)", 
                 borderwidth=1,
                 y=1, yanchor="top",
@@ -328,9 +284,9 @@ def update_map_figure(estados, tipos, concorrentes, status, tipo_mapa):
         )
 
     else: 
-        df_agregado = df_filtrado.groupby('uf').size().reset_index(name='contagem')
+        df_agregado = df_filtrado.groupby('uf', observed=True).size().reset_index(name='contagem')
         fig = px.choropleth_mapbox(
-            df_agregado, geojson=GEOJSON_URL, locations='uf', featureidkey="properties.sigla",
+            df_agregado, geojson=url_geometria_estados(), locations='uf', featureidkey="properties.sigla",
             color='contagem', color_continuous_scale="YlOrRd",
             #mapbox_style="carto-positron", 
             mapbox_style="open-street-map",
@@ -365,7 +321,7 @@ def navigate_on_click(clickData, tipo_mapa):
     prevent_initial_call=True,
 )
 def download_csv(n_clicks):
-    return dict(content=df_empresas_raw.to_csv(sep=';', index=False, encoding='utf-8'), filename="dados_empresas.csv")
+    return dict(content=dados.obter_dados()['empresas'].to_csv(sep=';', index=False, encoding='utf-8'), filename="dados_empresas.csv")
 
 
 
@@ -0,0 +1,69 @@
+# filtros_mapa.py
+"""
+Índice de filtros do mapa: para cada coluna filtrável guarda um bitmap (bits
+empacotados, 1 bit por linha) por valor. Uma combinação de filtros vira um OR
+dos bitmaps dos valores escolhidos em cada coluna, um AND entre as colunas e um
+único `take` no DataFrame, sem copiar o DataFrame a cada filtro.
+"""
+import numpy as np
+import pandas as pd
+
+# Colunas do mapa que podem ser filtradas pelos dropdowns
+COLUNAS_FILTRO = ['uf', 'tipo_estabelecimento', 'concorrente', 'status']
+
+
+def _bitmaps_coluna(codigos, quantidade_valores):
+    """Monta a matriz (valores x bytes) de bitmaps a partir dos códigos da categoria."""
+    n = len(codigos)
+    bitmaps = np.zeros((quantidade_valores, (n + 7) // 8), dtype=np.uint8)
+    linhas = np.flatnonzero(codigos >= 0)
+    # Liga o bit de cada linha no bitmap do seu valor (mesma ordem de bits do np.packbits)
+    np.bitwise_or.at(bitmaps, (codigos[linhas], linhas >> 3), (128 >> (linhas & 7)).astype(np.uint8))
+    return bitmaps
+
+
+def construir_indice_filtros(df, colunas=COLUNAS_FILTRO):
+    """
+    Constrói o índice de filtros de `df`, uma única vez por processo.
+    Retorna {'linhas': n, 'colunas': {coluna: {'valores': {valor: posição}, 'bitmaps': matriz}}}.
+    """
+    indice = {'linhas': len(df), 'colunas': {}}
+    for coluna in colunas:
+        categorias = pd.Categorical(df[coluna])
+        indice['colunas'][coluna] = {
+            'valores': {valor: posicao for posicao, valor in enumerate(categorias.categories)},
+            'bitmaps': _bitmaps_coluna(categorias.codes.astype(np.int64), len(categorias.categories))
+        }
+    return indice
+
+
+def linhas_filtradas(indice, filtros):
+    """
+    Retorna as posições das linhas que atendem a todos os filtros, ou None se
+    nenhum filtro estiver ativo. `filtros` é {coluna: lista de valores}; listas
+    vazias ou None são ignoradas, como nos dropdowns.
+    """
+    mascara = None
+    for coluna, valores in filtros.items():
+        if not valores:
+            continue
+        coluna_indice = indice['colunas'][coluna]
+        posicoes = [coluna_indice['valores'][v] for v in valores if v in coluna_indice['valores']]
+        if not posicoes:
+            return np.empty(0, dtype=np.int64)
+
+        bits = np.bitwise_or.reduce(coluna_indice['bitmaps'][posicoes], axis=0)
+        mascara = bits if mascara is None else mascara & bits
+
+    if mascara is None:
+        return None
+    return np.flatnonzero(np.unpackbits(mascara, count=indice['linhas']))
+
+
+def filtrar(df, indice, filtros):
+    """
+    Aplica os filtros ao DataFrame usando o índice. Sem filtros ativos, devolve
+    o próprio `df` (sem cópia); o chamador não deve alterá-lo.
+    """
+    linhas = linhas_filtradas(indice, filtros)
+    return df if linhas is None else df.take(linhas)
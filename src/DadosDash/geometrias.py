@@ -0,0 +1,146 @@
+# geometrias.py
+"""
+Geometrias locais dos estados para o mapa coroplético.
+
+Os arquivos `geometrias/estados_<nivel>.geojson` ficam junto com o código e
+são servidos pela própria rota do app. Este script os gera a partir da
+malha oficial de estados do IBGE: por padrão, a malha não simplificada de
+ANO_MALHA obtida com o pacote geobr (`read_state`); com --origem, um GeoJSON da
+malha já baixado (ex: API de malhas do IBGE, com `intrarregiao=UF`). As
+fronteiras são simplificadas como uma cobertura — divisas compartilhadas
+entre dois estados são simplificadas uma única vez, sem buracos nem
+sobreposições — em alguns níveis de detalhe, e as coordenadas são arredondadas.
+
+Uso (a partir de src/DadosDash/): python geometrias.py [--ano 2020] [--origem arquivo.geojson]
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import requests
+import pandas as pd
+import shapely
+from shapely.geometry import mapping, shape
+
+from dados_dashboard import MAPA_CODIGO_UF
+
+PASTA_MODULO = os.path.dirname(os.path.abspath(__file__))
+PASTA_GEOMETRIAS = os.getenv('DASHBOARD_GEOMETRIAS', os.path.join(PASTA_MODULO, 'geometrias'))
+
+# Ano da malha estadual do IBGE baixada pelo geobr
+ANO_MALHA = 2020
+
+# Nível de detalhe -> (tolerância da simplificação em graus, casas decimais das coordenadas)
+NIVEIS_DETALHE = {
+    'alto': (0.002, 4),
+    'medio': (0.01, 3),
+    'baixo': (0.05, 2)
+}
+NIVEL_PADRAO = 'medio'
+
+# Propriedades com a UF nas malhas aceitas: sigla (geobr e arquivos já gerados) ou código IBGE (API de malhas)
+PROPRIEDADES_SIGLA = ['sigla', 'abbrev_state']
+PROPRIEDADES_CODIGO = ['codarea', 'code_state']
+
+
+def caminho_geometria(nivel, pasta=PASTA_GEOMETRIAS):
+    return os.path.join(pasta, f'estados_{nivel}.geojson')
+
+
+def carregar_origem(origem):
+    """Lê o GeoJSON de origem de uma URL ou de um arquivo local."""
+    if origem.startswith(('http://', 'https://')):
+        resposta = requests.get(origem, timeout=60)
+        resposta.raise_for_status()
+        return resposta.json()
+    with open(origem, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def baixar_malha_ibge(ano=ANO_MALHA):
+    """Malha oficial dos estados do IBGE em `ano`, via geobr, como GeoJSON em WGS84."""
+    try:
+        import geobr
+    except ImportError as e:
+        raise ImportError("O pacote 'geobr' é necessário para baixar a malha do IBGE "
+                          "(pip install geobr); ou informe um arquivo com --origem.") from e
+    estados = geobr.read_state(year=ano, simplified=False, show_progress=False)
+    return json.loads(estados.to_crs(4326).to_json())
+
+
+def _sigla_feicao(propriedades):
+    for chave in PROPRIEDADES_SIGLA:
+        if propriedades.get(chave):
+            return str(propriedades[chave]).upper()
+    for chave in PROPRIEDADES_CODIGO:
+        if propriedades.get(chave) is not None:
+            return MAPA_CODIGO_UF.get(int(float(propriedades[chave])))
+    return None
+
+
+def estados_da_malha(geojson, arquivo_estados=None):
+    """
+    Uma feição por UF (propriedades `sigla` e `nome`), a partir da malha de
+    estados. Levanta ValueError se alguma UF faltar ou não for identificada.
+    """
+    arquivo_estados = arquivo_estados or os.path.join(PASTA_MODULO, 'estados.csv')
+    nomes = pd.read_csv(arquivo_estados).set_index('uf')['nome']
+
+    partes = {}
+    for feicao in geojson['features']:
+        sigla = _sigla_feicao(feicao.get('properties') or {})
+        if sigla not in nomes.index:
+            raise ValueError(f"Feição sem UF reconhecida na malha: {feicao.get('properties')}")
+        partes.setdefault(sigla, []).append(shape(feicao['geometry']))
+
+    faltando = sorted(set(nomes.index) - set(partes))
+    if faltando:
+        raise ValueError(f"A malha não tem as UFs: {faltando}")
+    return [{'sigla': sigla, 'nome': nomes[sigla], 'geometria': shapely.union_all(geometrias)}
+            for sigla, geometrias in sorted(partes.items())]
+
+
+def simplificar_estados(estados, tolerancia, casas_decimais):
+    """
+    Simplifica as fronteiras como cobertura (as divisas continuam coincidindo) e
+    quantiza as coordenadas em `casas_decimais`. Retorna o GeoJSON.
+    """
+    geometrias = shapely.coverage_simplify(np.array([estado['geometria'] for estado in estados]), tolerancia)
+    # Arredondamento na grade com correção da topologia (arredondar os vértices soltos pode gerar autointerseções)
+    geometrias = shapely.set_precision(geometrias, 10.0 ** -casas_decimais)
+    feicoes = [
+        {'type': 'Feature', 'properties': {'sigla': estado['sigla'], 'nome': estado['nome']},
+         'geometry': mapping(geometria)}
+        for estado, geometria in zip(estados, geometrias)
+    ]
+    return {'type': 'FeatureCollection', 'features': feicoes}
+
+
+def construir_geometrias(origem=None, ano=ANO_MALHA, pasta=PASTA_GEOMETRIAS, niveis=NIVEIS_DETALHE):
+    """
+    Gera um GeoJSON simplificado por nível de detalhe, a partir da malha de
+    `origem` ou, sem ela, da malha do IBGE de `ano` (geobr). Retorna os arquivos gravados.
+    """
+    estados = estados_da_malha(carregar_origem(origem) if origem else baixar_malha_ibge(ano))
+    os.makedirs(pasta, exist_ok=True)
+
+    arquivos = []
+    for nivel, (tolerancia, casas_decimais) in niveis.items():
+        caminho = caminho_geometria(nivel, pasta)
+        temporario = f'{caminho}.tmp'
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(simplificar_estados(estados, tolerancia, casas_decimais), f, separators=(',', ':'), ensure_ascii=False)
+        os.replace(temporario, caminho)
+        print(f"Geometria '{nivel}' gravada em '{caminho}' ({os.path.getsize(caminho) / 1024:.0f} KB).")
+        arquivos.append(caminho)
+    return arquivos
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Gera as geometrias simplificadas dos estados para o dashboard.")
+    parser.add_argument('--ano', type=int, default=ANO_MALHA, help="Ano da malha estadual do IBGE baixada pelo geobr.")
+    parser.add_argument('--origem', help="URL ou arquivo GeoJSON da malha de estados (no lugar do geobr).")
+    parser.add_argument('--pasta', default=PASTA_GEOMETRIAS, help="Pasta de saída.")
+    args = parser.parse_args()
+    construir_geometrias(args.origem, args.ano, args.pasta)
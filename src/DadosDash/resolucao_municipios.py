@@ -0,0 +1,165 @@
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+from collections import Counter
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DadosETL'))
+
+from normalizacao import normalizar_serie, normalizar_texto  # noqa: E402
+
+# Similaridade mínima (coeficiente de Dice entre trigramas) para aceitar um candidato aproximado
+LIMIAR_SIMILARIDADE = 0.75
+
+# Versão das regras de resolução gravada no cache em disco; mude-a ao alterar a busca ou o score
+VERSAO_ALGORITMO = 2
+
+# Nomes oficiais com denominação alternativa, ex: "Augusto Severo (Campo Grande)"
+RE_NOME_ALTERNATIVO = re.compile(r'^(.*?)\s*\((.+)\)$')
+
+
+def trigramas(nome_normalizado):
+    """Conjunto de trigramas do nome, com espaços nas bordas para valorizar início e fim."""
+    texto = f'  {nome_normalizado} '
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def _variantes_nome(nome):
+    """Nome oficial e, se houver, as duas partes de "Nome (Denominação alternativa)"."""
+    alternativo = RE_NOME_ALTERNATIVO.match(nome)
+    return [nome] + list(alternativo.groups()) if alternativo else [nome]
+
+
+def construir_indice(df_municipios):
+    """
+    Monta o índice de municípios por UF a partir de um DataFrame com 'codigo_ibge',
+    'nome' e 'uf'. Para cada UF guarda os nomes exatos, os nomes normalizados e
+    uma lista invertida trigrama -> municípios usada na busca aproximada.
+    """
+    # Normaliza todos os nomes de uma vez; as consultas abaixo só leem a memória
+    normalizar_serie(pd.Series([v for nome in df_municipios['nome'] for v in _variantes_nome(nome)]))
+
+    indice = {}
+    for codigo, nome_oficial, uf in df_municipios[['codigo_ibge', 'nome', 'uf']].itertuples(index=False):
+        entrada = indice.setdefault(uf, {'exato': {}, 'normalizado': {}, 'candidatos': [], 'trigramas': {}})
+        for nome in _variantes_nome(nome_oficial):
+            normalizado = normalizar_texto(nome)
+            grams = trigramas(normalizado)
+
+            entrada['exato'].setdefault(nome, int(codigo))
+            entrada['normalizado'].setdefault(normalizado, int(codigo))
+            posicao = len(entrada['candidatos'])
+            entrada['candidatos'].append((int(codigo), grams))
+            for gram in grams:
+                entrada['trigramas'].setdefault(gram, []).append(posicao)
+
+    codigos = sorted(int(c) for c in df_municipios['codigo_ibge'])
+    indice_id = hashlib.sha256(json.dumps(codigos).encode()).hexdigest()[:16]
+    return {'ufs': indice, 'id': indice_id}
+
+
+def resolver_municipio(nome, uf, indice, limiar=LIMIAR_SIMILARIDADE):
+    """
+    Resolve um nome de município para o código IBGE, tentando em ordem:
+    nome exato -> nome normalizado -> similaridade de trigramas.
+
+    Retorna (codigo_ibge, score, metodo); (None, 0.0, None) se nada for encontrado.
+    """
+    entrada = indice['ufs'].get(uf)
+    if entrada is None or not isinstance(nome, str):
+        return None, 0.0, None
+
+    nome = nome.strip()
+    if nome in entrada['exato']:
+        return entrada['exato'][nome], 1.0, 'exato'
+
+    normalizado = normalizar_texto(nome)
+    if normalizado in entrada['normalizado']:
+        return entrada['normalizado'][normalizado], 1.0, 'normalizado'
+
+    # Conta os trigramas em comum só com os municípios que compartilham algum trigrama
+    grams = trigramas(normalizado)
+    em_comum = Counter()
+    for gram in grams:
+        em_comum.update(entrada['trigramas'].get(gram, ()))
+
+    # Dice >= limiar exige 2c >= limiar * (a + b) >= limiar * (a + c), ou seja,
+    # c >= limiar * a / (2 - limiar): abaixo disso nenhum candidato pode passar
+    minimo_comuns = math.ceil(limiar * len(grams) / (2 - limiar) - 1e-9)
+
+    # Empates no score ficam com o menor código IBGE: a ordem do Counter segue a dos
+    # trigramas no conjunto, que muda entre execuções (hash aleatório de strings)
+    melhor = (None, 0.0, None)
+    for posicao, comuns in em_comum.items():
+        if comuns < minimo_comuns:
+            continue
+        codigo, grams_candidato = entrada['candidatos'][posicao]
+        score = 2 * comuns / (len(grams) + len(grams_candidato))
+        if (score, -codigo) > (melhor[1], -(melhor[0] or 0)):
+            melhor = (codigo, score, 'aproximado')
+
+    return melhor if melhor[1] >= limiar else (None, 0.0, None)
+
+
+def _identificacao_cache(indice, limiar):
+    return {'indice': indice['id'], 'limiar': limiar, 'versao': VERSAO_ALGORITMO}
+
+
+def _carregar_cache(caminho, indice, limiar):
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            cache = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    # Resoluções feitas com outra lista de municípios, outro limiar ou outra versão das regras não são reaproveitadas
+    identificacao = _identificacao_cache(indice, limiar)
+    if any(cache.get(campo) != valor for campo, valor in identificacao.items()):
+        return {}
+    return cache.get('resolucoes', {})
+
+
+def _salvar_cache(caminho, indice, limiar, resolucoes):
+    temporario = f'{caminho}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump({**_identificacao_cache(indice, limiar), 'resolucoes': resolucoes}, f, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+def resolver_municipios(nomes, ufs, indice, caminho_cache=None, limiar=LIMIAR_SIMILARIDADE):
+    """
+    Resolve uma coluna de nomes (com a coluna de UFs correspondente) para códigos IBGE.
+
+    Cada par (nome, UF) distinto é resolvido uma única vez; com `caminho_cache`,
+    os resultados ficam gravados em disco e são reaproveitados nas próximas
+    execuções. Retorna um DataFrame com 'codigo_ibge', 'score_resolucao' e
+    'metodo_resolucao', alinhado ao índice de `nomes`.
+    """
+    resolucoes = _carregar_cache(caminho_cache, indice, limiar) if caminho_cache else {}
+    pares = pd.DataFrame({'nome': nomes, 'uf': ufs})
+    unicos = pares.drop_duplicates()
+    normalizar_serie(unicos['nome'])
+
+    novas = 0
+    resultado_unicos = []
+    for nome, uf in unicos.itertuples(index=False):
+        chave = f'{uf}|{nome}'
+        if chave not in resolucoes:
+            resolucoes[chave] = resolver_municipio(nome, uf, indice, limiar)
+            novas += 1
+        resultado_unicos.append(resolucoes[chave])
+
+    if caminho_cache and novas:
+        _salvar_cache(caminho_cache, indice, limiar, resolucoes)
+
+    df_unicos = pd.DataFrame(
+        resultado_unicos, columns=['codigo_ibge', 'score_resolucao', 'metodo_resolucao']
+    ).astype({'codigo_ibge': 'Int64'})
+    df_unicos[['nome', 'uf']] = unicos.to_numpy()
+
+    resultado = pares.merge(df_unicos, on=['nome', 'uf'], how='left')
+    resultado.index = pares.index
+    return resultado[['codigo_ibge', 'score_resolucao', 'metodo_resolucao']]
@@ -1,82 +1,114 @@
 import re
 import csv
+from functools import lru_cache
 
+# Termos-pivô: tudo desde o início do nome até o último termo encontrado é descartado.
+# Também lidam com variações de acentos e espaços.
+TERMOS_PIVO = [
+    r"Do\s+Munic[ií]pio\s+De",
+    r"Municipais\s+De",
+    r"Municipalidade\s+De",
+    r"Esgoto\s+De",
+    r"[AÁ]gua\s+De",
+    r"Tur[ií]stica\s+De",
+    r"Ambiental\s+De",
+    r"Urbanismo\s+De",
+    r"Prefeitura\s+De",
+    r"Vereadores\s+De",
+    r"Sa[uú]de\s+De",
+    r"Servidores\s+De",
+    r"Municip[aá]rios\s+De",
+    r"Social\s+De",
+    r"P[uú]blicos\s+De",
+    r"Samae\s+-+\s+De",
+    r"Munic[ií]pio\s+De",
+    r"Previd[eê]ncia\s+De",
+    r"C[aâ]mara\s+De",
+    r"De\s+Previd[eê]ncia",
+    r"C[aâ]mara\s+Municipal\s+De",
+    r"Mun\.\s+De",
+    r"Municipal\s+De",
+    r"\s+Munic[ií]pio",
+    r"Previd[eê]ncia"
+]
+_ALTERNATIVAS_PIVO = "|".join(TERMOS_PIVO)
+
+# Padrões compilados uma única vez, na importação do módulo
+# Termo-pivô começando em cada posição do nome (lookahead: as ocorrências podem se sobrepor)
+RE_PIVO = re.compile(r"(?=(" + _ALTERNATIVAS_PIVO + r"))", re.IGNORECASE)
+RE_SUFIXO_PARENTESES = re.compile(r'\s*\([^)]*\)$')
+RE_SUFIXO_CODIGO = re.compile(r'\s+-\s+[A-Z0-9]+$')
+RE_SUFIXO_PREV = re.compile(r'\s*PREV[A-Z]*$', re.IGNORECASE)
+RE_SUFIXO_IPREV = re.compile(r'\s*IPREV$', re.IGNORECASE)
+RE_CONJUNCAO_E = re.compile(r'\s+E\s+')
+
+# Tamanho máximo do cache de nomes já limpos (os arquivos repetem muito os mesmos órgãos)
+TAMANHO_CACHE_MUNICIPIOS = 65536
+
+
+@lru_cache(maxsize=None)
+def _padroes_uf(uf):
+    """Padrões que removem a UF do final do nome ("... - MG" e "... / MG"), compilados uma vez por UF."""
+    uf_escapada = re.escape(uf)
+    return (
+        re.compile(r'\s*-\s*' + uf_escapada + r'\s*$', re.IGNORECASE),
+        re.compile(r'\s*/\s*' + uf_escapada + r'\s*$', re.IGNORECASE)
+    )
+
+
+def _remover_ate_ultimo_pivo(nome):
+    """Remove tudo desde o início da primeira linha até o final do último termo-pivô que começa nela."""
+    limite = nome.find('\n')
+    limite = len(nome) if limite < 0 else limite
+    fim = None
+    for ocorrencia in RE_PIVO.finditer(nome):
+        if ocorrencia.start() > limite:
+            break
+        fim = ocorrencia.end(1)
+    return nome if fim is None else nome[fim:]
+
+
+@lru_cache(maxsize=TAMANHO_CACHE_MUNICIPIOS)
 def limpar_municipio_avancado(texto_bruto, uf):
     """
     Função avançada e otimizada para extrair o nome do município de uma string complexa.
+
+    Os resultados ficam em cache por (texto_bruto, uf), já que os mesmos órgãos
+    se repetem milhares de vezes nos arquivos de contratos.
     """
     # Inicia com o texto, convertendo para maiúsculas para padronizar
     nome = texto_bruto.strip().upper()
 
-    # Etapas 1 e 2: Remoção de sufixos e da UF (seu código original, está ótimo)
-    nome = re.sub(r'\s*\([^)]*\)$', '', nome)
-    nome = re.sub(r'\s+-\s+[A-Z0-9]+$', '', nome)
-    nome = re.split(r'\s*-\s*' + re.escape(uf) + r'\s*$', nome, flags=re.IGNORECASE)[0]
-    nome = re.split(r'\s*/\s*' + re.escape(uf) + r'\s*$', nome, flags=re.IGNORECASE)[0]
-
-    # --- AJUSTE PRINCIPAL (ETAPA 3) ---
-    # Unimos todos os termos-pivô em uma única expressão regular para mais eficiência.
-    # Também ajustamos para lidar com variações de acentos e espaços.
-    termos_pivo = [
-        r"Do\s+Munic[ií]pio\s+De",
-        r"Municipais\s+De",
-        r"Municipalidade\s+De",
-        r"Esgoto\s+De",
-        r"[AÁ]gua\s+De",
-        r"Tur[ií]stica\s+De",
-        r"Ambiental\s+De",
-        r"Urbanismo\s+De",
-        r"Prefeitura\s+De",
-        r"Vereadores\s+De",
-        r"Sa[uú]de\s+De",
-        r"Servidores\s+De",
-        r"Municip[aá]rios\s+De",
-        r"Social\s+De",
-        r"P[uú]blicos\s+De",
-        r"Samae\s+-+\s+De",
-        r"Munic[ií]pio\s+De",
-        r"Previd[eê]ncia\s+De",
-        r"C[aâ]mara\s+De",
-        r"De\s+Previd[eê]ncia",
-        r"Sa[uú]de\s+De",
-        r"Social\s+De",
-        r"C[aâ]mara\s+Municipal\s+De",
-        r"P[uú]blicos\s+De",
-        r"Municipais\s+De",
-        r"Municip[aá]rios\s+De",
-        r"Prefeitura\s+De",
-        r"Mun\.\s+De",
-        r"Municipal\s+De",
-        r"\s+Munic[ií]pio",
-        r"Previd[eê]ncia"
-    ]
-    
-    # Cria o padrão final unindo os termos com `|` (OU)
-    # A estrutura (?:...) é um "grupo sem captura", usado aqui para agrupar os termos.
-    padrao_pivo_unificado = r"^(?:.*)(" + "|".join(termos_pivo) + r")"
+    # Etapas 1 e 2: Remoção de sufixos e da UF
+    # (os testes de substring evitam rodar as regex quando o nome não pode casar)
+    if nome.endswith(')'):
+        nome = RE_SUFIXO_PARENTESES.sub('', nome)
+    if '-' in nome:
+        nome = RE_SUFIXO_CODIGO.sub('', nome)
+        nome = _padroes_uf(uf)[0].split(nome, maxsplit=1)[0]
+    if '/' in nome:
+        nome = _padroes_uf(uf)[1].split(nome, maxsplit=1)[0]
 
-    # Aplica a substituição uma única vez.
-    # Esta expressão remove tudo desde o início da linha até o final do termo-pivô encontrado.
-    nome = re.sub(padrao_pivo_unificado, '', nome, flags=re.IGNORECASE)
+    # Etapa 3: remove tudo até o último termo-pivô
+    nome = _remover_ate_ultimo_pivo(nome)
 
-    # Etapa 4: Remove sufixos comuns (seu código original)
-    nome = re.sub(r'\s*PREV[A-Z]*$', '', nome, flags=re.IGNORECASE)
-    nome = re.sub(r'\s*IPREV$', '', nome, flags=re.IGNORECASE)
+    # Etapa 4: Remove sufixos comuns
+    if 'PREV' in nome:
+        nome = RE_SUFIXO_PREV.sub('', nome)
+        nome = RE_SUFIXO_IPREV.sub('', nome)
 
-    # Etapa 5: Lida com casos como "Joinville e IPREVILLE" (seu código original)
-    partes = re.split(r'\s+E\s+', nome)
+    # Etapa 5: Lida com casos como "Joinville e IPREVILLE"
+    partes = RE_CONJUNCAO_E.split(nome)
     if len(partes) > 1 and partes[-1].isupper() and len(partes[-1]) > 2:
         nome = ' E '.join(partes[:-1])
 
-    # Etapa 6: Limpeza final (seu código original)
-    nome = re.sub(r'\s+', ' ', nome).strip(' .-/')
+    # Etapa 6: Limpeza final
+    nome = ' '.join(nome.split()).strip(' .-/')
     
     # Capitaliza o nome de forma mais legível (Ex: Sao Paulo -> São Paulo)
     return nome.title()
 
 
-# O restante do seu script para ler e escrever o arquivo está perfeito e não precisa de alterações.
-# Apenas certifique-se de que ele chame a nova versão da função `limpar_municipio_avancado`.
 def tratar_arquivo_final(arquivo_entrada='MunipCOn_tratado.csv', arquivo_saida='MunipCOn_finalv4.csv'):
     """
     Lê o arquivo CSV tratado e aplica a limpeza avançada na coluna de municípios.
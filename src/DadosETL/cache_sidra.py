@@ -0,0 +1,101 @@
+# cache_sidra.py
+
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+EXTENSAO = '.pkl.gz'
+
+
+def chave_requisicao(api_params, classifications, url_base=None):
+    """
+    Gera a chave do cache a partir do servidor (`url_base`), tabela, nível
+    territorial, variável e classificações.
+    """
+    identificacao = {
+        'url_base': url_base,
+        'table_code': str(api_params['table_code']),
+        'territorial_level': str(api_params['territorial_level']),
+        'ibge_territorial_code': str(api_params['ibge_territorial_code']),
+        'variable': str(api_params['variable']),
+        'classifications': {str(k): str(v) for k, v in sorted(classifications.items())}
+    }
+    conteudo = json.dumps(identificacao, sort_keys=True)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def _caminho(chave, cache_params):
+    return os.path.join(cache_params['diretorio'], chave + EXTENSAO)
+
+
+def ler(chave, cache_params):
+    """
+    Retorna o DataFrame em cache para a chave, ou None se não existir, estiver
+    expirado (mais antigo que `ttl_horas`) ou se `atualizar` estiver ativo.
+    """
+    if not cache_params or not cache_params.get('ativo', True) or cache_params.get('atualizar'):
+        return None
+
+    caminho = _caminho(chave, cache_params)
+    try:
+        info = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+
+    if time.time() - info.st_mtime > cache_params.get('ttl_horas', 24) * 3600:
+        return None
+
+    try:
+        df = pd.read_pickle(caminho, compression='gzip')
+    except Exception as e:
+        print(f"Aviso: entrada de cache ilegível ({caminho}): {e}")
+        return None
+
+    # Atualiza só o horário de acesso: o mtime marca a criação (TTL), o atime o último uso (LRU)
+    os.utime(caminho, (time.time(), info.st_mtime))
+    return df
+
+
+def gravar(chave, df, cache_params):
+    """Grava o DataFrame no cache (pickle comprimido) e aplica o limite de tamanho."""
+    if not cache_params or not cache_params.get('ativo', True):
+        return
+
+    os.makedirs(cache_params['diretorio'], exist_ok=True)
+    caminho = _caminho(chave, cache_params)
+    temporario = f"{caminho}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+    df.to_pickle(temporario, compression='gzip')
+    os.replace(temporario, caminho)
+
+    limitar_tamanho(cache_params)
+
+
+def limitar_tamanho(cache_params, extensao=EXTENSAO):
+    """
+    Remove as entradas menos usadas recentemente (horário de acesso) até a pasta
+    `diretorio` caber em `tamanho_max_mb`. Só arquivos terminados em `extensao`
+    contam; o cache de figuras do dashboard usa a mesma função.
+    """
+    limite = cache_params.get('tamanho_max_mb', 200) * 1024 * 1024
+    entradas = []
+    for nome in os.listdir(cache_params['diretorio']):
+        if not nome.endswith(extensao):
+            continue
+        try:
+            info = os.stat(os.path.join(cache_params['diretorio'], nome))
+        except FileNotFoundError:
+            continue
+        entradas.append((info.st_atime, info.st_size, nome))
+
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, nome in sorted(entradas):
+        if total <= limite:
+            break
+        try:
+            os.remove(os.path.join(cache_params['diretorio'], nome))
+        except FileNotFoundError:
+            pass
+        total -= tamanho
@@ -8,10 +8,26 @@ DB_CONFIG = {
     'user': os.getenv('DB_USER'),
     'password': os.getenv('DB_PASSWORD'),
     'host': os.getenv('DB_HOST'),
-    'name': os.getenv('DB_NAME')
+    'name': os.getenv('DB_NAME'),
+    'local_infile': os.getenv('DB_LOCAL_INFILE', 'false').lower() == 'true'
 }
 DB_TABLE_NAME = 'bi_populacao_por_faixa_etaria'
 
+# Carga em massa: 'insert' (INSERTs de várias linhas) ou 'infile' (LOAD DATA LOCAL INFILE)
+DB_CARGA = {
+    'metodo': 'infile' if DB_CONFIG['local_infile'] else 'insert',
+    'batch_size': 5000
+}
+
+# Carga incremental: grava só os municípios novos/alterados (comparação por hash)
+DB_CARGA_INCREMENTAL = {
+    'batch_size': 5000,
+    'remover_ausentes': True # apaga municípios que não vieram na extração
+}
+
+# Carga feita pelo pipeline: 'bulk', 'incremental' ou None (não grava no banco)
+DB_CARGA_MODO = os.getenv('DB_CARGA_MODO') or None
+
 
 # Faixa estária dos grupos IBGE
 FAIXAS_ETARIAS = [
@@ -34,11 +50,126 @@ SIDRA_API_POP = {
     'classifications': {'2': '6794'} # Sexo: Total
 }
 
+# Indicadores extraídos pelo motor genérico (ver extracao_sidra.py). Cada especificação:
+# - tabela, variavel, niveis: tabela do SIDRA, variável e níveis territoriais (6 = município, 3 = UF)
+# - filtros: classificações fixas, ex: {'2': '6794'} (Sexo: Total)
+# - classificacao + faixas: classificação cujas categorias viram colunas (formato de FAIXAS_ETARIAS)
+# - coluna: nome da coluna do valor, para especificações sem 'faixas'
+# - total (opcional): coluna com a soma das faixas; tipo (opcional): tipo dos valores (padrão int32)
+# Especificações com a mesma tabela, nível, variável, filtros e classificação compartilham as requisições.
+INDICADORES_SIDRA = {
+    'pasta': os.getenv('INDICADORES_PASTA', 'dados_exportados/indicadores'),
+    'formatos': ['parquet'],
+    # Dataset com a população por faixa etária dos municípios, exportado e carregado no banco pelo pipeline
+    'dataset_populacao': 'populacao_faixa_etaria_municipio',
+    'especificacoes': [
+        {
+            'nome': 'populacao_faixa_etaria',
+            'tabela': '9514', 'variavel': '93', 'niveis': ['6', '3'],
+            'filtros': {'2': '6794'}, # Sexo: Total
+            'classificacao': '287', 'faixas': FAIXAS_ETARIAS,
+            'total': 'pop_total'
+        },
+        {
+            'nome': 'populacao_idosa',
+            'tabela': '9514', 'variavel': '93', 'niveis': ['6'],
+            'filtros': {'2': '6794'},
+            'classificacao': '287',
+            'faixas': [{'cod': '93095,93096,93097,93098,49108,49109,60040,60041,6653', 'coluna': 'pop_60_mais'}]
+        },
+        {
+            'nome': 'populacao_sexo',
+            'tabela': '9514', 'variavel': '93', 'niveis': ['6', '3'],
+            'filtros': {'287': '100362'}, # Idade: Total
+            'classificacao': '2',
+            'faixas': [{'cod': '4', 'coluna': 'pop_homens'}, {'cod': '5', 'coluna': 'pop_mulheres'}],
+            'total': 'pop_total'
+        }
+    ]
+}
+
+# Parâmetros das requisições HTTP à API do SIDRA
+SIDRA_REQUISICAO = {
+    'url_base': os.getenv('SIDRA_URL_BASE', 'https://apisidra.ibge.gov.br'),
+    'max_concorrencia': 4, # requisições simultâneas (1 = sequencial)
+    'timeout': 60, # segundos por requisição
+    'tentativas': 3, # número máximo de tentativas por requisição
+    'backoff': 2.0, # espera inicial (s) entre tentativas, dobrada a cada falha
+    # Usado apenas por data_functions.ibge_mun_pop (chamadas diretas e benchmarks); o pipeline
+    # do main.py extrai pelo plano de extracao_sidra.py, que sempre busca os códigos em lotes:
+    # 'unico': busca todos os códigos de idade de uma vez e agrupa as faixas localmente
+    # 'por_faixa': uma requisição por item de FAIXAS_ETARIAS
+    'modo': 'unico',
+    # A API limita cada consulta a 100.000 valores; 12 códigos x ~5.570 municípios cabe no limite.
+    # Vale para o plano do pipeline e para o modo 'unico' de ibge_mun_pop
+    'codigos_por_requisicao': 12
+}
+
+# Cache em disco das respostas do SIDRA (dados do Censo raramente mudam)
+SIDRA_CACHE = {
+    'ativo': True,
+    'diretorio': os.getenv('SIDRA_CACHE_DIR', '.cache_sidra'),
+    'ttl_horas': 24 * 30, # entradas mais antigas são buscadas novamente
+    'tamanho_max_mb': 200, # acima disso, remove as entradas menos usadas (LRU)
+    'atualizar': False # ignora o cache na leitura (equivale a --refresh)
+}
+
+# Formatos gerados na exportação (ver exportacao.py): 'csv', 'parquet', 'feather'
+EXPORTACAO = {
+    'formatos': ['csv', 'parquet', 'feather'],
+    'parquet_compressao': 'zstd', # 'snappy', 'gzip', 'zstd' ou None
+    'feather_compressao': 'uncompressed' # sem compressão o feather pode ser mapeado em memória
+}
+
+# Série histórica em Parquet particionado por ano/UF (ver serie_historica.py)
+SERIE_HISTORICA = {
+    'pasta': os.getenv('SERIE_HISTORICA_PASTA', 'dados_historicos'),
+    'ano_referencia': int(os.getenv('SIDRA_ANO_REFERENCIA', '2022')) # ano dos dados da tabela 9514 (Censo 2022)
+}
+
+# Medição das etapas do pipeline (ver instrumentacao.py)
+INSTRUMENTACAO = {
+    'log_json': os.getenv('PIPELINE_LOG_JSON', 'logs/pipeline_etapas.jsonl'), # um span por linha; None desativa
+    'prometheus': os.getenv('PIPELINE_PROMETHEUS'), # arquivo .prom para o textfile collector; None desativa
+    'medir_memoria': False # pico de memória por etapa (tracemalloc); equivale a --medir-memoria
+}
+
+# Execução do pipeline em grafo (ver grafo_etapas.py)
+GRAFO_ETAPAS = {
+    'pasta_checkpoints': os.getenv('PIPELINE_CHECKPOINTS', '.checkpoints'),
+    'max_paralelo': 3 # etapas independentes executadas ao mesmo tempo
+}
+
+# Tratamento dos contratos executado junto com o pipeline (ver pipeline_contratos.py)
+CONTRATOS = {
+    'entrada': os.getenv('CONTRATOS_ENTRADA', 'MunipCOn.txt'),
+    'saida': os.getenv('CONTRATOS_SAIDA', 'MunipCOn_finalv4.csv')
+}
+
+# Pool de conexões do engine compartilhado (ver db_functions.create_db_engine)
+DB_POOL = {
+    'pool_size': 5,
+    'max_overflow': 10,
+    'pool_pre_ping': True, # descarta conexões derrubadas pelo servidor antes de usá-las
+    'pool_recycle': 3600, # recicla conexões antes do wait_timeout do MySQL
+    'pool_timeout': 30 # segundos de espera por uma conexão livre
+}
+
 QUERY_CIDADES_MG = """
     select * 
     from bi_populacao_por_faixa_etaria 
     where 1=1
-        and uf = 'MG' 
-    and municipio in ('Belo Horizonte','Congonhas','Ouro Branco','Rio Pomba','Santa Maria do Suaçuí')
+        and uf = :uf 
+    and municipio in :municipios
     order by pop_total desc;
+"""
+PARAMS_CIDADES_MG = {
+    'uf': 'MG',
+    'municipios': ['Belo Horizonte', 'Congonhas', 'Ouro Branco', 'Rio Pomba', 'Santa Maria do Suaçuí']
+}
+
+QUERY_MUNICIPIO = """
+    select * 
+    from bi_populacao_por_faixa_etaria 
+    where codigo_ibge = :codigo_ibge;
 """
\ No newline at end of file
@@ -1,65 +1,257 @@
 # data_handler.py
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
-import sidrapy
-from functools import reduce
-
-def ibge_mun_pop(groups_data, api_params):
-    
-    dataframes_processados = []
-
-    for group in groups_data:
-        
-        # Monta o dicionário 'classifications' para a chamada atual
-        filtros_request = api_params.get('classifications', {}).copy()
-        filtros_request['287'] = group['cod'] # Adiciona os códigos de idade
-        
+import requests
+from sidrapy.resources.handler import ENDPOINT_BASE, get_url
+from sidrapy.resources.http_client import HttpClient
+
+import cache_sidra
+import instrumentacao
+
+# Respostas HTTP que indicam falha temporária do servidor e merecem nova tentativa
+STATUS_TEMPORARIOS = {429, 500, 502, 503, 504}
+
+
+def buscar_tabela_sidra(api_params, classifications, request_params=None, cache_params=None):
+    """
+    Faz uma requisição à API do SIDRA e retorna a resposta como DataFrame.
+
+    Equivale a `sidrapy.get_table`, mas com URL base configurável (permite apontar
+    para um servidor local de testes), timeout por requisição e novas tentativas
+    com backoff exponencial em falhas de rede ou respostas 429/5xx.
+
+    Se `cache_params` for informado, a resposta é lida/gravada no cache em disco.
+    """
+    chave = cache_sidra.chave_requisicao(api_params, classifications, _url_base(request_params))
+    df_cache = cache_sidra.ler(chave, cache_params)
+    if df_cache is not None:
+        print("Resposta obtida do cache local.")
+        instrumentacao.contar('respostas_cache')
+        return df_cache
+
+    df_raw = _requisitar_sidra(api_params, classifications, request_params)
+    cache_sidra.gravar(chave, df_raw, cache_params)
+    return df_raw
+
+
+def _url_base(request_params):
+    return (request_params or {}).get('url_base', ENDPOINT_BASE).rstrip('/')
+
+
+def _requisitar_sidra(api_params, classifications, request_params):
+    request_params = request_params or {}
+    url_base = _url_base(request_params)
+    timeout = request_params.get('timeout', 60)
+    tentativas = request_params.get('tentativas', 3)
+    backoff = request_params.get('backoff', 2.0)
+
+    url = get_url(
+        table_code=api_params['table_code'],
+        territorial_level=api_params['territorial_level'],
+        ibge_territorial_code=api_params['ibge_territorial_code'],
+        variable=api_params['variable'],
+        classifications=classifications
+    )
+    url = url_base + url[len(ENDPOINT_BASE):]
+
+    for tentativa in range(1, tentativas + 1):
         try:
+            with HttpClient.get_legacy_session() as session:
+                response = session.get(url, timeout=timeout)
+            instrumentacao.contar('bytes_entrada', len(response.content))
+            if response.status_code in STATUS_TEMPORARIOS:
+                raise requests.HTTPError(f"HTTP {response.status_code}: {response.text[:200]}", response=response)
+            if not response.ok:
+                raise ValueError(response.text)
+            return pd.DataFrame(response.json())
+        except requests.RequestException as e:
+            if tentativa == tentativas:
+                raise
+            instrumentacao.contar('tentativas')
+            espera = backoff * 2 ** (tentativa - 1)
+            print(f"Falha na requisição ({e}). Nova tentativa {tentativa + 1}/{tentativas} em {espera:.1f}s...")
+            time.sleep(espera)
+
+
+def _buscar_grupo(group, api_params, request_params, cache_params):
+    """Busca uma faixa etária e retorna o formato longo. Retorna None em caso de erro."""
+
+    # Monta o dicionário 'classifications' para a chamada atual
+    filtros_request = api_params.get('classifications', {}).copy()
+    filtros_request['287'] = group['cod'] # Adiciona os códigos de idade
+
+    try:
+        with instrumentacao.etapa('busca', grupo=group['coluna']) as span:
             print(f"Buscando dados para o grupo: {group['coluna']}...")
-            df_raw = sidrapy.get_table(
-                table_code=api_params['table_code'],
-                territorial_level=api_params['territorial_level'],
-                variable=api_params['variable'],
-                ibge_territorial_code=api_params['ibge_territorial_code'],
-                classifications=filtros_request
-            )
-            
-            # Tratamento inicial do DataFrame recebido
-            df_raw['V'] = pd.to_numeric(df_raw['V'], errors='coerce')
-            df_processed = df_raw.groupby('D1N')['V'].sum().reset_index()
-            df_processed = df_processed.rename(columns={'D1N': 'municipio', 'V': group['coluna']})
-            
-            dataframes_processados.append(df_processed)
+            df_raw = buscar_tabela_sidra(api_params, filtros_request, request_params, cache_params)
+
+            df_longo = df_raw[['D1C', 'D1N', 'V']].rename(columns={'D1C': 'codigo_ibge', 'D1N': 'municipio'})
+            df_longo['coluna'] = group['coluna']
+            span['linhas_saida'] = len(df_longo)
+        return df_longo
+
+    except Exception as e:
+        print(f"Erro ao buscar ou processar o grupo {group['coluna']}: {e}")
+        return None
+
+
+def mapa_codigos_faixas(groups_data):
+    """Retorna a tabela de consulta {código de idade (classificação 287): coluna pop_*}."""
+    return {
+        codigo.strip(): group['coluna']
+        for group in groups_data
+        for codigo in group['cod'].split(',')
+    }
+
+
+def coluna_codigos(df_raw, codigos):
+    """Identifica a coluna D?C da resposta que contém os códigos consultados (ex: de idade)."""
+    colunas_codigo = [col for col in df_raw.columns if col.startswith('D') and col.endswith('C')]
+    return max(colunas_codigo, key=lambda col: df_raw[col].isin(codigos).sum())
+
+
+def _buscar_lote_idades(codigos, api_params, request_params, cache_params):
+    """Busca um lote de códigos de idade e retorna o formato longo (codigo_ibge, municipio, codigo_idade, V)."""
+    filtros_request = api_params.get('classifications', {}).copy()
+    filtros_request['287'] = ','.join(codigos)
 
+    with instrumentacao.etapa('busca', grupo=f'{codigos[0]}-{codigos[-1]}') as span:
+        print(f"Buscando {len(codigos)} códigos de idade em uma única requisição...")
+        df_raw = buscar_tabela_sidra(api_params, filtros_request, request_params, cache_params)
+
+        coluna_idade = coluna_codigos(df_raw, codigos)
+        df_longo = df_raw[['D1C', 'D1N', coluna_idade, 'V']].rename(
+            columns={'D1C': 'codigo_ibge', 'D1N': 'municipio', coluna_idade: 'codigo_idade'}
+        )
+        span['linhas_saida'] = len(df_longo)
+    return df_longo
+
+
+def rotular_faixas(df_longo, groups_data):
+    """
+    Adiciona ao formato longo a coluna 'coluna' com a faixa pop_* de cada código de idade.
+
+    Como o agrupamento é feito localmente, as faixas podem ser redefinidas no
+    config.py e reaplicadas aos mesmos dados sem nova consulta à API.
+    """
+    return df_longo.assign(coluna=df_longo['codigo_idade'].map(mapa_codigos_faixas(groups_data)))
+
+
+def montar_tabela_populacao(df_longo, colunas, coluna_nome='municipio', separar_uf=True, coluna_total='pop_total', tipo='int32'):
+    """
+    Monta a tabela larga (codigo_ibge, municipio, uf, colunas..., pop_total) a partir do formato longo.
+
+    Recebe todas as linhas (codigo_ibge, municipio, coluna, V) concatenadas e soma os
+    valores de cada par (município, coluna) em uma única passada, usando o código IBGE
+    como chave. As populações saem como int32 e a UF como categoria.
+
+    Para outros níveis territoriais e indicadores (ver extracao_sidra.py), o nome
+    vai para `coluna_nome` sem separar a UF (`separar_uf=False`), o total pode ser
+    omitido (`coluna_total=None`) e os valores podem usar outro `tipo`.
+    """
+    codigos_ibge = pd.to_numeric(df_longo['codigo_ibge'], errors='coerce')
+    posicao_coluna = pd.Categorical(df_longo['coluna'], categories=colunas).codes
+
+    # Descarta o cabeçalho devolvido pela API e códigos de idade fora das faixas
+    validas = codigos_ibge.notna().to_numpy() & (posicao_coluna >= 0)
+    codigos_ibge = codigos_ibge[validas].astype('int64')
+    posicao_coluna = posicao_coluna[validas]
+    valores = pd.to_numeric(df_longo['V'][validas], errors='coerce').fillna(0).to_numpy()
+
+    posicao_municipio, municipios = pd.factorize(codigos_ibge, sort=True)
+    matriz = np.bincount(
+        posicao_municipio * len(colunas) + posicao_coluna,
+        weights=valores,
+        minlength=len(municipios) * len(colunas)
+    ).reshape(len(municipios), len(colunas)).astype(tipo)
+
+    nomes = df_longo.loc[validas, 'municipio'].groupby(posicao_municipio).first()
+    df_final = pd.DataFrame(matriz, columns=colunas, index=pd.Index(municipios, name='codigo_ibge'))
+    if coluna_total:
+        df_final[coluna_total] = matriz.sum(axis=1, dtype=tipo)
+
+    if not separar_uf:
+        df_final.insert(0, coluna_nome, nomes.str.strip().to_numpy())
+        return df_final
+
+    # Separa o nome 'Município - UF' uma única vez por município
+    partes = nomes.str.split(' - ', n=1, expand=True).reindex(columns=[0, 1])
+    df_final.insert(0, coluna_nome, partes[0].str.strip().to_numpy())
+    df_final.insert(1, 'uf', pd.Categorical(partes[1].str.strip().to_numpy()))
+
+    return df_final.dropna(subset=['uf'])
+
+
+def agrupar_faixas(df_longo, groups_data):
+    """Aplica as faixas de `groups_data` ao formato longo e monta a tabela final."""
+    colunas = [group['coluna'] for group in groups_data]
+    return montar_tabela_populacao(rotular_faixas(df_longo, groups_data), colunas)
+
+
+def _buscar_faixas_unico(groups_data, api_params, request_params, cache_params, executor):
+    """Busca todos os códigos de idade em poucas requisições e rotula as faixas localmente."""
+    codigos = sorted(mapa_codigos_faixas(groups_data))
+    tamanho_lote = max(1, request_params.get('codigos_por_requisicao', len(codigos)))
+    lotes = [codigos[i:i + tamanho_lote] for i in range(0, len(codigos), tamanho_lote)]
+
+    def buscar_lote(lote):
+        # Como em _buscar_grupo, um lote com erro é descartado sem perder os demais
+        try:
+            return rotular_faixas(_buscar_lote_idades(lote, api_params, request_params, cache_params), groups_data)
         except Exception as e:
-            print(f"Erro ao buscar ou processar o grupo {group['coluna']}: {e}")
-            continue 
+            print(f"Erro ao buscar ou processar os códigos de idade {lote[0]}-{lote[-1]}: {e}")
+            return None
 
-    df_final = reduce(lambda left, right: pd.merge(left, right, on='municipio', how='outer'), dataframes_processados)
+    resultados = executor.map(instrumentacao.no_contexto_atual(buscar_lote), lotes)
+    return [df_longo for df_longo in resultados if df_longo is not None]
 
-    df_final = df_final.fillna(0)
 
-    colunas_populacao = df_final.columns.drop('municipio')
-    df_final[colunas_populacao] = df_final[colunas_populacao].astype(int)
+def ibge_mun_pop(groups_data, api_params, request_params=None, cache_params=None):
+    """
+    Busca a população por faixa etária de todos os municípios, identificados
+    pelo código IBGE (coluna 'codigo_ibge').
 
-    # Separa a coluna 'municipio' em 'municipio' e 'uf'
-    df_final[['municipio', 'uf']] = df_final['municipio'].str.split(' - ', n=1, expand=True)
-    df_final['municipio'] = df_final['municipio'].str.strip()
-    df_final['uf'] = df_final['uf'].str.strip()
+    As requisições de cada faixa são feitas em paralelo, limitadas por
+    `request_params['max_concorrencia']` (1 = sequencial). Os resultados são
+    combinados na ordem de `groups_data`, então a saída é a mesma de uma
+    execução sequencial.
 
-    colunas_populacao = df_final.columns.drop(['municipio', 'uf'])
-    # Garante que todas as colunas de população sejam do tipo inteiro
-    colunas_populacao = [group['coluna'] for group in groups_data]
-    df_final[colunas_populacao] = df_final[colunas_populacao].astype(int)
-    
-    # Calcula a população total
-    df_final['pop_total'] = df_final[colunas_populacao].sum(axis=1)
+    Com `request_params['modo'] == 'unico'`, todos os códigos de idade são
+    buscados juntos (em lotes de `codigos_por_requisicao`) e agrupados nas
+    colunas pop_* localmente.
+
+    Nos dois modos, uma requisição com erro (faixa ou lote de códigos) é
+    informada e descartada, e as demais são mantidas.
+
+    `cache_params` ativa o cache em disco das respostas (ver cache_sidra.py).
+    """
+    request_params = request_params or {}
+    max_concorrencia = max(1, request_params.get('max_concorrencia', 1))
 
-    # Reorganiza as colunas para um formato final e lógico
-    ordem_colunas = ['municipio', 'uf'] + [col for col in df_final if col not in ['municipio', 'uf']]
-    df_final = df_final[ordem_colunas]
+    with ThreadPoolExecutor(max_workers=max_concorrencia) as executor:
+        if request_params.get('modo', 'por_faixa') == 'unico':
+            dataframes_longos = _buscar_faixas_unico(groups_data, api_params, request_params, cache_params, executor)
+        else:
+            resultados = executor.map(instrumentacao.no_contexto_atual(
+                lambda group: _buscar_grupo(group, api_params, request_params, cache_params)
+            ), groups_data)
+            dataframes_longos = [df for df in resultados if df is not None]
+
+    if not dataframes_longos:
+        print("Nenhum dado foi obtido da API.")
+        return pd.DataFrame()
+
+    # Concatena o formato longo uma única vez e pivota para o formato largo
+    colunas_populacao = [group['coluna'] for group in groups_data]
+    with instrumentacao.etapa('montagem') as span:
+        df_longo = pd.concat(dataframes_longos, ignore_index=True)
+        df_final = montar_tabela_populacao(df_longo, colunas_populacao).reset_index()
+        span['linhas_entrada'] = len(df_longo)
+        span['linhas_saida'] = len(df_final)
 
-    df_final.dropna(subset=['uf'], inplace=True)
-    
     print("--- Processamento de dados concluído com sucesso! ---")
-    return df_final
\ No newline at end of file
+    return df_final
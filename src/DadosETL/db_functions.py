@@ -1,53 +1,267 @@
 # database_handler.py
 
-from sqlalchemy import create_engine, text
-import pandas as pd
+import csv
 import os
+import tempfile
+import threading
+import uuid
+from functools import lru_cache
+
+from sqlalchemy import bindparam, create_engine, inspect, text
+import pandas as pd
+
+import instrumentacao
+
+COLUNAS_POPULACAO = [
+    'pop_0_14', 'pop_15_19', 'pop_20_29', 'pop_30_39', 'pop_40_49',
+    'pop_50_59', 'pop_60_74', 'pop_75_99', 'pop_100_mais', 'pop_total'
+]
+
+# Engines compartilhados por processo, um por combinação de banco + configuração do pool
+_ENGINES = {}
+_ENGINES_LOCK = threading.Lock()
 
-def create_db_engine(db_config):
+def create_db_engine(db_config, pool_config=None):
+    """
+    Retorna o engine do banco, criado na primeira chamada e reutilizado nas seguintes.
+
+    `pool_config` recebe as opções de pool do SQLAlchemy (pool_size, max_overflow,
+    pool_pre_ping, pool_recycle, pool_timeout).
+    """
     user = db_config['user']
     password = db_config['password']
     host = db_config['host']
     name = db_config['name']
-    return create_engine(f'mysql+mysqlconnector://{user}:{password}@{host}/{name}')
+    url = f'mysql+mysqlconnector://{user}:{password}@{host}/{name}'
+    pool_config = pool_config or {}
+    chave = (url, bool(db_config.get('local_infile')), tuple(sorted(pool_config.items())))
+
+    with _ENGINES_LOCK:
+        if chave not in _ENGINES:
+            # LOAD DATA LOCAL INFILE precisa ser liberado na conexão
+            connect_args = {'allow_local_infile': True} if db_config.get('local_infile') else {}
+            _ENGINES[chave] = create_engine(url, connect_args=connect_args, **pool_config)
+        return _ENGINES[chave]
+
+def dispose_engines():
+    """Fecha as conexões de todos os engines compartilhados (ex.: ao encerrar o processo)."""
+    with _ENGINES_LOCK:
+        for engine in _ENGINES.values():
+            engine.dispose()
+        _ENGINES.clear()
+
+def _sql_criar_tabela(table_name, dialeto):
+    """Retorna os comandos de criação da tabela de população para o dialeto do banco."""
+    if dialeto == 'sqlite':
+        # SQLite é usado apenas como substituto local do MySQL (ex.: testes)
+        colunas_pop = ",\n".join(f"            {col} INTEGER NOT NULL DEFAULT 0" for col in COLUNAS_POPULACAO)
+        return [
+            f"""
+            CREATE TABLE IF NOT EXISTS {table_name} (
+            codigo_ibge INTEGER NOT NULL PRIMARY KEY,
+            municipio VARCHAR(255) NOT NULL,
+            uf CHAR(2) NOT NULL,
+{colunas_pop},
+            hash_conteudo CHAR(16) NOT NULL DEFAULT '',
+            ultima_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            # No SQLite o nome do índice é global ao banco, e não por tabela
+            f"CREATE INDEX IF NOT EXISTS idx_uf_municipio_{uuid.uuid4().hex[:8]} ON {table_name} (uf, municipio)"
+        ]
 
-def create_tables(engine):
-    sql = f"""
-        CREATE TABLE IF NOT EXISTS bi_populacao_por_faixa_etaria (
-            id INT AUTO_INCREMENT PRIMARY KEY,
+    colunas_pop = ",\n".join(f"            {col} INT NOT NULL DEFAULT 0" for col in COLUNAS_POPULACAO)
+    return [f"""
+        CREATE TABLE IF NOT EXISTS {table_name} (
+            codigo_ibge INT NOT NULL PRIMARY KEY,
             municipio VARCHAR(255) NOT NULL,
             uf CHAR(2) NOT NULL,
-            pop_0_14 INT NOT NULL DEFAULT 0,
-            pop_15_19 INT NOT NULL DEFAULT 0,
-            pop_20_29 INT NOT NULL DEFAULT 0,
-            pop_30_39 INT NOT NULL DEFAULT 0,
-            pop_40_49 INT NOT NULL DEFAULT 0,
-            pop_50_59 INT NOT NULL DEFAULT 0,
-            pop_60_74 INT NOT NULL DEFAULT 0,
-            pop_75_99 INT NOT NULL DEFAULT 0,
-            pop_100_mais INT NOT NULL DEFAULT 0,
-            pop_total INT NOT NULL DEFAULT 0,
+{colunas_pop},
+            hash_conteudo CHAR(16) NOT NULL DEFAULT '',
             ultima_atualizacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            UNIQUE KEY idx_municipio_uf (municipio, uf)
+            KEY idx_uf_municipio (uf, municipio)
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
-    """
-    
+    """]
+
+def create_tables(engine, table_name='bi_populacao_por_faixa_etaria', truncar=True):
     try:
         with engine.connect() as connection:
-            connection.execute(text(sql))
-            connection.execute(text(f"TRUNCATE TABLE bi_populacao_por_faixa_etaria"))
+            if not inspect(connection).has_table(table_name):
+                for sql in _sql_criar_tabela(table_name, engine.dialect.name):
+                    connection.execute(text(sql))
+            if truncar:
+                comando = "DELETE FROM" if engine.dialect.name == 'sqlite' else "TRUNCATE TABLE"
+                connection.execute(text(f"{comando} {table_name}"))
             connection.commit()
     except Exception as e:
         print(f"Erro ao configurar a tabela: {e}")
         raise
 
-def load_dataframe_to_tables(df, table_name, engine):
+def tabela_desatualizada(engine, table_name):
+    """
+    True se a tabela existe com o esquema antigo (chave 'id' AUTO_INCREMENT, sem
+    'codigo_ibge' ou 'hash_conteudo'), que a carga incremental não consegue atualizar.
+    """
+    with engine.connect() as connection:
+        inspetor = inspect(connection)
+        if not inspetor.has_table(table_name):
+            return False
+        colunas = {coluna['name'] for coluna in inspetor.get_columns(table_name)}
+        chave = inspetor.get_pk_constraint(table_name).get('constrained_columns')
+    return not {'codigo_ibge', 'hash_conteudo'} <= colunas or chave != ['codigo_ibge']
+
+def _contar_linhas(engine, table_name):
+    with engine.connect() as connection:
+        return connection.execute(text(f"SELECT COUNT(*) FROM {table_name}")).scalar()
+
+def calcular_hash_linhas(df, chave='codigo_ibge'):
+    """Calcula um hash (16 caracteres hex) do conteúdo de cada linha, exceto a chave."""
+    colunas = [col for col in df.columns if col not in (chave, 'hash_conteudo')]
+    conteudo = df[colunas].astype({col: str for col in colunas if not pd.api.types.is_numeric_dtype(df[col])})
+    hashes = pd.util.hash_pandas_object(conteudo, index=False)
+    return hashes.map('{:016x}'.format)
+
+def _sql_insert(table_name, colunas, dialeto, upsert=False, chave='codigo_ibge'):
+    """Monta o INSERT parametrizado; com `upsert`, atualiza as linhas cuja chave já existe."""
+    sql = (
+        f"INSERT INTO {table_name} ({', '.join(colunas)}) "
+        f"VALUES ({', '.join(':' + col for col in colunas)})"
+    )
+    if upsert:
+        atualizar = [col for col in colunas if col != chave]
+        if dialeto == 'sqlite':
+            sql += (
+                f" ON CONFLICT({chave}) DO UPDATE SET "
+                + ", ".join(f"{col} = excluded.{col}" for col in atualizar)
+                + ", ultima_atualizacao = CURRENT_TIMESTAMP"
+            )
+        else:
+            sql += " ON DUPLICATE KEY UPDATE " + ", ".join(f"{col} = VALUES({col})" for col in atualizar)
+    return text(sql)
+
+def _inserir_em_lotes(df, table_name, connection, batch_size, upsert=False):
+    """Insere o DataFrame com INSERTs de várias linhas, `batch_size` linhas por comando."""
+    sql = _sql_insert(table_name, list(df.columns), connection.dialect.name, upsert=upsert)
+    registros = df.to_dict('records')
+    for inicio in range(0, len(registros), batch_size):
+        connection.execute(sql, registros[inicio:inicio + batch_size])
+
+def _carregar_arquivo_local(df, table_name, connection):
+    """Carrega o DataFrame com LOAD DATA LOCAL INFILE a partir de um CSV temporário (somente MySQL)."""
+    colunas = list(df.columns)
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', newline='', delete=False) as f:
+        df.to_csv(f, index=False, header=False, sep=';', quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        caminho = f.name.replace('\\', '/')
     try:
-        df.to_sql(table_name, con=engine, if_exists='append', index=False)
-        print(f"Dados inseridos com sucesso na tabela '{table_name}'!")
-    except Exception as e:
-        print(f"Erro ao inserir dados no banco: {e}")
-        raise
+        connection.execute(text(
+            f"LOAD DATA LOCAL INFILE '{caminho}' INTO TABLE {table_name} "
+            "CHARACTER SET utf8mb4 FIELDS TERMINATED BY ';' OPTIONALLY ENCLOSED BY '\"' "
+            f"LINES TERMINATED BY '\\n' ({', '.join(colunas)})"
+        ))
+    finally:
+        os.remove(caminho)
+
+def _trocar_tabelas(connection, table_name, staging_name, dialeto):
+    """Coloca a tabela de staging no lugar da tabela final e descarta a versão anterior."""
+    antiga = f"{table_name}_antiga"
+    connection.execute(text(f"DROP TABLE IF EXISTS {antiga}"))
+    if dialeto == 'sqlite':
+        connection.execute(text(f"ALTER TABLE {table_name} RENAME TO {antiga}"))
+        connection.execute(text(f"ALTER TABLE {staging_name} RENAME TO {table_name}"))
+    else:
+        # RENAME TABLE com os dois pares é atômico no MySQL: não há janela com a tabela vazia
+        connection.execute(text(f"RENAME TABLE {table_name} TO {antiga}, {staging_name} TO {table_name}"))
+    connection.execute(text(f"DROP TABLE {antiga}"))
+
+def bulk_load_dataframe(df, table_name, engine, batch_size=5000, metodo='insert'):
+    """
+    Recarrega a tabela inteira sem deixá-la vazia durante a carga.
+
+    Os dados vão para uma tabela de staging, que depois substitui a tabela final
+    com RENAME TABLE. `metodo` pode ser 'insert' (INSERTs de várias linhas em lotes
+    de `batch_size`) ou 'infile' (LOAD DATA LOCAL INFILE, somente MySQL, exige
+    'local_infile' no DB_CONFIG).
+    """
+    dialeto = engine.dialect.name
+    staging_name = f"{table_name}_staging"
+    df = df.assign(hash_conteudo=calcular_hash_linhas(df))
+
+    with instrumentacao.etapa('carga_banco', metodo=metodo) as span:
+        span['linhas_entrada'] = len(df)
+        try:
+            create_tables(engine, table_name, truncar=False)
+            with engine.connect() as connection:
+                connection.execute(text(f"DROP TABLE IF EXISTS {staging_name}"))
+                for sql in _sql_criar_tabela(staging_name, dialeto):
+                    connection.execute(text(sql))
+
+                if metodo == 'infile' and dialeto == 'mysql':
+                    _carregar_arquivo_local(df, staging_name, connection)
+                else:
+                    _inserir_em_lotes(df, staging_name, connection, batch_size)
+                connection.commit()
+
+                _trocar_tabelas(connection, table_name, staging_name, dialeto)
+                connection.commit()
+            span['linhas_saida'] = len(df)
+            print(f"{len(df)} linhas carregadas na tabela '{table_name}' ({metodo}).")
+        except Exception as e:
+            print(f"Erro ao carregar dados no banco: {e}")
+            raise
+
+def incremental_load_dataframe(df, table_name, engine, batch_size=5000, remover_ausentes=False):
+    """
+    Grava apenas as linhas novas ou alteradas, comparando o hash do conteúdo de
+    cada município com o hash já gravado na tabela.
+
+    Com `remover_ausentes`, apaga os municípios que não estão mais no DataFrame.
+    Retorna um dicionário com as contagens de inseridos, atualizados e removidos.
+
+    Se a tabela ainda estiver no esquema antigo, a primeira carga é feita por
+    `bulk_load_dataframe`, cuja troca pela tabela de staging migra o esquema.
+    """
+    if tabela_desatualizada(engine, table_name):
+        print(f"Tabela '{table_name}' no esquema antigo (sem codigo_ibge/hash_conteudo): "
+              "recarregando-a por inteiro para migrá-la.")
+        linhas_antigas = _contar_linhas(engine, table_name)
+        bulk_load_dataframe(df, table_name, engine, batch_size)
+        return {'inseridos': len(df), 'atualizados': 0, 'removidos': linhas_antigas}
+
+    with instrumentacao.etapa('carga_banco', metodo='incremental') as span:
+        span['linhas_entrada'] = len(df)
+        try:
+            create_tables(engine, table_name, truncar=False)
+            df = df.assign(hash_conteudo=calcular_hash_linhas(df))
+
+            with engine.connect() as connection:
+                df_atual = pd.read_sql_query(text(f"SELECT codigo_ibge, hash_conteudo FROM {table_name}"), connection)
+                hash_atual = df['codigo_ibge'].map(df_atual.set_index('codigo_ibge')['hash_conteudo'])
+
+                novos = hash_atual.isna()
+                alterados = ~novos & (hash_atual != df['hash_conteudo'])
+                _inserir_em_lotes(df[novos | alterados], table_name, connection, batch_size, upsert=True)
+
+                removidos = []
+                if remover_ausentes:
+                    removidos = df_atual.loc[~df_atual['codigo_ibge'].isin(df['codigo_ibge']), 'codigo_ibge'].tolist()
+                    sql_delete = text(f"DELETE FROM {table_name} WHERE codigo_ibge IN :codigos").bindparams(
+                        bindparam('codigos', expanding=True)
+                    )
+                    for inicio in range(0, len(removidos), batch_size):
+                        connection.execute(sql_delete, {'codigos': removidos[inicio:inicio + batch_size]})
+                connection.commit()
+
+            contagens = {
+                'inseridos': int(novos.sum()),
+                'atualizados': int(alterados.sum()),
+                'removidos': len(removidos)
+            }
+            span['linhas_saida'] = contagens['inseridos'] + contagens['atualizados']
+            print(f"Carga incremental em '{table_name}': {contagens}")
+            return contagens
+        except Exception as e:
+            print(f"Erro ao carregar dados no banco: {e}")
+            raise
 
 def save_dataframe_to_csv(df, file_path):
 
@@ -65,9 +279,26 @@ def save_dataframe_to_csv(df, file_path):
         print(f"Erro ao inserir dados no banco: {e}")
         raise
 
-def query_execute(query, engine):
+@lru_cache(maxsize=256)
+def _preparar_query(query, parametros_lista):
+    """Compila o texto SQL uma única vez; parâmetros de lista viram `IN :param` expandidos."""
+    return text(query).bindparams(*[bindparam(nome, expanding=True) for nome in parametros_lista])
+
+def query_execute(query, engine, params=None):
+    """
+    Executa a consulta com parâmetros vinculados (`:nome` no SQL).
 
+    Valores do tipo lista/tupla/conjunto são expandidos, ex.: `municipio in :municipios`.
+    """
     print (f"Executando consulta: {query}")
 
-    result_query = pd.read_sql_query(query, engine)
-    return result_query
\ No newline at end of file
+    params = {
+        nome: list(valor) if isinstance(valor, (list, tuple, set)) else valor
+        for nome, valor in (params or {}).items()
+    }
+    parametros_lista = tuple(sorted(nome for nome, valor in params.items() if isinstance(valor, list)))
+
+    with instrumentacao.etapa('consulta') as span:
+        result_query = pd.read_sql_query(_preparar_query(query, parametros_lista), engine, params=params)
+        span['linhas_saida'] = len(result_query)
+    return result_query
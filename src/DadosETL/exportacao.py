@@ -0,0 +1,83 @@
+# exportacao.py
+
+import os
+
+import pandas as pd
+import pyarrow.feather as feather
+
+import db_functions as db
+import instrumentacao
+
+
+def tipos_compactos(df):
+    """
+    Converte as colunas para tipos compactos: populações e código IBGE em int32
+    e UF como categoria.
+    """
+    tipos = {col: 'int32' for col in df.columns if col.startswith('pop_') or col == 'codigo_ibge'}
+    if 'uf' in df.columns:
+        tipos['uf'] = 'category'
+    return df.astype(tipos)
+
+
+def _exportar_csv(df, caminho, opcoes):
+    db.save_dataframe_to_csv(df, caminho)
+
+
+def _exportar_parquet(df, caminho, opcoes):
+    df.to_parquet(caminho, index=False, compression=opcoes.get('parquet_compressao', 'zstd'))
+
+
+def _exportar_feather(df, caminho, opcoes):
+    # Sem compressão e em um só bloco, as colunas numéricas são lidas do arquivo mapeado sem cópia
+    df.reset_index(drop=True).to_feather(caminho, compression=opcoes.get('feather_compressao', 'uncompressed'),
+                                         chunksize=max(len(df), 1))
+
+
+# Formatos disponíveis: extensão -> função de exportação
+EXPORTADORES = {
+    'csv': _exportar_csv,
+    'parquet': _exportar_parquet,
+    'feather': _exportar_feather
+}
+
+
+def exportar_dataframe(df, caminho_base, formatos=('csv',), opcoes=None):
+    """
+    Salva o DataFrame em cada formato de `formatos`, como `<caminho_base>.<formato>`.
+    Retorna a lista de arquivos gravados.
+    """
+    opcoes = opcoes or {}
+    os.makedirs(os.path.dirname(caminho_base) or '.', exist_ok=True)
+    df_compacto = tipos_compactos(df)
+
+    arquivos = []
+    for formato in formatos:
+        if formato not in EXPORTADORES:
+            raise ValueError(f"Formato de exportação desconhecido: '{formato}'. Opções: {sorted(EXPORTADORES)}")
+        caminho = f"{caminho_base}.{formato}"
+        with instrumentacao.etapa('exportacao', formato=formato) as span:
+            print(f"Exportando dados ({formato}): {caminho}...")
+            EXPORTADORES[formato](df_compacto, caminho, opcoes)
+            span['linhas_entrada'] = len(df_compacto)
+            span['bytes_saida'] = os.path.getsize(caminho) if os.path.exists(caminho) else 0
+        arquivos.append(caminho)
+    return arquivos
+
+
+def carregar_dataframe(caminho, colunas=None):
+    """
+    Lê um arquivo exportado, escolhendo o leitor pela extensão.
+
+    Feather é mapeado em memória (sem consolidar as colunas, para não copiá-las);
+    CSV é convertido para os mesmos tipos compactos.
+    """
+    extensao = os.path.splitext(caminho)[1].lstrip('.')
+    if extensao == 'feather':
+        tabela = feather.read_table(caminho, columns=colunas, memory_map=True)
+        return tabela.to_pandas(split_blocks=True, self_destruct=True)
+    if extensao == 'parquet':
+        return pd.read_parquet(caminho, columns=colunas)
+    if extensao == 'csv':
+        return tipos_compactos(pd.read_csv(caminho, sep=';', encoding='utf-8-sig', usecols=colunas))
+    raise ValueError(f"Formato de arquivo desconhecido: '{caminho}'")
@@ -0,0 +1,276 @@
+# extracao_sidra.py
+"""
+Extração genérica de indicadores do SIDRA a partir de especificações declarativas
+(ver config.INDICADORES_SIDRA).
+
+Cada especificação informa a tabela, a variável, os níveis territoriais, os
+filtros fixos de classificação e, opcionalmente, uma classificação cujas
+categorias são agrupadas em colunas (as `faixas`, no mesmo formato de
+FAIXAS_ETARIAS). A extração acontece em três passos:
+
+1. `planejar_requisicoes`: especificações que consultam a mesma tabela, nível,
+   variável, filtros e classificação são atendidas pelas mesmas requisições
+   (a união dos códigos, em lotes de `codigos_por_requisicao`);
+2. `executar_plano`: as requisições distintas rodam em paralelo, com o cache,
+   as novas tentativas e a instrumentação de `buscar_tabela_sidra`;
+3. `montar_datasets`: cada especificação e nível vira uma tabela larga, gravada
+   em seus próprios arquivos por `exportar_indicadores`.
+
+Uso (a partir de src/DadosETL/): python extracao_sidra.py [--plano] [--apenas nome1,nome2]
+"""
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import cache_sidra
+import config
+import data_functions
+import exportacao
+import instrumentacao
+
+# Nível territorial do SIDRA -> coluna com o nome da unidade e se o nome traz a UF ('Município - UF')
+NIVEIS_TERRITORIAIS = {
+    '1': {'coluna_nome': 'pais', 'separar_uf': False},
+    '2': {'coluna_nome': 'regiao', 'separar_uf': False},
+    '3': {'coluna_nome': 'estado', 'separar_uf': False},
+    '6': {'coluna_nome': 'municipio', 'separar_uf': True}
+}
+
+CAMPOS_OBRIGATORIOS = ['nome', 'tabela', 'variavel', 'niveis']
+
+
+def validar_especificacao(espec):
+    """Levanta ValueError se a especificação estiver incompleta ou inconsistente."""
+    faltando = [campo for campo in CAMPOS_OBRIGATORIOS if campo not in espec]
+    if faltando:
+        raise ValueError(f"Especificação '{espec.get('nome', '?')}' sem os campos: {faltando}")
+
+    niveis_invalidos = [nivel for nivel in espec['niveis'] if str(nivel) not in NIVEIS_TERRITORIAIS]
+    if niveis_invalidos:
+        raise ValueError(f"Especificação '{espec['nome']}' com níveis territoriais não suportados: {niveis_invalidos}. "
+                         f"Opções: {sorted(NIVEIS_TERRITORIAIS)}")
+
+    if ('classificacao' in espec) != ('faixas' in espec):
+        raise ValueError(f"Especificação '{espec['nome']}': 'classificacao' e 'faixas' devem ser informadas juntas.")
+    if 'classificacao' not in espec and 'coluna' not in espec:
+        raise ValueError(f"Especificação '{espec['nome']}' sem 'faixas' precisa da 'coluna' do valor.")
+
+    colunas = colunas_especificacao(espec)
+    if len(set(colunas)) != len(colunas):
+        raise ValueError(f"Especificação '{espec['nome']}' com colunas repetidas: {colunas}")
+
+
+def colunas_especificacao(espec):
+    if 'faixas' in espec:
+        return [faixa['coluna'] for faixa in espec['faixas']]
+    return [espec['coluna']]
+
+
+def _api_params(espec, nivel):
+    return {
+        'table_code': str(espec['tabela']),
+        'territorial_level': str(nivel),
+        'ibge_territorial_code': espec.get('territorios', 'all'),
+        'variable': str(espec['variavel'])
+    }
+
+
+# --- 1. Planejamento ---
+def planejar_requisicoes(especificacoes, codigos_por_requisicao=12):
+    """
+    Monta o plano de requisições das especificações. Retorna um dicionário com:
+    - 'requisicoes': {chave: {'api_params', 'classifications', 'descricao'}}, sem repetição;
+    - 'datasets': [{'nome', 'especificacao', 'nivel', 'requisicoes': [chaves]}];
+    - 'sem_deduplicacao': quantas requisições seriam feitas tratando cada especificação isoladamente.
+    """
+    for espec in especificacoes:
+        validar_especificacao(espec)
+    nomes = [espec['nome'] for espec in especificacoes]
+    if len(set(nomes)) != len(nomes):
+        raise ValueError(f"Há especificações com o mesmo nome: {nomes}")
+
+    # Especificações que diferem só nas faixas compartilham o grupo (e os códigos)
+    grupos = {}
+    for espec in especificacoes:
+        for nivel in map(str, espec['niveis']):
+            api_params = _api_params(espec, nivel)
+            filtros = {str(k): str(v) for k, v in espec.get('filtros', {}).items()}
+            classificacao = str(espec['classificacao']) if 'classificacao' in espec else None
+            chave_grupo = (tuple(sorted(api_params.items())), tuple(sorted(filtros.items())), classificacao)
+            grupo = grupos.setdefault(chave_grupo, {
+                'api_params': api_params, 'filtros': filtros, 'classificacao': classificacao, 'codigos': set(), 'datasets': []
+            })
+            if classificacao:
+                grupo['codigos'].update(data_functions.mapa_codigos_faixas(espec['faixas']))
+            grupo['datasets'].append({'nome': espec['nome'], 'especificacao': espec, 'nivel': nivel})
+
+    requisicoes, datasets, sem_deduplicacao = {}, [], 0
+    for grupo in grupos.values():
+        lotes = _lotes(sorted(grupo['codigos']), codigos_por_requisicao) if grupo['classificacao'] else [None]
+        chaves = []
+        for lote in lotes:
+            classifications = dict(grupo['filtros'])
+            if lote is not None:
+                classifications[grupo['classificacao']] = ','.join(lote)
+            chave = cache_sidra.chave_requisicao(grupo['api_params'], classifications)
+            requisicoes[chave] = {
+                'api_params': grupo['api_params'],
+                'classifications': classifications,
+                'classificacao': grupo['classificacao'],
+                'codigos': lote,
+                'descricao': _descrever(grupo['api_params'], grupo['classificacao'], lote)
+            }
+            chaves.append(chave)
+
+        for dataset in grupo['datasets']:
+            espec = dataset['especificacao']
+            if grupo['classificacao']:
+                codigos = set(data_functions.mapa_codigos_faixas(espec['faixas']))
+                dataset['requisicoes'] = [c for c in chaves if codigos & set(requisicoes[c]['codigos'])]
+                sem_deduplicacao += len(_lotes(sorted(codigos), codigos_por_requisicao))
+            else:
+                dataset['requisicoes'] = chaves
+                sem_deduplicacao += 1
+            datasets.append(dataset)
+
+    return {'requisicoes': requisicoes, 'datasets': datasets, 'sem_deduplicacao': sem_deduplicacao}
+
+
+def _lotes(codigos, tamanho):
+    tamanho = max(1, tamanho)
+    return [codigos[i:i + tamanho] for i in range(0, len(codigos), tamanho)]
+
+
+def _descrever(api_params, classificacao, lote):
+    descricao = f"t{api_params['table_code']}/n{api_params['territorial_level']}/v{api_params['variable']}"
+    if lote:
+        descricao += f"/c{classificacao}:{lote[0]}-{lote[-1]}"
+    return descricao
+
+
+def imprimir_plano(plano):
+    print(f"{len(plano['datasets'])} datasets, {len(plano['requisicoes'])} requisições "
+          f"({plano['sem_deduplicacao']} sem compartilhamento):")
+    for dataset in plano['datasets']:
+        descricoes = [plano['requisicoes'][c]['descricao'] for c in dataset['requisicoes']]
+        print(f"  {dataset['nome']} (nível {dataset['nivel']}): {', '.join(descricoes)}")
+
+
+# --- 2. Execução ---
+def _buscar_requisicao(requisicao, request_params, cache_params):
+    """Executa uma requisição do plano e retorna o formato longo (codigo_ibge, municipio, codigo, V)."""
+    with instrumentacao.etapa('busca', grupo=requisicao['descricao']) as span:
+        print(f"Buscando {requisicao['descricao']}...")
+        df_raw = data_functions.buscar_tabela_sidra(
+            requisicao['api_params'], requisicao['classifications'], request_params, cache_params
+        )
+        colunas = {'D1C': 'codigo_ibge', 'D1N': 'municipio'}
+        if requisicao['codigos']:
+            coluna = data_functions.coluna_codigos(df_raw, requisicao['codigos'])
+            if coluna in colunas or not df_raw[coluna].isin(requisicao['codigos']).any():
+                raise ValueError(f"Resposta sem os códigos da classificação {requisicao['classificacao']}")
+            colunas[coluna] = 'codigo'
+        df_longo = df_raw[list(colunas) + ['V']].rename(columns=colunas)
+        span['linhas_saida'] = len(df_longo)
+    return df_longo
+
+
+def executar_plano(plano, request_params=None, cache_params=None):
+    """
+    Executa as requisições do plano em paralelo (`max_concorrencia`). Retorna
+    {chave: formato longo}; requisições que falharam ficam de fora.
+    """
+    request_params = request_params or {}
+    max_concorrencia = max(1, request_params.get('max_concorrencia', 1))
+
+    def buscar(item):
+        chave, requisicao = item
+        try:
+            return chave, _buscar_requisicao(requisicao, request_params, cache_params)
+        except Exception as e:
+            print(f"Erro ao buscar {requisicao['descricao']}: {e}")
+            return chave, None
+
+    with ThreadPoolExecutor(max_workers=max_concorrencia) as executor:
+        resultados = executor.map(instrumentacao.no_contexto_atual(buscar), plano['requisicoes'].items())
+        return {chave: df for chave, df in resultados if df is not None}
+
+
+# --- 3. Montagem e exportação ---
+def nome_dataset(dataset):
+    return f"{dataset['nome']}_{NIVEIS_TERRITORIAIS[dataset['nivel']]['coluna_nome']}"
+
+
+def montar_dataset(dataset, respostas):
+    """Monta a tabela larga de um dataset do plano a partir das respostas das suas requisições."""
+    espec = dataset['especificacao']
+    colunas = colunas_especificacao(espec)
+    nivel = NIVEIS_TERRITORIAIS[dataset['nivel']]
+
+    with instrumentacao.etapa('montagem', indicador=nome_dataset(dataset)) as span:
+        df_longo = pd.concat([respostas[chave] for chave in dataset['requisicoes']], ignore_index=True)
+        if 'faixas' in espec:
+            df_longo['coluna'] = df_longo['codigo'].map(data_functions.mapa_codigos_faixas(espec['faixas']))
+        else:
+            df_longo['coluna'] = espec['coluna']
+
+        df_final = data_functions.montar_tabela_populacao(
+            df_longo, colunas,
+            coluna_nome=nivel['coluna_nome'],
+            separar_uf=nivel['separar_uf'],
+            coluna_total=espec.get('total'),
+            tipo=espec.get('tipo', 'int32')
+        ).reset_index()
+        span['linhas_entrada'] = len(df_longo)
+        span['linhas_saida'] = len(df_final)
+    return df_final
+
+
+def montar_datasets(plano, respostas):
+    """Retorna {nome do dataset: DataFrame}. Datasets com alguma requisição sem resposta são ignorados."""
+    datasets = {}
+    for dataset in plano['datasets']:
+        faltando = [plano['requisicoes'][c]['descricao'] for c in dataset['requisicoes'] if c not in respostas]
+        if faltando:
+            print(f"Dataset '{nome_dataset(dataset)}' ignorado: sem resposta para {faltando}")
+            continue
+        datasets[nome_dataset(dataset)] = montar_dataset(dataset, respostas)
+    return datasets
+
+
+def extrair_indicadores(especificacoes, request_params=None, cache_params=None):
+    """Planeja, executa e monta todas as especificações. Retorna {nome do dataset: DataFrame}."""
+    request_params = request_params or {}
+    plano = planejar_requisicoes(especificacoes, request_params.get('codigos_por_requisicao', 12))
+    imprimir_plano(plano)
+    respostas = executar_plano(plano, request_params, cache_params)
+    return montar_datasets(plano, respostas)
+
+
+def exportar_indicadores(datasets, pasta, formatos=('parquet',), opcoes=None):
+    """Grava cada dataset como `<pasta>/<nome>.<formato>`. Retorna a lista de arquivos gravados."""
+    arquivos = []
+    for nome, df in datasets.items():
+        arquivos.extend(exportacao.exportar_dataframe(df, os.path.join(pasta, nome), formatos, opcoes))
+    return arquivos
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Extrai os indicadores de config.INDICADORES_SIDRA.")
+    parser.add_argument('--apenas', help="Especificações a extrair, separadas por vírgula.")
+    parser.add_argument('--plano', action='store_true', help="Só mostra as requisições planejadas, sem executá-las.")
+    parser.add_argument('--refresh', action='store_true', help="Ignora o cache local e busca os dados novamente na API.")
+    args = parser.parse_args()
+
+    especificacoes = config.INDICADORES_SIDRA['especificacoes']
+    if args.apenas:
+        especificacoes = [espec for espec in especificacoes if espec['nome'] in args.apenas.split(',')]
+
+    if args.plano:
+        imprimir_plano(planejar_requisicoes(especificacoes, config.SIDRA_REQUISICAO['codigos_por_requisicao']))
+    else:
+        cache_params = dict(config.SIDRA_CACHE, atualizar=args.refresh or config.SIDRA_CACHE['atualizar'])
+        datasets = extrair_indicadores(especificacoes, config.SIDRA_REQUISICAO, cache_params)
+        exportar_indicadores(datasets, config.INDICADORES_SIDRA['pasta'], config.INDICADORES_SIDRA['formatos'], config.EXPORTACAO)
@@ -0,0 +1,433 @@
+# grafo_etapas.py
+"""
+Execução do pipeline como um grafo de etapas com checkpoints.
+
+Cada etapa declara as etapas de que depende, os parâmetros e os arquivos que
+lê. A impressão digital de uma etapa combina esses parâmetros, o conteúdo dos
+arquivos, a versão do código (a função e os módulos do projeto que ela usa) e a
+impressão do *resultado* de cada dependência.
+A saída de cada etapa concluída é gravada em `pasta_checkpoints/<etapa>/`:
+
+- se a impressão não mudou desde a última execução bem-sucedida, a etapa é
+  pulada e o resultado é lido do checkpoint (só se alguma etapa seguinte
+  precisar dele);
+- se uma etapa falha, as que dependem dela não rodam, mas as independentes
+  seguem até o fim; a próxima execução retoma dos checkpoints válidos;
+- etapas sem dependência entre si rodam em paralelo (`max_paralelo`).
+
+Como a impressão das dependências é a do resultado, uma extração refeita que
+traz os mesmos dados não obriga a exportar ou carregar tudo de novo.
+"""
+import contextvars
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import pandas as pd
+
+ARQUIVO_MANIFESTO = 'manifesto.json'
+ARQUIVO_SAIDA = 'saida.pkl'
+ARQUIVO_HASHES = 'hashes_arquivos.json'
+TAMANHO_BLOCO_HASH = 8 * 1024 * 1024
+
+
+def definir_etapa(nome, funcao, dependencias=(), parametros=None, argumentos=None, arquivos=(),
+                  checkpoint=True, validade_horas=None):
+    """
+    Declara uma etapa do grafo. `funcao` é chamada como
+    `funcao(*saidas_das_dependencias, **parametros, **argumentos)`.
+
+    - `parametros`: entram na impressão digital (mudou o parâmetro, a etapa roda de novo);
+    - `argumentos`: opções que não alteram o resultado (ex: cache, concorrência);
+    - `arquivos`: arquivos de entrada cujo conteúdo entra na impressão digital;
+    - `checkpoint=False`: a etapa sempre roda (ex: consultas ao banco);
+    - `validade_horas`: o checkpoint expira depois desse tempo (ex: dados de API).
+    """
+    return {
+        'nome': nome,
+        'funcao': funcao,
+        'dependencias': list(dependencias),
+        'parametros': parametros or {},
+        'argumentos': argumentos or {},
+        'arquivos': list(arquivos),
+        'checkpoint': checkpoint,
+        'validade_horas': validade_horas
+    }
+
+
+def ordenar_etapas(etapas):
+    """Ordem topológica das etapas. Levanta ValueError para dependências desconhecidas ou ciclos."""
+    por_nome = {etapa['nome']: etapa for etapa in etapas}
+    if len(por_nome) != len(etapas):
+        raise ValueError("Há etapas com o mesmo nome no grafo.")
+    for etapa in etapas:
+        desconhecidas = [d for d in etapa['dependencias'] if d not in por_nome]
+        if desconhecidas:
+            raise ValueError(f"Etapa '{etapa['nome']}' depende de etapas inexistentes: {desconhecidas}")
+
+    ordem, visitando, visitadas = [], set(), set()
+
+    def visitar(nome):
+        if nome in visitadas:
+            return
+        if nome in visitando:
+            raise ValueError(f"Ciclo de dependências envolvendo a etapa '{nome}'.")
+        visitando.add(nome)
+        for dependencia in por_nome[nome]['dependencias']:
+            visitar(dependencia)
+        visitando.discard(nome)
+        visitadas.add(nome)
+        ordem.append(por_nome[nome])
+
+    for etapa in etapas:
+        visitar(etapa['nome'])
+    return ordem
+
+
+# --- Impressões digitais ---
+def _sha256(conteudo):
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def _impressao_dataframe(df):
+    hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    esquema = json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()])
+    return hashlib.sha256(esquema.encode('utf-8') + hashes.tobytes()).hexdigest()
+
+
+def _forma_serializavel(valor):
+    """
+    Converte o resultado em JSON estável: DataFrames e Series (inclusive dentro de
+    listas, tuplas e dicionários) viram a impressão do seu conteúdo. Levanta
+    TypeError para objetos sem representação estável (o repr de um objeto
+    qualquer pode omitir dados ou mudar entre execuções).
+    """
+    if isinstance(valor, pd.Series):
+        valor = valor.to_frame()
+    if isinstance(valor, pd.DataFrame):
+        return {'dataframe': _impressao_dataframe(valor)}
+    if isinstance(valor, dict):
+        return {str(chave): _forma_serializavel(item) for chave, item in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_forma_serializavel(item) for item in valor]
+    if valor is None or isinstance(valor, (str, int, float, bool)):
+        return valor
+    raise TypeError(f"Resultado de etapa sem impressão estável: {type(valor).__name__}. "
+                    f"Retorne DataFrames, listas, dicionários ou valores simples.")
+
+
+def impressao_resultado(resultado):
+    """Impressão do conteúdo do resultado de uma etapa (DataFrame, None ou estrutura de listas/dicionários)."""
+    if resultado is None:
+        return None
+    if isinstance(resultado, pd.DataFrame):
+        return _impressao_dataframe(resultado)
+    return _sha256(json.dumps(_forma_serializavel(resultado), sort_keys=True))
+
+
+def _hash_arquivo(caminho, memo):
+    """
+    Hash do conteúdo do arquivo (None se não existir). O resultado fica
+    registrado por (tamanho, mtime) para não reler arquivos grandes que não mudaram.
+    """
+    try:
+        info = os.stat(caminho)
+    except FileNotFoundError:
+        return None
+    chave = os.path.abspath(caminho)
+    assinatura = [info.st_size, info.st_mtime_ns]
+    registrado = memo.get(chave)
+    if registrado and registrado['assinatura'] == assinatura:
+        return registrado['hash']
+
+    resumo = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        while bloco := f.read(TAMANHO_BLOCO_HASH):
+            resumo.update(bloco)
+    memo[chave] = {'assinatura': assinatura, 'hash': resumo.hexdigest()}
+    return memo[chave]['hash']
+
+
+def _codigo_funcao(funcao):
+    try:
+        return inspect.getsource(funcao)
+    except (OSError, TypeError):
+        return getattr(funcao, '__qualname__', repr(funcao))
+
+
+def _nomes_usados(codigo):
+    """Nomes globais e atributos referenciados pelo código, inclusive em funções internas e lambdas."""
+    nomes = set(codigo.co_names)
+    for constante in codigo.co_consts:
+        if inspect.iscode(constante):
+            nomes |= _nomes_usados(constante)
+    return nomes
+
+
+def _arquivo_local(objeto, pasta):
+    """Arquivo do módulo de `objeto` se ele for um módulo do projeto (da `pasta`), senão None."""
+    if callable(objeto):
+        objeto = inspect.unwrap(objeto) # funções decoradas (ex: lru_cache) apontam para o módulo original
+    modulo = objeto if inspect.ismodule(objeto) else inspect.getmodule(objeto)
+    arquivo = getattr(modulo, '__file__', None)
+    if arquivo and os.path.dirname(os.path.abspath(arquivo)) == pasta:
+        return os.path.abspath(arquivo)
+    return None
+
+
+def versao_codigo(funcao, memo_hashes):
+    """
+    Versão do código de uma etapa: o fonte da função e das funções do mesmo
+    módulo que ela chama, mais o hash dos módulos do projeto (os da pasta do
+    módulo da função) que ela usa, direta ou indiretamente. Mudar
+    data_functions.py invalida a extração, mas não o tratamento dos contratos.
+    """
+    modulo = inspect.getmodule(funcao)
+    arquivo_modulo = os.path.abspath(getattr(modulo, '__file__', None) or os.curdir)
+    pasta = os.path.dirname(arquivo_modulo)
+
+    fontes, arquivos = {}, set()
+    funcoes = [funcao]
+    while funcoes:
+        atual = funcoes.pop()
+        nome = getattr(atual, '__qualname__', repr(atual))
+        if nome in fontes:
+            continue
+        fontes[nome] = _sha256(_codigo_funcao(atual))
+        codigo = getattr(atual, '__code__', None)
+        globais = getattr(atual, '__globals__', {})
+        for objeto in (globais.get(n) for n in (_nomes_usados(codigo) if codigo else ())):
+            if objeto is None or objeto is funcao:
+                continue
+            if inspect.isfunction(objeto) and inspect.getmodule(objeto) is modulo:
+                funcoes.append(objeto)
+            elif (arquivo := _arquivo_local(objeto, pasta)) and arquivo != arquivo_modulo:
+                arquivos.add(arquivo)
+
+    # Fecho dos módulos do projeto importados pelos módulos usados
+    pendentes = list(arquivos)
+    modulos_por_arquivo = {os.path.abspath(m.__file__): m for m in list(sys.modules.values())
+                           if getattr(m, '__file__', None)}
+    while pendentes:
+        modulo_usado = modulos_por_arquivo.get(pendentes.pop())
+        for objeto in vars(modulo_usado).values() if modulo_usado else ():
+            arquivo = _arquivo_local(objeto, pasta)
+            if arquivo and arquivo not in arquivos:
+                arquivos.add(arquivo)
+                pendentes.append(arquivo)
+
+    return {
+        'fontes': fontes,
+        'modulos': {os.path.basename(arquivo): _hash_arquivo(arquivo, memo_hashes) for arquivo in sorted(arquivos)}
+    }
+
+
+def impressao_etapa(etapa, impressoes_dependencias, hashes_arquivos, codigo=None):
+    """
+    Impressão digital da etapa. `codigo` é a versão do código (ver `versao_codigo`);
+    sem ele, só o fonte da função da etapa entra na impressão.
+    """
+    identificacao = {
+        'nome': etapa['nome'],
+        'codigo': codigo or _sha256(_codigo_funcao(etapa['funcao'])),
+        'parametros': etapa['parametros'],
+        'dependencias': {d: impressoes_dependencias[d] for d in etapa['dependencias']},
+        'arquivos': hashes_arquivos
+    }
+    return _sha256(json.dumps(identificacao, sort_keys=True, default=str))
+
+
+# --- Checkpoints ---
+def _pasta_etapa(pasta, nome):
+    return os.path.join(pasta, nome)
+
+
+def _gravar_atomico(caminho, gravar):
+    temporario = f"{caminho}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+    gravar(temporario)
+    os.replace(temporario, caminho)
+
+
+def ler_manifesto(pasta, nome):
+    try:
+        with open(os.path.join(_pasta_etapa(pasta, nome), ARQUIVO_MANIFESTO), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _checkpoint_valido(etapa, manifesto, impressao):
+    if not etapa['checkpoint'] or manifesto is None or manifesto.get('impressao') != impressao:
+        return False
+    if etapa['validade_horas'] is not None:
+        idade_horas = (datetime.now() - datetime.fromisoformat(manifesto['concluida_em'])).total_seconds() / 3600
+        if idade_horas > etapa['validade_horas']:
+            return False
+    # Arquivos gerados pela etapa (ex: exportações) precisam continuar existindo
+    return all(os.path.exists(caminho) for caminho in manifesto.get('arquivos_gerados', []))
+
+
+def _arquivos_gerados(resultado):
+    if isinstance(resultado, (list, tuple)) and resultado and all(isinstance(r, str) for r in resultado):
+        return [r for r in resultado if os.path.exists(r)]
+    return []
+
+
+def gravar_checkpoint(pasta, etapa, impressao, resultado, duracao_s):
+    destino = _pasta_etapa(pasta, etapa['nome'])
+    os.makedirs(destino, exist_ok=True)
+    # Sem manifesto durante a troca: uma interrupção aqui nunca associa a saída nova a uma impressão antiga
+    try:
+        os.remove(os.path.join(destino, ARQUIVO_MANIFESTO))
+    except FileNotFoundError:
+        pass
+    if resultado is not None:
+        def gravar_saida(caminho):
+            with open(caminho, 'wb') as f:
+                pickle.dump(resultado, f, protocol=pickle.HIGHEST_PROTOCOL)
+        _gravar_atomico(os.path.join(destino, ARQUIVO_SAIDA), gravar_saida)
+
+    manifesto = {
+        'etapa': etapa['nome'],
+        'impressao': impressao,
+        'impressao_resultado': impressao_resultado(resultado),
+        'tem_saida': resultado is not None,
+        'arquivos_gerados': _arquivos_gerados(resultado),
+        'concluida_em': datetime.now().isoformat(timespec='seconds'),
+        'duracao_s': round(duracao_s, 3)
+    }
+
+    def gravar_manifesto(caminho):
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump(manifesto, f, indent=2, ensure_ascii=False)
+    # O manifesto é gravado por último: ele só existe quando a saída está completa
+    _gravar_atomico(os.path.join(destino, ARQUIVO_MANIFESTO), gravar_manifesto)
+    return manifesto
+
+
+def ler_checkpoint(pasta, nome):
+    manifesto = ler_manifesto(pasta, nome)
+    if not manifesto or not manifesto['tem_saida']:
+        return None
+    with open(os.path.join(_pasta_etapa(pasta, nome), ARQUIVO_SAIDA), 'rb') as f:
+        return pickle.load(f)
+
+
+def _ler_hashes(pasta):
+    try:
+        with open(os.path.join(pasta, ARQUIVO_HASHES), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _gravar_hashes(pasta, memo):
+    def gravar(caminho):
+        with open(caminho, 'w', encoding='utf-8') as f:
+            json.dump(memo, f, indent=2)
+    _gravar_atomico(os.path.join(pasta, ARQUIVO_HASHES), gravar)
+
+
+# --- Execução ---
+def executar_grafo(etapas, pasta_checkpoints, max_paralelo=1, forcar=()):
+    """
+    Executa as etapas respeitando as dependências e os checkpoints em
+    `pasta_checkpoints`. `forcar` lista etapas executadas mesmo com checkpoint
+    válido ('todas' força o grafo inteiro).
+
+    Retorna {etapa: status}, com status 'executada', 'pulada', 'falhou' ou
+    'bloqueada' (dependência falhou). Se alguma etapa falhar, as demais
+    independentes terminam e um RuntimeError é levantado ao final.
+    """
+    ordem = ordenar_etapas(etapas)
+    por_nome = {etapa['nome']: etapa for etapa in ordem}
+    forcar = set(por_nome) if 'todas' in forcar else set(forcar)
+    desconhecidas = forcar - set(por_nome)
+    if desconhecidas:
+        raise ValueError(f"Etapas desconhecidas em 'forcar': {sorted(desconhecidas)}")
+
+    os.makedirs(pasta_checkpoints, exist_ok=True)
+    memo_hashes = _ler_hashes(pasta_checkpoints)
+
+    status = {}
+    impressoes_resultado = {} # impressão do resultado de cada etapa concluída ou pulada
+    resultados = {} # resultados em memória (os das etapas puladas são lidos sob demanda)
+
+    def resultado_de(nome):
+        if nome not in resultados:
+            resultados[nome] = ler_checkpoint(pasta_checkpoints, nome)
+        return resultados[nome]
+
+    def executar(etapa, entradas):
+        inicio = time.perf_counter()
+        resultado = etapa['funcao'](*entradas, **etapa['parametros'], **etapa['argumentos'])
+        return resultado, time.perf_counter() - inicio
+
+    pendentes = list(ordem)
+    em_execucao = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_paralelo)) as executor:
+        while pendentes or em_execucao:
+            # Decide, na ordem topológica, o que pode ser pulado ou iniciado agora
+            for etapa in list(pendentes):
+                nome = etapa['nome']
+                estados_deps = [status.get(d) for d in etapa['dependencias']]
+                if any(s in ('falhou', 'bloqueada') for s in estados_deps):
+                    status[nome] = 'bloqueada'
+                    pendentes.remove(etapa)
+                    print(f"[grafo] '{nome}' não executada: dependência falhou.")
+                    continue
+                if not all(s in ('executada', 'pulada') for s in estados_deps):
+                    continue
+
+                hashes_arquivos = {caminho: _hash_arquivo(caminho, memo_hashes) for caminho in etapa['arquivos']}
+                codigo = versao_codigo(etapa['funcao'], memo_hashes)
+                impressao = impressao_etapa(etapa, impressoes_resultado, hashes_arquivos, codigo)
+                manifesto = ler_manifesto(pasta_checkpoints, nome)
+                pendentes.remove(etapa)
+
+                if nome not in forcar and _checkpoint_valido(etapa, manifesto, impressao):
+                    status[nome] = 'pulada'
+                    impressoes_resultado[nome] = manifesto['impressao_resultado']
+                    print(f"[grafo] '{nome}' pulada: entradas inalteradas desde {manifesto['concluida_em']}.")
+                    continue
+
+                print(f"[grafo] Executando '{nome}'...")
+                entradas = [resultado_de(d) for d in etapa['dependencias']]
+                # Roda no contexto de quem chamou o grafo: spans abertos na etapa ficam ligados ao span atual
+                em_execucao[executor.submit(contextvars.copy_context().run, executar, etapa, entradas)] = (etapa, impressao)
+
+            if not em_execucao:
+                continue
+
+            concluidas, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+            for futuro in concluidas:
+                etapa, impressao = em_execucao.pop(futuro)
+                nome = etapa['nome']
+                try:
+                    resultado, duracao = futuro.result()
+                    if etapa['checkpoint']:
+                        manifesto = gravar_checkpoint(pasta_checkpoints, etapa, impressao, resultado, duracao)
+                        impressoes_resultado[nome] = manifesto['impressao_resultado']
+                    else:
+                        impressoes_resultado[nome] = impressao_resultado(resultado)
+                except Exception as e:
+                    status[nome] = 'falhou'
+                    print(f"[grafo] Erro na etapa '{nome}': {type(e).__name__}: {e}")
+                    continue
+
+                resultados[nome] = resultado
+                status[nome] = 'executada'
+                print(f"[grafo] '{nome}' concluída em {duracao:.2f}s.")
+
+    _gravar_hashes(pasta_checkpoints, memo_hashes)
+
+    falhas = [nome for nome, s in status.items() if s == 'falhou']
+    if falhas:
+        raise RuntimeError(f"Etapas com falha: {falhas}. Execute novamente para retomar dos checkpoints.")
+    return status
@@ -0,0 +1,221 @@
+# instrumentacao.py
+"""
+Medição das etapas do pipeline.
+
+Cada etapa é aberta com `with etapa('nome', atributo=...) as span:` e registra
+tempo de parede e de CPU, linhas e bytes de entrada/saída, pico de memória,
+tentativas de requisição, o status e o span pai ('pai', o 'id' da etapa em que
+ela foi aberta). Ao fechar, o span vira uma linha JSON no
+log (`configurar(log_json=...)`) e entra no resumo e no arquivo de métricas no
+formato texto do Prometheus (`escrever_prometheus`).
+
+Contadores como bytes baixados e novas tentativas são somados ao span aberto no
+contexto atual com `contar(...)`, sem precisar passá-lo entre as funções. Threads
+de um pool não herdam esse contexto: submeta o trabalho com `no_contexto_atual`
+para que os spans abertos nelas fiquem ligados à etapa que as criou.
+"""
+import contextvars
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# Campos numéricos somados por `contar` e exportados como métricas
+CONTADORES = ['linhas_entrada', 'linhas_saida', 'bytes_entrada', 'bytes_saida', 'tentativas']
+
+_CONFIG = {
+    'log_json': None, # arquivo JSONL com um span por linha
+    'medir_memoria': False, # pico de memória por etapa via tracemalloc (deixa o código mais lento)
+    'perfil': None, # nome da etapa a ser perfilada com cProfile
+    'pasta_perfil': '.' # onde o arquivo .prof é gravado
+}
+
+_SPANS = []
+_TRAVA = threading.Lock()
+_SPAN_ATUAL = contextvars.ContextVar('span_atual', default=None)
+_IDS = itertools.count(1)
+_PERFIL_USADO = threading.Event()
+
+
+def configurar(**opcoes):
+    """Ajusta as opções da instrumentação (ver _CONFIG) e limpa os spans já registrados."""
+    desconhecidas = set(opcoes) - set(_CONFIG)
+    if desconhecidas:
+        raise ValueError(f"Opções de instrumentação desconhecidas: {sorted(desconhecidas)}")
+    _CONFIG.update(opcoes)
+    with _TRAVA:
+        _SPANS.clear()
+    _PERFIL_USADO.clear()
+    if _CONFIG['medir_memoria'] and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def contar(campo, valor=1):
+    """Soma `valor` ao campo do span aberto no contexto atual (sem efeito fora de um span)."""
+    span = _SPAN_ATUAL.get()
+    if span is not None:
+        # Várias threads do pool podem somar no mesmo span
+        with _TRAVA:
+            span[campo] = span.get(campo, 0) + valor
+
+
+def no_contexto_atual(funcao):
+    """
+    Envolve `funcao` para rodar, em outra thread, no contexto de quem a envolveu:
+    o span aberto aqui continua sendo o atual (pai dos novos spans e destino de
+    `contar`). Uso: `executor.map(no_contexto_atual(funcao), itens)`.
+    """
+    contexto = contextvars.copy_context()
+
+    def executar(*args, **kwargs):
+        # Um mesmo Context não pode estar ativo em duas threads: cada chamada usa uma cópia
+        return contexto.copy().run(funcao, *args, **kwargs)
+    return executar
+
+
+def spans():
+    """Spans já encerrados, na ordem de término."""
+    with _TRAVA:
+        return list(_SPANS)
+
+
+def _rss_pico_processo_mb():
+    # ru_maxrss é o pico do processo inteiro desde o início (KB no Linux), não o da etapa
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _iniciar_perfil(nome):
+    if _CONFIG['perfil'] != nome or _PERFIL_USADO.is_set():
+        return None
+    _PERFIL_USADO.set() # perfila só a primeira ocorrência da etapa
+    perfil = cProfile.Profile()
+    perfil.enable()
+    return perfil
+
+
+def _encerrar_perfil(perfil, nome):
+    perfil.disable()
+    caminho = os.path.join(_CONFIG['pasta_perfil'], f'perfil_{nome}.prof')
+    perfil.dump_stats(caminho)
+
+    saida = io.StringIO()
+    pstats.Stats(perfil, stream=saida).sort_stats('cumulative').print_stats(20)
+    print(f"\nPerfil da etapa '{nome}' gravado em '{caminho}':")
+    print(saida.getvalue())
+
+
+def _registrar(span):
+    with _TRAVA:
+        _SPANS.append(span)
+        if _CONFIG['log_json']:
+            os.makedirs(os.path.dirname(_CONFIG['log_json']) or '.', exist_ok=True)
+            with open(_CONFIG['log_json'], 'a', encoding='utf-8') as f:
+                f.write(json.dumps(span, ensure_ascii=False, default=str) + '\n')
+
+
+@contextmanager
+def etapa(nome, **atributos):
+    """
+    Mede a etapa `nome`. O span (um dicionário) é devolvido para que a etapa
+    informe linhas e bytes, ex: `span['linhas_saida'] = len(df)`. Exceções são
+    registradas no span (status 'erro') e propagadas.
+    """
+    pai = _SPAN_ATUAL.get()
+    span = {
+        'etapa': nome, 'id': next(_IDS), 'pai': pai['id'] if pai is not None else None,
+        'inicio': datetime.now().isoformat(timespec='milliseconds'), 'atributos': atributos
+    }
+    token = _SPAN_ATUAL.set(span)
+    perfil = _iniciar_perfil(nome)
+    # O pico do tracemalloc é global: com etapas aninhadas ou em paralelo, o valor é aproximado
+    medir_memoria = _CONFIG['medir_memoria'] and tracemalloc.is_tracing()
+    if medir_memoria:
+        memoria_inicial = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    inicio_parede = time.perf_counter()
+    inicio_cpu = time.thread_time()
+    span['status'] = 'ok'
+    try:
+        yield span
+    except BaseException as e:
+        span['status'] = 'erro'
+        span['erro'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        # CPU da thread atual: etapas executadas em threads do pool medem só o próprio trabalho
+        span['cpu_s'] = round(time.thread_time() - inicio_cpu, 4)
+        span['duracao_s'] = round(time.perf_counter() - inicio_parede, 4)
+        if medir_memoria:
+            span['memoria_pico_mb'] = round((tracemalloc.get_traced_memory()[1] - memoria_inicial) / 1024 ** 2, 2)
+        span['rss_pico_processo_mb'] = _rss_pico_processo_mb()
+        if perfil is not None:
+            _encerrar_perfil(perfil, nome)
+        _SPAN_ATUAL.reset(token)
+        _registrar(span)
+
+
+def resumo():
+    """Imprime uma tabela com o total de tempo, CPU, linhas e tentativas de cada etapa."""
+    totais = {}
+    for span in spans():
+        total = totais.setdefault(span['etapa'], {'spans': 0, 'duracao_s': 0.0, 'cpu_s': 0.0, **{c: 0 for c in CONTADORES}})
+        total['spans'] += 1
+        for campo in ['duracao_s', 'cpu_s'] + CONTADORES:
+            total[campo] += span.get(campo, 0)
+
+    print("\n--- Tempo por etapa ---")
+    print(f"{'etapa':<14}{'spans':>6}{'parede(s)':>11}{'cpu(s)':>9}{'linhas entrada':>16}{'linhas saída':>14}"
+          f"{'bytes entrada':>15}{'bytes saída':>13}{'tentativas':>11}")
+    for nome, total in totais.items():
+        print(f"{nome:<14}{total['spans']:>6}{total['duracao_s']:>11.3f}{total['cpu_s']:>9.3f}{total['linhas_entrada']:>16}"
+              f"{total['linhas_saida']:>14}{total['bytes_entrada']:>15}{total['bytes_saida']:>13}{total['tentativas']:>11}")
+
+
+def _escapar_rotulo(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _rotulos(span):
+    rotulos = {'etapa': span['etapa'], 'status': span['status'], **span['atributos']}
+    return ','.join(f'{chave}="{_escapar_rotulo(valor)}"' for chave, valor in rotulos.items())
+
+
+def escrever_prometheus(caminho, prefixo='pipeline_populacao'):
+    """
+    Grava as métricas dos spans no formato texto do Prometheus (para o textfile
+    collector do node_exporter). Spans com os mesmos rótulos são somados.
+    """
+    metricas = {
+        'duracao_segundos': 'duracao_s',
+        'cpu_segundos': 'cpu_s',
+        **{c: c for c in CONTADORES}
+    }
+    series = {}
+    for span in spans():
+        rotulos = _rotulos(span)
+        for metrica, campo in metricas.items():
+            series[(metrica, rotulos)] = series.get((metrica, rotulos), 0) + span.get(campo, 0)
+        if 'memoria_pico_mb' in span:
+            chave = ('memoria_pico_mb', rotulos)
+            series[chave] = max(series.get(chave, 0), span['memoria_pico_mb'])
+
+    linhas = []
+    for metrica in dict.fromkeys(m for m, _ in series):
+        linhas.append(f'# TYPE {prefixo}_{metrica} gauge')
+        linhas.extend(f'{prefixo}_{m}{{{rotulos}}} {valor}' for (m, rotulos), valor in series.items() if m == metrica)
+
+    # Grava em um temporário e renomeia: o coletor nunca lê um arquivo pela metade
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    temporario = f'{caminho}.{os.getpid()}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(linhas) + '\n')
+    os.replace(temporario, caminho)
@@ -1,37 +1,168 @@
 # main.py
+import argparse
+import os
 from datetime import datetime
 import config
-import data_functions
 import db_functions as db
+import exportacao
+import extracao_sidra
+import grafo_etapas
+import instrumentacao
+import pipeline_contratos
+import serie_historica
 
-def run_pipeline():
-    """Executa o pipeline completo de extração, transformação e carga."""
-    
-    # # 1. Obtém os dados já processados com uma única chamada de função
-    df_final = data_functions.ibge_mun_pop(
-        config.FAIXAS_ETARIAS, 
-        config.SIDRA_API_POP
-    )
-    
-    if df_final.empty:
-        print("Pipeline encerrado pois não foram encontrados dados.")
-        return
+# Etapas medidas pela instrumentação (nomes aceitos por --profile)
+ETAPAS = ['extracao', 'busca', 'montagem', 'exportacao', 'carga_banco', 'consulta', 'contratos']
+
+def extrair_sidra(especificacoes, request_params, cache_params):
+    """
+    Extrai todos os indicadores de config.INDICADORES_SIDRA, inclusive a população
+    por faixa etária dos municípios, em um único plano de requisições (ver
+    extracao_sidra.py). Falha se algum dataset não for obtido; na próxima execução
+    as respostas já obtidas vêm do cache do SIDRA.
+    """
+    with instrumentacao.etapa('extracao') as span:
+        datasets = extracao_sidra.extrair_indicadores(especificacoes, request_params, cache_params)
+        span['linhas_saida'] = sum(len(df) for df in datasets.values())
+        span['bytes_saida'] = int(sum(df.memory_usage(deep=True).sum() for df in datasets.values()))
+
+    esperados = sum(len(espec['niveis']) for espec in especificacoes)
+    if len(datasets) < esperados:
+        raise RuntimeError(f"{esperados - len(datasets)} de {esperados} datasets do SIDRA não foram obtidos.")
+    return datasets
+
+def extrair_populacao(datasets, dataset):
+    """Seleciona a tabela de população por faixa etária dos municípios na extração do SIDRA."""
+    df_final = datasets.get(dataset)
+    if df_final is None or df_final.empty:
+        raise ValueError("Pipeline encerrado pois não foram encontrados dados.")
 
     print("\nDataFrame final pronto para ser carregado:")
     print(df_final.head())
-    
-    # 2. Carrega os dados no Banco de Dados (lógica do db)
-    engine = db.create_db_engine(config.DB_CONFIG)
-    #db.create_tables(engine)
-    #db.load_dataframe_to_tables(df_final, 'bi_populacao_por_faixa_etaria', engine)
+    return df_final
+
+def exportar_populacao(df_final, caminho_base, formatos, opcoes):
+    return exportacao.exportar_dataframe(df_final, caminho_base, formatos, opcoes)
+
+def gravar_serie_historica(df_final, ano, pasta):
+    return [serie_historica.gravar_ano(df_final, ano, pasta)]
+
+def carregar_banco(df_final, table_name, modo, opcoes, banco):
+    """
+    Grava a extração no banco conforme `modo` ('bulk', 'incremental' ou None).
+    `banco` (host e nome) só identifica o destino na impressão digital da etapa.
+    """
+    engine = db.create_db_engine(config.DB_CONFIG, config.DB_POOL)
+    if modo == 'bulk':
+        db.bulk_load_dataframe(df_final, table_name, engine, **opcoes)
+    elif modo == 'incremental':
+        return db.incremental_load_dataframe(df_final, table_name, engine, **opcoes)
+    elif modo is not None:
+        raise ValueError(f"Modo de carga desconhecido: '{modo}'. Opções: 'bulk', 'incremental' ou None")
 
+def consultar_banco(_carga, query, params):
+    engine = db.create_db_engine(config.DB_CONFIG, config.DB_POOL)
+    print(db.query_execute(query, engine, params))
+
+def tratar_contratos(arquivo_entrada, arquivo_saida):
+    """Limpa o arquivo de contratos, se ele existir. Retorna o arquivo gerado."""
+    if not os.path.exists(arquivo_entrada):
+        print(f"Arquivo de contratos '{arquivo_entrada}' não encontrado; tratamento ignorado.")
+        return None
+    with instrumentacao.etapa('contratos') as span:
+        pipeline_contratos.processar_contratos(arquivo_entrada, arquivo_saida)
+        span['bytes_entrada'] = os.path.getsize(arquivo_entrada)
+    return [arquivo_saida]
+
+def exportar_indicadores(datasets, pasta, formatos):
+    """Grava cada indicador extraído em seus próprios arquivos."""
+    return extracao_sidra.exportar_indicadores(datasets, pasta, formatos, config.EXPORTACAO)
+
+def montar_grafo(atualizar_cache=False):
+    """Declara as etapas do pipeline e suas dependências (ver grafo_etapas.py)."""
+    cache_params = dict(config.SIDRA_CACHE, atualizar=atualizar_cache or config.SIDRA_CACHE['atualizar'])
     data_hoje = datetime.now().strftime("%Y-%m-%d")
-    caminho_arquivo_csv = f"dados_exportados/populacao_ibge_{data_hoje}.csv"
-    
-    db.save_dataframe_to_csv(df_final, caminho_arquivo_csv)
+    carga = config.DB_CARGA_INCREMENTAL if config.DB_CARGA_MODO == 'incremental' else config.DB_CARGA
 
+    return [
+        # Uma única extração atende a população e os demais indicadores (requisições compartilhadas).
+        # Os dados do Censo mudam pouco: ela vale pelo mesmo prazo do cache do SIDRA
+        grafo_etapas.definir_etapa(
+            'extracao_sidra', extrair_sidra,
+            parametros={'especificacoes': config.INDICADORES_SIDRA['especificacoes']},
+            argumentos={'request_params': config.SIDRA_REQUISICAO, 'cache_params': cache_params},
+            validade_horas=config.SIDRA_CACHE['ttl_horas']
+        ),
+        grafo_etapas.definir_etapa(
+            'extracao', extrair_populacao, dependencias=['extracao_sidra'],
+            parametros={'dataset': config.INDICADORES_SIDRA['dataset_populacao']}
+        ),
+        grafo_etapas.definir_etapa(
+            'exportacao', exportar_populacao, dependencias=['extracao'],
+            parametros={'caminho_base': f"dados_exportados/populacao_ibge_{data_hoje}",
+                        'formatos': config.EXPORTACAO['formatos'], 'opcoes': config.EXPORTACAO}
+        ),
+        grafo_etapas.definir_etapa(
+            'serie_historica', gravar_serie_historica, dependencias=['extracao'],
+            parametros={'ano': config.SERIE_HISTORICA['ano_referencia'], 'pasta': config.SERIE_HISTORICA['pasta']}
+        ),
+        grafo_etapas.definir_etapa(
+            'carga_banco', carregar_banco, dependencias=['extracao'],
+            parametros={'table_name': config.DB_TABLE_NAME, 'modo': config.DB_CARGA_MODO, 'opcoes': carga,
+                        # Outro banco de destino refaz a carga (a senha nunca entra na impressão digital)
+                        'banco': {'host': config.DB_CONFIG['host'], 'name': config.DB_CONFIG['name']}}
+        ),
+        # A consulta lê o estado atual do banco: sempre executada
+        grafo_etapas.definir_etapa(
+            'consulta', consultar_banco, dependencias=['carga_banco'],
+            parametros={'query': config.QUERY_CIDADES_MG, 'params': config.PARAMS_CIDADES_MG},
+            checkpoint=False
+        ),
+        grafo_etapas.definir_etapa(
+            'indicadores', exportar_indicadores, dependencias=['extracao_sidra'],
+            parametros={'pasta': config.INDICADORES_SIDRA['pasta'], 'formatos': config.INDICADORES_SIDRA['formatos']}
+        ),
+        grafo_etapas.definir_etapa(
+            'contratos', tratar_contratos,
+            parametros={'arquivo_entrada': config.CONTRATOS['entrada'], 'arquivo_saida': config.CONTRATOS['saida']},
+            arquivos=[config.CONTRATOS['entrada']]
+        )
+    ]
 
-    print(db.query_execute(config.QUERY_CIDADES_MG, engine))
+def run_pipeline(atualizar_cache=False, forcar=()):
+    """
+    Executa o pipeline de extração, transformação e carga como um grafo de
+    etapas: etapas com entradas inalteradas são puladas, as independentes
+    rodam em paralelo e uma execução que falhou retoma dos checkpoints.
+    """
+    # --refresh busca os dados de novo mesmo com o checkpoint da extração válido
+    forcar = set(forcar) | ({'extracao_sidra'} if atualizar_cache else set())
+    status = grafo_etapas.executar_grafo(
+        montar_grafo(atualizar_cache),
+        config.GRAFO_ETAPAS['pasta_checkpoints'],
+        max_paralelo=config.GRAFO_ETAPAS['max_paralelo'],
+        forcar=forcar
+    )
+    print("\nEtapas: " + ", ".join(f"{nome}={situacao}" for nome, situacao in status.items()))
+    return status
 
 if __name__ == "__main__":
-    run_pipeline()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Pipeline de população por faixa etária (IBGE/SIDRA).")
+    parser.add_argument('--refresh', action='store_true', help="Ignora o cache local e busca os dados novamente na API.")
+    parser.add_argument('--profile', choices=ETAPAS, help="Gera o perfil (cProfile) da primeira execução da etapa informada.")
+    parser.add_argument('--forcar', action='append', default=[], metavar='ETAPA',
+                        help="Executa a etapa mesmo com checkpoint válido (pode repetir; 'todas' força o grafo inteiro).")
+    parser.add_argument('--medir-memoria', action='store_true', help="Mede o pico de memória de cada etapa (mais lento).")
+    args = parser.parse_args()
+
+    instrumentacao.configurar(
+        log_json=config.INSTRUMENTACAO['log_json'],
+        medir_memoria=args.medir_memoria or config.INSTRUMENTACAO['medir_memoria'],
+        perfil=args.profile
+    )
+    try:
+        run_pipeline(atualizar_cache=args.refresh, forcar=args.forcar)
+    finally:
+        instrumentacao.resumo()
+        if config.INSTRUMENTACAO['prometheus']:
+            instrumentacao.escrever_prometheus(config.INSTRUMENTACAO['prometheus'])
\ No newline at end of file
@@ -0,0 +1,71 @@
+# normalizacao.py
+
+import re
+
+import numpy as np
+import pandas as pd
+
+# Marcas combinantes que sobram depois da decomposição NFD (acentos, til, cedilha...)
+RE_MARCAS_COMBINANTES = re.compile('[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]')
+RE_NAO_ALFANUMERICO = re.compile(r'[^0-9a-z]+')
+
+# Limite de entradas da memória compartilhada; ao ser atingido, ela é esvaziada
+TAMANHO_MAX_MEMO = 200_000
+
+# Texto original -> texto normalizado. A memória vale para o processo: é
+# compartilhada pelos módulos que importam este (ETL ou dashboard), não entre eles
+_MEMO = {}
+# Marca de ausência na memória: lida com .get, uma consulta não quebra se outra thread esvaziar a memória
+_AUSENTE = object()
+
+
+def _normalizar_valores(valores):
+    """Normaliza, de forma vetorizada, uma lista de strings distintas."""
+    serie = pd.Series(valores, dtype=object).str.lower().str.normalize('NFD')
+    serie = serie.str.replace(RE_MARCAS_COMBINANTES, '', regex=True)
+    return serie.str.replace(RE_NAO_ALFANUMERICO, ' ', regex=True).str.strip().tolist()
+
+
+def _memorizar(valores):
+    """
+    Retorna {valor: normalizado} para `valores`, normalizando só os que ainda não
+    estão na memória e guardando-os nela.
+    """
+    resultado = {v: _MEMO.get(v, _AUSENTE) for v in valores}
+    novos = [v for v, normalizado in resultado.items() if normalizado is _AUSENTE]
+    if novos:
+        resultado.update(zip(novos, _normalizar_valores(novos)))
+        if len(_MEMO) + len(novos) > TAMANHO_MAX_MEMO:
+            _MEMO.clear()
+        _MEMO.update((v, resultado[v]) for v in novos)
+    return resultado
+
+
+def normalizar_texto(texto):
+    """
+    Forma canônica usada na comparação de nomes: sem acentos, minúscula e com
+    pontuação (hífens, apóstrofos, pontos) trocada por espaço.
+    Ex: "Olhos-d'Água" -> "olhos d agua". Valores que não são texto voltam como estão.
+    """
+    if not isinstance(texto, str):
+        return texto
+    normalizado = _MEMO.get(texto, _AUSENTE)
+    if normalizado is not _AUSENTE:
+        return normalizado
+    return _memorizar([texto])[texto]
+
+
+def normalizar_serie(serie):
+    """
+    Versão de `normalizar_texto` para uma coluna inteira.
+
+    Só os valores distintos ainda não vistos são normalizados (de uma vez, com os
+    métodos .str do pandas); o resultado é espalhado para as linhas pelos códigos
+    do factorize. Nulos continuam nulos.
+    """
+    codigos, unicos = pd.factorize(serie)
+    memo = _memorizar([u for u in unicos if isinstance(u, str)])
+
+    normalizados = np.array([memo.get(u, u) for u in unicos] + [np.nan], dtype=object)
+    # Código -1 (nulo) aponta para o np.nan acrescentado no final
+    return pd.Series(normalizados[codigos], index=serie.index, name=serie.name)
@@ -0,0 +1,208 @@
+import argparse
+import csv
+import io
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from CON_CSV import limpar_municipio_avancado
+from trataArqCon import CABECALHO_SAIDA, INICIO_REGISTRO, TAMANHO_BUFFER, formatar_data, reconstruir_registros
+
+# Tamanho aproximado (em bytes) de cada parte no processamento multiprocesso
+TAMANHO_SHARD = 64 * 1024 * 1024
+
+# Colunas do arquivo de origem (MunipCOn.txt), na ordem
+COLUNAS_ENTRADA = [
+    "CHAMADO", "ID_JIRA", "UF", "MUNICIPIO", "TIPO_ETABELECIMENTO",
+    "CONCORRENTE", "STATUS", "DATA_INI", "DATA_FIM"
+]
+
+def carregar_contratos(f_in):
+    """Remonta os registros do arquivo aberto e carrega os que têm 9 colunas em um DataFrame."""
+    leitor_csv = csv.reader(reconstruir_registros(f_in), delimiter=';')
+    next(leitor_csv, None) # Pula o cabeçalho original
+    registros = [linha for linha in leitor_csv if len(linha) == len(COLUNAS_ENTRADA)]
+    return pd.DataFrame(registros, columns=COLUNAS_ENTRADA, dtype=object)
+
+def _formatar_datas(serie):
+    """Converte 'dd/mm/yyyy' para 'YYYY-MM-DD' nos valores únicos; inválidos ficam como estão."""
+    codigos, valores = pd.factorize(serie.str.strip())
+    valores = pd.Series(valores, dtype=object)
+    datas = pd.to_datetime(valores, format='%d/%m/%Y', errors='coerce')
+    formatadas = datas.dt.strftime('%Y-%m-%d').astype(object)
+    # Datas fora do intervalo do pandas (ex: ano 2300) passam pelo strptime original
+    formatadas[datas.isna()] = valores[datas.isna()].map(formatar_data)
+    return pd.Series(formatadas.to_numpy()[codigos], index=serie.index)
+
+def _limpar_municipios(municipios, ufs):
+    """
+    Aplica as duas limpezas de município (trataArqCon e CON_CSV) apenas aos pares
+    (município, UF) distintos e devolve o resultado para todas as linhas.
+    """
+    pares = pd.DataFrame({'municipio': municipios, 'uf': ufs})
+    # Numera os pares pela ordem de aparição, a mesma ordem de drop_duplicates
+    codigos = pares.groupby(['municipio', 'uf'], sort=False).ngroup().to_numpy()
+    unicos = pares.drop_duplicates().reset_index(drop=True)
+
+    # Limpeza do trataArqCon, vetorizada: remove a UF do final e o prefixo "MUNICÍPIO DE"
+    nomes = unicos['municipio'].str.strip()
+    nomes = nomes.str.replace(r'\s*-\s*[A-Z]{2}\s*$|\s*/\s*[A-Z]{2}\s*$', '', n=1, regex=True)
+    nomes = nomes.str.replace(r"^(MUNICÍPIO DE|: MUNICÍPIO DE)\s*", "", n=1, case=False, regex=True).str.strip()
+
+    # Limpeza avançada do CON_CSV (com cache), uma vez por par distinto
+    limpos = [limpar_municipio_avancado(nome, uf) for nome, uf in zip(nomes, unicos['uf'])]
+    return pd.Series(pd.Series(limpos, dtype=object).to_numpy()[codigos], index=municipios.index)
+
+def tratar_contratos(df):
+    """Aplica todas as tratativas ao DataFrame bruto e retorna as colunas de saída."""
+    df_final = pd.DataFrame({
+        "CHAMADO": df["CHAMADO"].str.strip(),
+        "UF": df["UF"].str.strip(),
+        "TIPO_ETABELECIMENTO": df["TIPO_ETABELECIMENTO"].str.strip(),
+        "CONCORRENTE": df["CONCORRENTE"].str.strip(),
+        "STATUS": df["STATUS"].str.strip(),
+        "DATA_INI": _formatar_datas(df["DATA_INI"]),
+        "DATA_FIM": _formatar_datas(df["DATA_FIM"])
+    })
+    df_final["MUNICIPIO"] = _limpar_municipios(df["MUNICIPIO"], df_final["UF"])
+    return df_final[CABECALHO_SAIDA]
+
+def _gravar_csv(df, arquivo_saida, cabecalho=True, modo='w'):
+    df.to_csv(arquivo_saida, sep=';', index=False, header=cabecalho, mode=modo, encoding='utf-8', lineterminator='\r\n')
+
+def processar_contratos(arquivo_entrada='MunipCOn.txt', arquivo_saida='MunipCOn_finalv4.csv'):
+    """
+    Executa o tratamento completo dos contratos (trataArqCon + CON_CSV) em uma só etapa.
+
+    O arquivo é carregado em um DataFrame, as limpezas rodam sobre os valores
+    distintos e o resultado final é gravado uma única vez, sem o arquivo
+    intermediário 'MunipCOn_tratado.csv'. A saída é igual à das duas etapas
+    executadas em sequência.
+    """
+    try:
+        with open(arquivo_entrada, 'r', encoding='utf-8', buffering=TAMANHO_BUFFER) as f_in:
+            df = carregar_contratos(f_in)
+    except FileNotFoundError:
+        print(f"Erro: O arquivo '{arquivo_entrada}' não foi encontrado.")
+        return
+
+    if df.empty:
+        print("Nenhum registro válido encontrado.")
+        return
+
+    try:
+        _gravar_csv(tratar_contratos(df), arquivo_saida)
+        print(f"Sucesso! Dados finalizados e salvos em '{arquivo_saida}'.")
+    except IOError:
+        print(f"Erro: Não foi possível escrever no arquivo '{arquivo_saida}'.")
+
+def _proximo_inicio_registro(f, posicao):
+    """
+    A partir de `posicao` (em bytes), retorna o início da próxima linha que abre um
+    registro ("ABC-123;"), ou o tamanho do arquivo se não houver nenhuma.
+    """
+    f.seek(posicao)
+    f.readline() # Descarta o restante da linha em que a posição caiu
+    while True:
+        inicio = f.tell()
+        linha = f.readline()
+        if not linha:
+            return inicio
+        if INICIO_REGISTRO.match(linha.decode('utf-8', errors='replace').replace('\\', '')):
+            return inicio
+
+def dividir_em_shards(arquivo_entrada, tamanho_shard):
+    """
+    Divide o arquivo em intervalos de bytes [inicio, fim) de cerca de `tamanho_shard`,
+    sempre cortando no começo de um registro. Uma linha que começa com "ABC-123;" é
+    sempre o início de um registro, então cada intervalo é remontado de forma
+    independente, com o mesmo resultado da leitura do arquivo inteiro.
+    """
+    tamanho_arquivo = os.path.getsize(arquivo_entrada)
+    limites = [0]
+    with open(arquivo_entrada, 'rb') as f:
+        while limites[-1] + tamanho_shard < tamanho_arquivo:
+            proximo = _proximo_inicio_registro(f, limites[-1] + tamanho_shard)
+            if proximo >= tamanho_arquivo:
+                break
+            limites.append(proximo)
+    limites.append(tamanho_arquivo)
+    return list(zip(limites[:-1], limites[1:]))
+
+def _processar_shard(arquivo_entrada, inicio, fim, arquivo_parcial):
+    """Trata o intervalo [inicio, fim) do arquivo e grava o resultado, sem cabeçalho, em `arquivo_parcial`."""
+    with open(arquivo_entrada, 'rb') as f:
+        f.seek(inicio)
+        conteudo = f.read(fim - inicio)
+
+    with io.TextIOWrapper(io.BytesIO(conteudo), encoding='utf-8') as f_in:
+        leitor_csv = csv.reader(reconstruir_registros(f_in, fim_do_arquivo=(fim == os.path.getsize(arquivo_entrada))), delimiter=';')
+        if inicio == 0:
+            next(leitor_csv, None) # Pula o cabeçalho original
+        registros = [linha for linha in leitor_csv if len(linha) == len(COLUNAS_ENTRADA)]
+
+    df = pd.DataFrame(registros, columns=COLUNAS_ENTRADA, dtype=object)
+    if not df.empty:
+        _gravar_csv(tratar_contratos(df), arquivo_parcial, cabecalho=False)
+    return len(df)
+
+def processar_contratos_paralelo(arquivo_entrada='MunipCOn.txt', arquivo_saida='MunipCOn_finalv4.csv',
+                                 processos=None, tamanho_shard=TAMANHO_SHARD):
+    """
+    Versão multiprocesso de `processar_contratos` para arquivos grandes.
+
+    O arquivo é dividido em intervalos de bytes que começam sempre em um registro,
+    cada intervalo é tratado em um processo do ProcessPoolExecutor e os resultados
+    são concatenados na ordem original. A saída é idêntica (byte a byte) à da
+    execução em um único processo.
+    """
+    if not os.path.exists(arquivo_entrada):
+        print(f"Erro: O arquivo '{arquivo_entrada}' não foi encontrado.")
+        return
+
+    shards = dividir_em_shards(arquivo_entrada, tamanho_shard)
+    pasta_temporaria = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(arquivo_saida)))
+    parciais = [os.path.join(pasta_temporaria, f'parte_{i:05d}.csv') for i in range(len(shards))]
+    print(f"Processando '{arquivo_entrada}' em {len(shards)} partes...")
+
+    try:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            linhas = list(executor.map(
+                _processar_shard,
+                [arquivo_entrada] * len(shards),
+                [inicio for inicio, _ in shards],
+                [fim for _, fim in shards],
+                parciais
+            ))
+
+        if sum(linhas) == 0:
+            print("Nenhum registro válido encontrado.")
+            return
+
+        try:
+            _gravar_csv(pd.DataFrame(columns=CABECALHO_SAIDA), arquivo_saida)
+            with open(arquivo_saida, 'ab') as f_out:
+                for parcial in parciais:
+                    if os.path.exists(parcial):
+                        with open(parcial, 'rb') as f_parcial:
+                            shutil.copyfileobj(f_parcial, f_out)
+            print(f"Sucesso! Dados finalizados e salvos em '{arquivo_saida}'.")
+        except IOError:
+            print(f"Erro: Não foi possível escrever no arquivo '{arquivo_saida}'.")
+    finally:
+        shutil.rmtree(pasta_temporaria, ignore_errors=True)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tratamento completo do arquivo de contratos municipais.")
+    parser.add_argument('--entrada', default='MunipCOn.txt')
+    parser.add_argument('--saida', default='MunipCOn_finalv4.csv')
+    parser.add_argument('--processos', type=int, default=1, help="Número de processos (1 = sem paralelismo, 0 = todos os núcleos).")
+    args = parser.parse_args()
+
+    if args.processos == 1:
+        processar_contratos(args.entrada, args.saida)
+    else:
+        processar_contratos_paralelo(args.entrada, args.saida, processos=args.processos or None)
@@ -0,0 +1,252 @@
+# serie_historica.py
+"""
+Série histórica da população por faixa etária, em Parquet particionado por
+ano de referência e UF:
+
+    dados_historicos/ano=2022/uf=MG/part-0.parquet
+
+Cada extração grava (ou substitui) a partição do seu ano, sem apagar os anos
+anteriores. As consultas abrem só os diretórios dos anos pedidos e, dentro
+deles, só as UFs dos municípios/UFs filtrados; o filtro por código IBGE ainda
+é aplicado na leitura (estatísticas dos row groups).
+
+Uso (a partir de src/DadosETL/):
+    python serie_historica.py --importar dados_exportados/populacao_ibge_2024-01-10.parquet --ano 2022
+    python serie_historica.py --importar ../../dados_exportados/populacao_ibge_2025-06-09.csv --ano 2021
+    python serie_historica.py --consultar 2010 2022 --municipios 3106200,3550308
+"""
+import argparse
+import os
+import shutil
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import config
+import exportacao
+from normalizacao import normalizar_serie
+
+# Código IBGE da UF (dois primeiros dígitos do código do município) -> sigla
+CODIGOS_UF = {
+    '11': 'RO', '12': 'AC', '13': 'AM', '14': 'RR', '15': 'PA', '16': 'AP', '17': 'TO',
+    '21': 'MA', '22': 'PI', '23': 'CE', '24': 'RN', '25': 'PB', '26': 'PE', '27': 'AL', '28': 'SE', '29': 'BA',
+    '31': 'MG', '32': 'ES', '33': 'RJ', '35': 'SP',
+    '41': 'PR', '42': 'SC', '43': 'RS',
+    '50': 'MS', '51': 'MT', '52': 'GO', '53': 'DF'
+}
+
+PARTICAO_UF = ds.partitioning(pa.schema([('uf', pa.string())]), flavor='hive')
+
+# Colunas que identificam o município em cada partição
+COLUNAS_OBRIGATORIAS = ['codigo_ibge', 'municipio', 'uf']
+
+
+def _pasta_ano(pasta, ano):
+    return os.path.join(pasta, f'ano={int(ano)}')
+
+
+def _pasta_antiga(destino):
+    return f'{destino}.antigo'
+
+
+def _pasta_leitura(pasta, ano):
+    """
+    Pasta com os dados do ano. Durante a troca feita por `gravar_ano` (ou se ela
+    foi interrompida entre as duas renomeações), o ano está só em 'ano=AAAA.antigo'.
+    """
+    destino = _pasta_ano(pasta, ano)
+    antiga = _pasta_antiga(destino)
+    return antiga if not os.path.exists(destino) and os.path.exists(antiga) else destino
+
+
+def anos_disponiveis(pasta=config.SERIE_HISTORICA['pasta']):
+    """Anos com partição gravada (inclusive os que estão no meio de uma troca), em ordem crescente."""
+    if not os.path.isdir(pasta):
+        return []
+    anos = set()
+    for nome in os.listdir(pasta):
+        prefixo, _, valor = nome.removesuffix('.antigo').partition('=')
+        if prefixo == 'ano' and valor.isdigit():
+            anos.add(int(valor))
+    return sorted(anos)
+
+
+def gravar_ano(df, ano, pasta=config.SERIE_HISTORICA['pasta'], compressao='zstd'):
+    """
+    Grava a tabela de população de `ano` particionada por UF, substituindo a
+    partição do ano se ela já existir. A troca é feita por renomeação: quem lê
+    a série durante a gravação vê o ano antigo ou o novo, nunca uma mistura.
+
+    Levanta ValueError se faltar alguma das COLUNAS_OBRIGATORIAS (arquivos
+    exportados sem 'codigo_ibge' passam antes por `completar_codigos_ibge`).
+    """
+    if df.empty:
+        raise ValueError(f"Nenhum dado para gravar na série histórica ({ano}).")
+    faltando = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in df.columns]
+    if faltando:
+        raise ValueError(f"Tabela sem as colunas {faltando}; a série histórica exige {COLUNAS_OBRIGATORIAS}.")
+
+    destino = _pasta_ano(pasta, ano)
+    temporario = f'{destino}.{os.getpid()}.{time.monotonic_ns()}.tmp'
+    antigo = _pasta_antiga(destino)
+    try:
+        df_compacto = exportacao.tipos_compactos(df.drop(columns=['ano'], errors='ignore'))
+        tabela = pa.Table.from_pandas(df_compacto.assign(uf=df_compacto['uf'].astype(str)), preserve_index=False)
+        pq.write_to_dataset(tabela, temporario, partition_cols=['uf'], compression=compressao,
+                            basename_template='part-{i}.parquet')
+
+        # Troca interrompida entre as duas renomeações: o ano só existe em '.antigo' e volta para o lugar.
+        # Com o ano no lugar, o que sobrar em '.antigo' é uma cópia velha e impediria a renomeação
+        if not os.path.exists(destino) and os.path.exists(antigo):
+            os.replace(antigo, destino)
+        shutil.rmtree(antigo, ignore_errors=True)
+        if os.path.exists(destino):
+            os.replace(destino, antigo)
+        os.replace(temporario, destino)
+        shutil.rmtree(antigo, ignore_errors=True)
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+    print(f"Série histórica: {len(df)} municípios gravados em '{destino}'.")
+    return destino
+
+
+def completar_codigos_ibge(df, df_referencia):
+    """
+    Preenche 'codigo_ibge' em uma tabela exportada sem ele (arquivos antigos, só
+    com 'municipio' e 'uf') pelo nome normalizado do município dentro da UF,
+    usando `df_referencia` ('codigo_ibge', 'municipio', 'uf'). Nomes ambíguos na
+    referência ou sem correspondência são descartados, com aviso.
+    """
+    referencia = pd.DataFrame({
+        'chave': normalizar_serie(df_referencia['municipio'].astype(str)),
+        'uf': df_referencia['uf'].astype(str),
+        'codigo_ibge': df_referencia['codigo_ibge'].astype('int64')
+    }).drop_duplicates().drop_duplicates(['chave', 'uf'], keep=False)
+
+    chaves = pd.DataFrame({'chave': normalizar_serie(df['municipio'].astype(str)), 'uf': df['uf'].astype(str)})
+    codigos = chaves.merge(referencia, on=['chave', 'uf'], how='left')['codigo_ibge'].set_axis(df.index)
+
+    sem_codigo = codigos.isna()
+    if sem_codigo.any():
+        exemplos = (df.loc[sem_codigo, 'municipio'].astype(str) + '/' + df.loc[sem_codigo, 'uf'].astype(str)).head(10)
+        print(f"Aviso: {sem_codigo.sum()} municípios sem código IBGE na referência foram descartados "
+              f"(ex: {', '.join(exemplos)}).")
+    df = df.loc[~sem_codigo].copy()
+    df.insert(0, 'codigo_ibge', codigos[~sem_codigo].astype('int64'))
+    return df
+
+
+def _ufs_da_consulta(codigos_ibge, ufs):
+    """UFs a ler: as informadas e/ou as dos códigos IBGE (None = todas)."""
+    if codigos_ibge is None:
+        return None if ufs is None else set(ufs)
+    desconhecidos = [codigo for codigo in codigos_ibge if str(codigo)[:2] not in CODIGOS_UF]
+    if desconhecidos:
+        raise ValueError(f"Códigos IBGE de UF desconhecida: {desconhecidos}")
+    ufs_codigos = {CODIGOS_UF[str(codigo)[:2]] for codigo in codigos_ibge}
+    return ufs_codigos if ufs is None else ufs_codigos & set(ufs)
+
+
+def _ler_ano(pasta, ano, codigos_ibge, ufs, colunas):
+    caminho = _pasta_leitura(pasta, ano)
+    dataset = ds.dataset(caminho, format='parquet', partitioning=PARTICAO_UF)
+
+    filtro = None
+    if ufs is not None:
+        filtro = pc.field('uf').isin(sorted(ufs))
+    if codigos_ibge is not None:
+        filtro_codigos = pc.field('codigo_ibge').isin([int(codigo) for codigo in codigos_ibge])
+        filtro = filtro_codigos if filtro is None else filtro & filtro_codigos
+
+    if colunas is not None:
+        colunas = list(dict.fromkeys(['codigo_ibge', 'municipio', 'uf', *colunas]))
+    df = dataset.to_table(columns=colunas, filter=filtro).to_pandas()
+    df.insert(0, 'ano', pd.Series(ano, index=df.index, dtype='int16'))
+    return df
+
+
+def _concatenar(dataframes):
+    if not dataframes:
+        return pd.DataFrame()
+    df = pd.concat(dataframes, ignore_index=True)
+    # A UF vem da partição, no fim da tabela: volta para a posição da exportação (após o município)
+    uf = df.pop('uf').astype('category')
+    df.insert(df.columns.get_loc('municipio') + 1 if 'municipio' in df.columns else 1, 'uf', uf)
+    return df.sort_values(['ano', 'codigo_ibge'], ignore_index=True)
+
+
+def consultar_periodo(inicio, fim, codigos_ibge=None, ufs=None, colunas=None, pasta=config.SERIE_HISTORICA['pasta']):
+    """
+    População dos anos de `inicio` a `fim` (inclusive), uma linha por (ano, município).
+    `codigos_ibge` e `ufs` restringem os municípios; `colunas` as faixas (ex: ['pop_0_14', 'pop_total']).
+    """
+    ufs = _ufs_da_consulta(codigos_ibge, ufs)
+    anos = [ano for ano in anos_disponiveis(pasta) if inicio <= ano <= fim]
+    return _concatenar([_ler_ano(pasta, ano, codigos_ibge, ufs, colunas) for ano in anos])
+
+
+def consultar_em(ano, codigos_ibge=None, ufs=None, colunas=None, pasta=config.SERIE_HISTORICA['pasta']):
+    """
+    Consulta "na data": o dado mais recente de cada município com ano de
+    referência até `ano` (a coluna 'ano' indica de qual ano ele veio).
+
+    Os anos são lidos do mais recente para o mais antigo. Com `codigos_ibge`, a
+    leitura para assim que todos os municípios foram encontrados; sem eles, cada
+    ano é tratado como um retrato completo e só o mais recente é lido.
+    """
+    ufs = _ufs_da_consulta(codigos_ibge, ufs)
+    pendentes = None if codigos_ibge is None else {int(codigo) for codigo in codigos_ibge}
+
+    dataframes = []
+    for ano_particao in reversed([a for a in anos_disponiveis(pasta) if a <= ano]):
+        df = _ler_ano(pasta, ano_particao, None if pendentes is None else sorted(pendentes), ufs, colunas)
+        dataframes.append(df)
+        if pendentes is None:
+            break
+        pendentes -= set(df['codigo_ibge'].tolist())
+        if not pendentes:
+            break
+    return _concatenar(dataframes)
+
+
+def _dividir(valor):
+    return valor.split(',') if valor else None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Série histórica da população (Parquet particionado por ano e UF).")
+    parser.add_argument('--pasta', default=config.SERIE_HISTORICA['pasta'])
+    parser.add_argument('--importar', help="Arquivo exportado pelo pipeline (csv, parquet ou feather) a incluir na série.")
+    parser.add_argument('--ano', type=int, help="Ano de referência do arquivo importado.")
+    parser.add_argument('--referencia', help="Arquivo com codigo_ibge/municipio/uf para completar os códigos de um "
+                                             "arquivo importado sem eles (padrão: o ano mais recente da série).")
+    parser.add_argument('--consultar', nargs=2, type=int, metavar=('INICIO', 'FIM'), help="Período a consultar.")
+    parser.add_argument('--em', type=int, help="Consulta o dado mais recente até o ano informado.")
+    parser.add_argument('--municipios', help="Códigos IBGE separados por vírgula.")
+    parser.add_argument('--ufs', help="UFs separadas por vírgula.")
+    parser.add_argument('--colunas', help="Colunas de população separadas por vírgula.")
+    args = parser.parse_args()
+
+    if args.importar:
+        if args.ano is None:
+            parser.error("--importar exige --ano.")
+        df_importado = exportacao.carregar_dataframe(args.importar)
+        if 'codigo_ibge' not in df_importado.columns:
+            if args.referencia:
+                df_referencia = exportacao.carregar_dataframe(args.referencia)
+            elif anos_disponiveis(args.pasta):
+                df_referencia = consultar_em(anos_disponiveis(args.pasta)[-1], colunas=[], pasta=args.pasta)
+            else:
+                parser.error(f"'{args.importar}' não tem codigo_ibge: informe --referencia.")
+            df_importado = completar_codigos_ibge(df_importado, df_referencia)
+        gravar_ano(df_importado, args.ano, args.pasta)
+    if args.consultar:
+        print(consultar_periodo(*args.consultar, _dividir(args.municipios), _dividir(args.ufs), _dividir(args.colunas), args.pasta))
+    if args.em is not None:
+        print(consultar_em(args.em, _dividir(args.municipios), _dividir(args.ufs), _dividir(args.colunas), args.pasta))
+    if not (args.importar or args.consultar or args.em is not None):
+        print(f"Anos disponíveis em '{args.pasta}': {anos_disponiveis(args.pasta)}")
@@ -2,6 +2,84 @@ import re
 import csv
 from datetime import datetime
 
+# Início de um registro válido, ex: "ABC-123;"
+INICIO_REGISTRO = re.compile(r'[A-Z]{3}-\d+;')
+# Um registro completo termina com o ano da data final (dd/mm/yyyy)
+FIM_REGISTRO = re.compile(r'\d{4}$')
+# Tamanho do buffer de leitura do arquivo de entrada
+TAMANHO_BUFFER = 1024 * 1024
+
+CABECALHO_SAIDA = [
+    "CHAMADO", "UF", "MUNICIPIO", "TIPO_ETABELECIMENTO",
+    "CONCORRENTE", "STATUS", "DATA_INI", "DATA_FIM"
+]
+
+def reconstruir_registros(linhas, fim_do_arquivo=True):
+    """
+    Junta as linhas quebradas no meio de um registro, uma linha por vez.
+
+    Uma quebra de linha é mantida quando a linha anterior termina com um ano
+    (4 dígitos) ou quando a próxima começa um novo registro ("ABC-123;");
+    caso contrário, a quebra é trocada por um espaço. Barras invertidas são
+    removidas. Linhas em branco no início do arquivo são ignoradas.
+
+    Use `fim_do_arquivo=False` ao processar um trecho que não vai até o final do
+    arquivo: o último registro é devolvido sem remover espaços à direita.
+    """
+    registro = None
+    for linha in linhas:
+        linha = linha.rstrip('\n').replace('\\', '')
+        if registro is None:
+            linha = linha.lstrip()
+            if linha:
+                registro = linha
+        # Só o final do registro pode casar (ano + um '\n' opcional): testar só ele evita varrer o
+        # registro inteiro a cada linha de continuação
+        elif FIM_REGISTRO.search(registro, max(0, len(registro) - 5)) or INICIO_REGISTRO.match(linha):
+            yield registro
+            registro = linha
+        else:
+            registro += ' ' + linha
+
+    if registro is not None:
+        yield registro.rstrip() if fim_do_arquivo else registro
+
+def formatar_data(data_str):
+    try:
+        return datetime.strptime(data_str.strip(), '%d/%m/%Y').strftime('%Y-%m-%d')
+    except ValueError:
+        return data_str.strip() # Retorna o valor original se o formato for inválido
+
+def tratar_linha(linha):
+    """Trata um registro já separado em colunas. Retorna None se ele não tiver 9 colunas."""
+    if len(linha) != 9:
+        return None # Ignora linhas que não tenham 9 colunas
+
+    # Extrai os dados da linha
+    chamado, _, uf, municipio_raw, tipo_estab, concorrente, status, data_ini, data_fim = linha
+
+    # --- Tratativa 1: Limpeza do nome do Município ---
+    # Remove a sigla do estado (UF) e outros ruídos do final do nome
+    municipio_limpo = re.split(r'\s*-\s*[A-Z]{2}\s*$|\s*/\s*[A-Z]{2}\s*$', municipio_raw.strip())[0]
+    # Remove prefixos comuns e ajusta espaçamentos
+    municipio_limpo = re.sub(r"^(MUNICÍPIO DE|: MUNICÍPIO DE)\s*", "", municipio_limpo, flags=re.IGNORECASE).strip()
+
+    # --- Tratativa 2: Formatação das Datas ---
+    data_ini_formatada = formatar_data(data_ini)
+    data_fim_formatada = formatar_data(data_fim)
+
+    # --- Montagem da nova linha (sem a coluna ID_JIRA) ---
+    return [
+        chamado.strip(),
+        uf.strip(),
+        municipio_limpo,
+        tipo_estab.strip(),
+        concorrente.strip(),
+        status.strip(),
+        data_ini_formatada,
+        data_fim_formatada
+    ]
+
 def tratar_dados_municipais(arquivo_entrada='MunipCOn.txt', arquivo_saida='MunipCOn_tratado.csv'):
     """
     Lê, trata e salva os dados de contratos municipais a partir de um arquivo de texto.
@@ -11,79 +89,36 @@ def tratar_dados_municipais(arquivo_entrada='MunipCOn.txt', arquivo_saida='Munip
     - O campo 'MUNICIPIO' é limpo para conter apenas o nome da cidade.
     - As datas são convertidas do formato 'dd/mm/yyyy' para 'YYYY-MM-DD'.
     - Lida com linhas quebradas e malformadas no arquivo de origem.
+
+    O arquivo é processado em fluxo: cada registro é remontado, tratado e gravado
+    assim que lido, então o uso de memória não cresce com o tamanho da entrada.
     """
     try:
-        with open(arquivo_entrada, 'r', encoding='utf-8') as f:
-            conteudo_bruto = f.read()
+        f_in = open(arquivo_entrada, 'r', encoding='utf-8', buffering=TAMANHO_BUFFER)
     except FileNotFoundError:
         print(f"Erro: O arquivo '{arquivo_entrada}' não foi encontrado.")
         print("Por favor, certifique-se de que o script e o arquivo de dados estejam na mesma pasta.")
         return
 
-    # Limpeza preliminar do conteúdo para facilitar a análise
-    # Remove as tags de fonte, ex: 
-    conteudo_limpo = re.sub(r'\\', '', conteudo_bruto)
-    
-    # Junta linhas que foram quebradas incorretamente no meio de um registro
-    # A lógica assume que uma linha válida termina com uma data no formato dd/mm/yyyy
-    conteudo_limpo = re.sub(r'(?<!\d{4})\n(?![A-Z]{3}-\d+;)', ' ', conteudo_limpo)
-
-    # Define o cabeçalho para o novo arquivo CSV
-    cabecalho_saida = [
-        "CHAMADO", "UF", "MUNICIPIO", "TIPO_ETABELECIMENTO",
-        "CONCORRENTE", "STATUS", "DATA_INI", "DATA_FIM"
-    ]
-    
-    registros_tratados = [cabecalho_saida]
-    
-    # Lê as linhas tratadas usando o módulo CSV do Python
-    linhas = conteudo_limpo.strip().split('\n')
-    leitor_csv = csv.reader(linhas[1:], delimiter=';') # Pula o cabeçalho original
-
-    for linha in leitor_csv:
-        if len(linha) != 9:
-            continue # Ignora linhas que não tenham 9 colunas
-
-        # Extrai os dados da linha
-        chamado, _, uf, municipio_raw, tipo_estab, concorrente, status, data_ini, data_fim = linha
-
-        # --- Tratativa 1: Limpeza do nome do Município ---
-        # Remove a sigla do estado (UF) e outros ruídos do final do nome
-        municipio_limpo = re.split(r'\s*-\s*[A-Z]{2}\s*$|\s*/\s*[A-Z]{2}\s*$', municipio_raw.strip())[0]
-        # Remove prefixos comuns e ajusta espaçamentos
-        municipio_limpo = re.sub(r"^(MUNICÍPIO DE|: MUNICÍPIO DE)\s*", "", municipio_limpo, flags=re.IGNORECASE).strip()
-
-        # --- Tratativa 2: Formatação das Datas ---
-        def formatar_data(data_str):
-            try:
-                return datetime.strptime(data_str.strip(), '%d/%m/%Y').strftime('%Y-%m-%d')
-            except ValueError:
-                return data_str.strip() # Retorna o valor original se o formato for inválido
-
-        data_ini_formatada = formatar_data(data_ini)
-        data_fim_formatada = formatar_data(data_fim)
-
-        # --- Montagem da nova linha (sem a coluna ID_JIRA) ---
-        registros_tratados.append([
-            chamado.strip(),
-            uf.strip(),
-            municipio_limpo,
-            tipo_estab.strip(),
-            concorrente.strip(),
-            status.strip(),
-            data_ini_formatada,
-            data_fim_formatada
-        ])
-
-    # --- Geração do novo arquivo CSV ---
-    try:
-        with open(arquivo_saida, 'w', newline='', encoding='utf-8') as f:
-            escritor_csv = csv.writer(f, delimiter=';')
-            escritor_csv.writerows(registros_tratados)
-        print(f"Sucesso! Os dados foram tratados e salvos em '{arquivo_saida}'.")
-    except IOError:
-        print(f"Erro: Não foi possível escrever no arquivo '{arquivo_saida}'.")
+    with f_in:
+        # --- Geração do novo arquivo CSV ---
+        try:
+            with open(arquivo_saida, 'w', newline='', encoding='utf-8') as f_out:
+                escritor_csv = csv.writer(f_out, delimiter=';')
+                escritor_csv.writerow(CABECALHO_SAIDA)
+
+                # Lê os registros remontados usando o módulo CSV do Python
+                leitor_csv = csv.reader(reconstruir_registros(f_in), delimiter=';')
+                next(leitor_csv, None) # Pula o cabeçalho original
+
+                for linha in leitor_csv:
+                    registro = tratar_linha(linha)
+                    if registro is not None:
+                        escritor_csv.writerow(registro)
+            print(f"Sucesso! Os dados foram tratados e salvos em '{arquivo_saida}'.")
+        except IOError:
+            print(f"Erro: Não foi possível escrever no arquivo '{arquivo_saida}'.")
 
 # --- Execução da Função ---
 if __name__ == '__main__':
-    tratar_dados_municipais()
\ No newline at end of file
+    tratar_dados_municipais()
@@ -0,0 +1,145 @@
+# bench_limpar_municipio.py
+"""
+Mede linhas por segundo de CON_CSV.limpar_municipio_avancado antes e depois dos
+padrões pré-compilados e do cache, e confere que os resultados são idênticos.
+
+Uso (a partir de src/): python benchmarks/bench_limpar_municipio.py --linhas 200000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'DadosETL'))
+
+import CON_CSV  # noqa: E402
+
+# Órgãos típicos dos arquivos de contratos; as linhas repetem essas strings muitas vezes
+ORGAOS = [
+    ("PREFEITURA MUNICIPAL DE BELO HORIZONTE - MG", "MG"),
+    ("Câmara Municipal de São Paulo/SP", "SP"),
+    ("INSTITUTO DE PREVIDENCIA DOS SERVIDORES DE JOINVILLE E IPREVILLE", "SC"),
+    ("Serviço Autônomo de Água e Esgoto de Congonhas (SAAE)", "MG"),
+    ("FUNDO MUNICIPAL DE SAUDE DE RIO POMBA - MG", "MG"),
+    ("Município de Santa Maria do Suaçuí - 123", "MG"),
+    ("Instituto de Previdência dos Servidores Públicos de Ouro Branco", "MG"),
+    ("SAMAE - DE BLUMENAU", "SC"),
+    ("Ouro Preto", "MG"),
+    ("Consórcio Intermunicipal de Saúde do Vale", "BA"),
+]
+
+
+def limpar_municipio_referencia(texto_bruto, uf):
+    """Implementação anterior (regex montada e compilada a cada chamada), usada como base de comparação."""
+    # Inicia com o texto, convertendo para maiúsculas para padronizar
+    nome = texto_bruto.strip().upper()
+
+    # Etapas 1 e 2: Remoção de sufixos e da UF (seu código original, está ótimo)
+    nome = re.sub(r'\s*\([^)]*\)$', '', nome)
+    nome = re.sub(r'\s+-\s+[A-Z0-9]+$', '', nome)
+    nome = re.split(r'\s*-\s*' + re.escape(uf) + r'\s*$', nome, flags=re.IGNORECASE)[0]
+    nome = re.split(r'\s*/\s*' + re.escape(uf) + r'\s*$', nome, flags=re.IGNORECASE)[0]
+
+    # --- AJUSTE PRINCIPAL (ETAPA 3) ---
+    # Unimos todos os termos-pivô em uma única expressão regular para mais eficiência.
+    # Também ajustamos para lidar com variações de acentos e espaços.
+    termos_pivo = [
+        r"Do\s+Munic[ií]pio\s+De",
+        r"Municipais\s+De",
+        r"Municipalidade\s+De",
+        r"Esgoto\s+De",
+        r"[AÁ]gua\s+De",
+        r"Tur[ií]stica\s+De",
+        r"Ambiental\s+De",
+        r"Urbanismo\s+De",
+        r"Prefeitura\s+De",
+        r"Vereadores\s+De",
+        r"Sa[uú]de\s+De",
+        r"Servidores\s+De",
+        r"Municip[aá]rios\s+De",
+        r"Social\s+De",
+        r"P[uú]blicos\s+De",
+        r"Samae\s+-+\s+De",
+        r"Munic[ií]pio\s+De",
+        r"Previd[eê]ncia\s+De",
+        r"C[aâ]mara\s+De",
+        r"De\s+Previd[eê]ncia",
+        r"Sa[uú]de\s+De",
+        r"Social\s+De",
+        r"C[aâ]mara\s+Municipal\s+De",
+        r"P[uú]blicos\s+De",
+        r"Municipais\s+De",
+        r"Municip[aá]rios\s+De",
+        r"Prefeitura\s+De",
+        r"Mun\.\s+De",
+        r"Municipal\s+De",
+        r"\s+Munic[ií]pio",
+        r"Previd[eê]ncia"
+    ]
+    
+    # Cria o padrão final unindo os termos com `|` (OU)
+    # A estrutura (?:...) é um "grupo sem captura", usado aqui para agrupar os termos.
+    padrao_pivo_unificado = r"^(?:.*)(" + "|".join(termos_pivo) + r")"
+
+    # Aplica a substituição uma única vez.
+    # Esta expressão remove tudo desde o início da linha até o final do termo-pivô encontrado.
+    nome = re.sub(padrao_pivo_unificado, '', nome, flags=re.IGNORECASE)
+
+    # Etapa 4: Remove sufixos comuns (seu código original)
+    nome = re.sub(r'\s*PREV[A-Z]*$', '', nome, flags=re.IGNORECASE)
+    nome = re.sub(r'\s*IPREV$', '', nome, flags=re.IGNORECASE)
+
+    # Etapa 5: Lida com casos como "Joinville e IPREVILLE" (seu código original)
+    partes = re.split(r'\s+E\s+', nome)
+    if len(partes) > 1 and partes[-1].isupper() and len(partes[-1]) > 2:
+        nome = ' E '.join(partes[:-1])
+
+    # Etapa 6: Limpeza final (seu código original)
+    nome = re.sub(r'\s+', ' ', nome).strip(' .-/')
+    
+    # Capitaliza o nome de forma mais legível (Ex: Sao Paulo -> São Paulo)
+    return nome.title()
+
+
+def gerar_linhas(quantidade, distintos, semente=42):
+    """Gera `quantidade` pares (texto, uf) com cerca de `distintos` textos diferentes."""
+    rnd = random.Random(semente)
+    base = [
+        (f"{texto} {i}" if i else texto, uf)
+        for i in range(max(1, distintos // len(ORGAOS)))
+        for texto, uf in ORGAOS
+    ]
+    return [rnd.choice(base) for _ in range(quantidade)]
+
+
+def medir(funcao, linhas):
+    inicio = time.perf_counter()
+    resultado = [funcao(texto, uf) for texto, uf in linhas]
+    return resultado, len(linhas) / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=100000)
+    parser.add_argument('--distintos', type=int, default=500, help="Quantidade aproximada de textos distintos.")
+    args = parser.parse_args()
+
+    linhas = gerar_linhas(args.linhas, args.distintos)
+
+    antes, lps_antes = medir(limpar_municipio_referencia, linhas)
+    CON_CSV.limpar_municipio_avancado.cache_clear()
+    sem_cache, lps_sem_cache = medir(CON_CSV.limpar_municipio_avancado.__wrapped__, linhas)
+    depois, lps_depois = medir(CON_CSV.limpar_municipio_avancado, linhas)
+
+    assert antes == sem_cache == depois, "As implementações divergem"
+
+    print(f"Linhas: {len(linhas)} ({len(set(linhas))} distintas)")
+    print(f"Antes (regex a cada chamada):   {lps_antes:12,.0f} linhas/s")
+    print(f"Padrões pré-compilados:         {lps_sem_cache:12,.0f} linhas/s ({lps_sem_cache / lps_antes:.1f}x)")
+    print(f"Pré-compilados + cache LRU:     {lps_depois:12,.0f} linhas/s ({lps_depois / lps_antes:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
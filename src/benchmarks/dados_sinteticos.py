@@ -0,0 +1,160 @@
+# dados_sinteticos.py
+"""
+Geradores de dados sintéticos para os benchmarks, todos determinísticos (semente fixa)
+e sem acesso à rede:
+- formato longo do SIDRA (N municípios x M códigos de idade) e um servidor HTTP
+  local que responde como a API do SIDRA;
+- dumps no formato do MunipCOn.txt, com registros quebrados em várias linhas;
+- empresas.csv com muitos concorrentes, usando os municípios oficiais.
+"""
+import json
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+UFS = ['MG', 'SP', 'RJ', 'BA', 'SC', 'PR', 'RS', 'GO', 'PE', 'CE']
+
+# Órgãos típicos dos arquivos de contratos (mesmos textos do bench_limpar_municipio)
+ORGAOS = [
+    "PREFEITURA MUNICIPAL DE BELO HORIZONTE - MG",
+    "Câmara Municipal de São Paulo/SP",
+    "INSTITUTO DE PREVIDENCIA DOS SERVIDORES DE JOINVILLE E IPREVILLE",
+    "MUNICÍPIO DE OURO BRANCO",
+    "Serviço Autônomo de Água e Esgoto de Congonhas (SAAE)",
+    "FUNDO MUNICIPAL DE SAUDE DE RIO POMBA - MG",
+    "Município de Santa Maria do Suaçuí - 123",
+    "SAMAE - DE BLUMENAU",
+    "Consórcio Intermunicipal de Saúde do Vale",
+]
+
+CABECALHO_SIDRA = {'D1C': 'Município (Código)', 'D1N': 'Município', 'D2C': 'Idade (Código)', 'D2N': 'Idade', 'V': 'Valor'}
+
+
+# --- SIDRA ---
+def municipios_sinteticos(quantidade):
+    """Lista de (codigo_ibge, 'Nome - UF') com `quantidade` municípios."""
+    return [(str(1100000 + i), f"Cidade {i} - {UFS[i % len(UFS)]}") for i in range(quantidade)]
+
+
+def resposta_sidra(municipios, codigos_idade):
+    """Linhas no formato da resposta do SIDRA (com a linha de cabeçalho) para os municípios e códigos."""
+    linhas = [CABECALHO_SIDRA]
+    for codigo_ibge, nome in municipios:
+        base = int(codigo_ibge) * 7
+        for codigo in codigos_idade:
+            linhas.append({'D1C': codigo_ibge, 'D1N': nome, 'D2C': codigo, 'D2N': f'{codigo} anos',
+                           'V': str((base + int(codigo)) % 1000)})
+    return linhas
+
+
+def formato_longo_sidra(quantidade_municipios, codigos_idade, semente=42):
+    """
+    Formato longo (codigo_ibge, municipio, codigo_idade, V) como o produzido por
+    `_buscar_lote_idades`, com N municípios x M códigos, já incluindo a linha de cabeçalho.
+    """
+    rng = np.random.default_rng(semente)
+    municipios = municipios_sinteticos(quantidade_municipios)
+    codigos = np.array([c for c, _ in municipios])
+    nomes = np.array([n for _, n in municipios])
+    m = len(codigos_idade)
+
+    df = pd.DataFrame({
+        'codigo_ibge': np.repeat(codigos, m),
+        'municipio': np.repeat(nomes, m),
+        'codigo_idade': np.tile(np.array(codigos_idade, dtype=object), len(codigos)),
+        'V': rng.integers(0, 5000, len(codigos) * m).astype(str)
+    })
+    cabecalho = pd.DataFrame([['Município (Código)', 'Município', 'Idade (Código)', 'Valor']], columns=df.columns)
+    return pd.concat([cabecalho, df], ignore_index=True)
+
+
+def iniciar_servidor_sidra(quantidade_municipios):
+    """
+    Sobe em segundo plano um servidor HTTP local que responde às URLs do SIDRA
+    (/t/.../c287/<códigos>) com dados sintéticos. Retorna (servidor, url_base);
+    chame `servidor.shutdown()` ao terminar.
+    """
+    municipios = municipios_sinteticos(quantidade_municipios)
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            encontrado = re.search(r'/c287/([\d,]+)', self.path)
+            codigos = encontrado.group(1).split(',') if encontrado else ['0']
+            corpo = json.dumps(resposta_sidra(municipios, codigos)).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f'http://127.0.0.1:{servidor.server_address[1]}'
+
+
+# --- Contratos (MunipCOn.txt) ---
+def gerar_munipcon(caminho, quantidade, semente=42, proporcao_quebradas=0.1):
+    """
+    Grava um dump no formato do MunipCOn.txt com `quantidade` registros. Uma parte
+    dos registros é quebrada no meio do município ou do status, e alguns trazem
+    barras invertidas e datas inválidas, como no arquivo real.
+    """
+    rnd = random.Random(semente)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write('CHAMADO;ID_JIRA;UF;MUNICIPIO;TIPO;CONCORRENTE;STATUS;DATA_INI;DATA_FIM\n')
+        bloco = []
+        for i in range(quantidade):
+            nome = rnd.choice(ORGAOS)
+            if rnd.random() < proporcao_quebradas:
+                nome = nome.replace(' DE ', ' DE\n', 1)
+            if rnd.random() < 0.02:
+                nome += '\\'
+            data_ini = f"{rnd.randint(1, 28):02d}/{rnd.randint(1, 12):02d}/20{rnd.randint(10, 24)}"
+            data_fim = rnd.choice([data_ini, '31/02/2020', '', f"{rnd.randint(1, 9)}/1/2021"])
+            status = rnd.choice(['Ativo', 'Inativo', 'Encerrado'])
+            if rnd.random() < proporcao_quebradas / 2:
+                status = status[:3] + '\n' + status[3:]
+            bloco.append(
+                f"{rnd.choice(['ABC', 'XYZ', 'JUR'])}-{i};J{i};{rnd.choice(UFS)};{nome};"
+                f"{rnd.choice(['Prefeitura', 'Câmara', 'Autarquia'])};C{rnd.randint(1, 50)};{status};{data_ini};{data_fim}\n"
+            )
+            if len(bloco) >= 10000:
+                f.writelines(bloco)
+                bloco = []
+        f.writelines(bloco)
+
+
+# --- Dashboard (empresas.csv) ---
+def gerar_empresas(caminho, df_municipios, quantidade, concorrentes=200, semente=42):
+    """
+    Grava um empresas.csv com `quantidade` contratos distribuídos entre
+    `concorrentes` concorrentes. Os nomes dos municípios vêm da lista oficial,
+    parte em maiúsculas e parte sem acentos, como nos arquivos de contratos.
+    """
+    rng = np.random.default_rng(semente)
+    mapa_uf = {11: 'RO', 12: 'AC', 13: 'AM', 14: 'RR', 15: 'PA', 16: 'AP', 17: 'TO', 21: 'MA',
+               22: 'PI', 23: 'CE', 24: 'RN', 25: 'PB', 26: 'PE', 27: 'AL', 28: 'SE', 29: 'BA',
+               31: 'MG', 32: 'ES', 33: 'RJ', 35: 'SP', 41: 'PR', 42: 'SC', 43: 'RS', 50: 'MS',
+               51: 'MT', 52: 'GO', 53: 'DF'}
+    amostra = df_municipios.iloc[rng.integers(0, len(df_municipios), quantidade)]
+    nomes = amostra['nome'].to_numpy(dtype=object)
+    variacao = rng.random(quantidade)
+    nomes = np.where(variacao < 0.3, pd.Series(nomes).str.upper().to_numpy(), nomes)
+
+    df = pd.DataFrame({
+        'chamado': [f'ABC-{i}' for i in range(quantidade)],
+        'uf': amostra['codigo_uf'].map(mapa_uf).to_numpy(),
+        'municipio': nomes,
+        'tipo_estabelecimento': rng.choice(['Prefeitura', 'Câmara', 'Autarquia', 'Instituto'], quantidade),
+        'concorrente': [f'Concorrente {c:03d}' for c in rng.integers(0, concorrentes, quantidade)],
+        'status': rng.choice(['Ativo', 'Encerrado', 'Suspenso'], quantidade)
+    })
+    df.to_csv(caminho, sep=';', index=False)
+    return df
@@ -0,0 +1,355 @@
+# executar_benchmarks.py
+"""
+Suíte de benchmarks do ETL e do dashboard com dados sintéticos, sem acesso à rede.
+
+Mede a montagem da tabela de população (e o ibge_mun_pop completo contra um
+SIDRA local), o tratamento dos contratos (trataArqCon, CON_CSV e o pipeline
+único), o preparar_dados do dashboard e o callback do mapa. Os tempos são
+gravados em JSON, com o commit atual, para comparar execuções entre commits.
+
+Uso (a partir de src/):
+    python benchmarks/executar_benchmarks.py --escala pequena
+    python benchmarks/executar_benchmarks.py --escala media --comparar benchmarks/resultados/<anterior>.json
+    python benchmarks/executar_benchmarks.py --apenas tratar_dados_municipais --linhas-contratos 10000000
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+PASTA_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+PASTA_ETL = os.path.join(PASTA_BENCHMARKS, '..', 'DadosETL')
+PASTA_DASH = os.path.join(PASTA_BENCHMARKS, '..', 'DadosDash')
+sys.path.insert(0, PASTA_ETL)
+sys.path.insert(0, PASTA_DASH)
+
+import pandas as pd  # noqa: E402
+
+import dados_sinteticos  # noqa: E402
+
+PASTA_RESULTADOS = os.path.join(PASTA_BENCHMARKS, 'resultados')
+
+# Tamanhos por escala: municípios do SIDRA, registros de contratos e linhas de empresas.csv
+ESCALAS = {
+    'pequena': {'municipios': 1000, 'contratos': 10_000, 'empresas': 10_000},
+    'media': {'municipios': 5570, 'contratos': 100_000, 'empresas': 100_000},
+    'grande': {'municipios': 5570, 'contratos': 1_000_000, 'empresas': 1_000_000},
+}
+
+
+@contextlib.contextmanager
+def _silencioso():
+    """Descarta os prints das funções medidas."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+@contextlib.contextmanager
+def _no_diretorio(caminho):
+    """Executa com `caminho` como diretório atual e volta ao anterior na saída, mesmo com erro."""
+    anterior = os.getcwd()
+    os.chdir(caminho)
+    try:
+        yield
+    finally:
+        os.chdir(anterior)
+
+
+@contextlib.contextmanager
+def _substituir(alvo, **valores):
+    """
+    Troca atributos de um módulo (ou chaves de um dicionário de configuração) e
+    restaura os valores originais na saída, mesmo com erro.
+    """
+    e_dicionario = isinstance(alvo, dict)
+    originais = {nome: alvo[nome] if e_dicionario else getattr(alvo, nome) for nome in valores}
+    for nome, valor in valores.items():
+        if e_dicionario:
+            alvo[nome] = valor
+        else:
+            setattr(alvo, nome, valor)
+    try:
+        yield
+    finally:
+        for nome, valor in originais.items():
+            if e_dicionario:
+                alvo[nome] = valor
+            else:
+                setattr(alvo, nome, valor)
+
+
+# --- Benchmarks ---
+# Cada função prepara os dados em `pasta` e retorna (função a medir, quantidade de linhas processadas).
+# Mudanças de estado do processo (diretório atual, configurações de módulos, servidores)
+# são registradas na `pilha` (contextlib.ExitStack), que as desfaz ao fim da medição.
+
+def bench_montagem_populacao(tamanhos, pasta, pilha):
+    import config
+    import data_functions
+
+    codigos = sorted(data_functions.mapa_codigos_faixas(config.FAIXAS_ETARIAS))
+    df_longo = dados_sinteticos.formato_longo_sidra(tamanhos['municipios'], codigos)
+    colunas = [group['coluna'] for group in config.FAIXAS_ETARIAS]
+
+    def alvo():
+        data_functions.montar_tabela_populacao(data_functions.rotular_faixas(df_longo, config.FAIXAS_ETARIAS), colunas)
+    return alvo, len(df_longo)
+
+
+def bench_ibge_mun_pop_stub(tamanhos, pasta, pilha):
+    import config
+    import data_functions
+
+    servidor, url_base = dados_sinteticos.iniciar_servidor_sidra(tamanhos['municipios'])
+    request_params = dict(config.SIDRA_REQUISICAO, url_base=url_base)
+
+    def alvo():
+        with _silencioso():
+            df = data_functions.ibge_mun_pop(config.FAIXAS_ETARIAS, config.SIDRA_API_POP, request_params, cache_params=None)
+        assert len(df) == tamanhos['municipios']
+    pilha.callback(servidor.shutdown)
+    return alvo, tamanhos['municipios']
+
+
+def _arquivo_contratos(tamanhos, pasta):
+    caminho = os.path.join(pasta, f"MunipCOn_{tamanhos['contratos']}.txt")
+    if not os.path.exists(caminho):
+        dados_sinteticos.gerar_munipcon(caminho, tamanhos['contratos'])
+    return caminho
+
+
+def bench_tratar_dados_municipais(tamanhos, pasta, pilha):
+    import trataArqCon
+
+    entrada = _arquivo_contratos(tamanhos, pasta)
+    saida = os.path.join(pasta, 'MunipCOn_tratado.csv')
+
+    def alvo():
+        with _silencioso():
+            trataArqCon.tratar_dados_municipais(entrada, saida)
+    return alvo, tamanhos['contratos']
+
+
+def bench_tratar_arquivo_final(tamanhos, pasta, pilha):
+    import CON_CSV
+    import trataArqCon
+
+    tratado = os.path.join(pasta, 'MunipCOn_tratado_base.csv')
+    with _silencioso():
+        trataArqCon.tratar_dados_municipais(_arquivo_contratos(tamanhos, pasta), tratado)
+    saida = os.path.join(pasta, 'MunipCOn_finalv4.csv')
+
+    def alvo():
+        # Cache vazio a cada repetição: mede o arquivo, não a memória da repetição anterior
+        CON_CSV.limpar_municipio_avancado.cache_clear()
+        with _silencioso():
+            CON_CSV.tratar_arquivo_final(tratado, saida)
+    return alvo, tamanhos['contratos']
+
+
+def bench_processar_contratos(tamanhos, pasta, pilha):
+    import CON_CSV
+    import pipeline_contratos
+
+    entrada = _arquivo_contratos(tamanhos, pasta)
+    saida = os.path.join(pasta, 'MunipCOn_finalv4_unico.csv')
+
+    def alvo():
+        CON_CSV.limpar_municipio_avancado.cache_clear()
+        with _silencioso():
+            pipeline_contratos.processar_contratos(entrada, saida)
+    return alvo, tamanhos['contratos']
+
+
+def _pasta_dashboard(tamanhos, pasta):
+    """Copia os CSVs do dashboard para `pasta` e gera um empresas.csv sintético."""
+    destino = os.path.join(pasta, 'dashboard')
+    if not os.path.exists(destino):
+        os.makedirs(destino)
+        for arquivo in ['municipios.csv', 'estados.csv', 'populacao_ibge.csv']:
+            shutil.copy(os.path.join(PASTA_DASH, arquivo), destino)
+        df_municipios = pd.read_csv(os.path.join(destino, 'municipios.csv'))
+        dados_sinteticos.gerar_empresas(os.path.join(destino, 'empresas.csv'), df_municipios, tamanhos['empresas'])
+    return destino
+
+
+def bench_preparar_dados(tamanhos, pasta, pilha):
+    pilha.enter_context(_no_diretorio(_pasta_dashboard(tamanhos, pasta)))
+    import dados_dashboard
+
+    # Sem cache persistente das resoluções: cada repetição resolve os nomes de novo
+    pilha.enter_context(_substituir(dados_dashboard, CACHE_RESOLUCAO=None))
+    with _silencioso():
+        brutos = dados_dashboard.carregar_dados_csv()
+
+    def alvo():
+        dados_dashboard.preparar_dados(*(df.copy() for df in brutos))
+    return alvo, tamanhos['empresas']
+
+
+def bench_update_map_figure(tamanhos, pasta, pilha):
+    pilha.enter_context(_no_diretorio(_pasta_dashboard(tamanhos, pasta)))
+    import dados_dashboard
+    with _silencioso():
+        dados_dashboard.construir_artefato()
+    # Os dados carregados do artefato temporário não ficam na memória do processo depois da medição
+    dados_dashboard.limpar_cache()
+    pilha.callback(dados_dashboard.limpar_cache)
+
+    import cache_figuras
+    import dash_concorrentes
+    import geometrias
+    pilha.enter_context(_substituir(cache_figuras.CACHE_FIGURAS, backend='desativado'))
+
+    # O coroplético só referencia a URL das fronteiras: basta um GeoJSON vazio na pasta temporária
+    pasta_geometrias = os.path.join(pasta, 'geometrias')
+    os.makedirs(pasta_geometrias, exist_ok=True)
+    with open(geometrias.caminho_geometria(dash_concorrentes.NIVEL_GEOMETRIA, pasta_geometrias), 'w', encoding='utf-8') as f:
+        json.dump({'type': 'FeatureCollection', 'features': []}, f)
+    pilha.enter_context(_substituir(geometrias, PASTA_GEOMETRIAS=pasta_geometrias))
+
+    mapa = dados_dashboard.obter_dados()['mapa']
+    concorrentes = sorted(mapa['concorrente'].unique())[:5]
+    combinacoes = [
+        (None, None, None, None, 'scatter'),
+        (['MG', 'SP'], None, None, None, 'scatter'),
+        (None, ['Prefeitura'], concorrentes, ['Ativo'], 'scatter'),
+        (None, None, None, None, 'choropleth'),
+    ]
+
+    def alvo():
+        for combinacao in combinacoes:
+            dash_concorrentes.update_map_figure(*combinacao)
+    return alvo, len(mapa)
+
+
+BENCHMARKS = {
+    'montagem_populacao': bench_montagem_populacao,
+    'ibge_mun_pop_stub': bench_ibge_mun_pop_stub,
+    'tratar_dados_municipais': bench_tratar_dados_municipais,
+    'tratar_arquivo_final': bench_tratar_arquivo_final,
+    'processar_contratos': bench_processar_contratos,
+    'preparar_dados': bench_preparar_dados,
+    'update_map_figure': bench_update_map_figure,
+}
+
+
+# --- Execução ---
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PASTA_BENCHMARKS,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def medir(nome, tamanhos, pasta, repeticoes):
+    """
+    Prepara o benchmark e mede `repeticoes` execuções (após uma de aquecimento).
+    O estado alterado pelo benchmark é restaurado na saída, mesmo com erro.
+    """
+    with contextlib.ExitStack() as pilha:
+        alvo, linhas = BENCHMARKS[nome](tamanhos, pasta, pilha)
+        alvo() # aquecimento: imports, caches do sistema de arquivos
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            alvo()
+            tempos.append(time.perf_counter() - inicio)
+
+    mediana = statistics.median(tempos)
+    return {
+        'mediana_s': round(mediana, 6),
+        'min_s': round(min(tempos), 6),
+        'max_s': round(max(tempos), 6),
+        'repeticoes': repeticoes,
+        'linhas': linhas,
+        'linhas_por_s': round(linhas / mediana, 1) if mediana else None
+    }
+
+
+def comparar(atual, arquivo_base, tolerancia):
+    """Compara as medianas com um resultado anterior. Retorna os benchmarks que ficaram mais lentos."""
+    with open(arquivo_base, encoding='utf-8') as f:
+        base = json.load(f)
+
+    print(f"\nComparação com {arquivo_base} (commit {base.get('commit')}, escala {base.get('escala')}):")
+    regressoes = []
+    for nome, resultado in atual['resultados'].items():
+        anterior = base.get('resultados', {}).get(nome)
+        if not anterior:
+            print(f"  {nome:<26} sem resultado anterior")
+            continue
+        razao = resultado['mediana_s'] / anterior['mediana_s']
+        marcador = 'REGRESSÃO' if razao > 1 + tolerancia else ''
+        print(f"  {nome:<26} {anterior['mediana_s']:>10.4f}s -> {resultado['mediana_s']:>10.4f}s ({razao:5.2f}x) {marcador}")
+        if marcador:
+            regressoes.append(nome)
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--escala', choices=ESCALAS, default='pequena')
+    parser.add_argument('--apenas', help="Benchmarks a executar, separados por vírgula. Opções: " + ', '.join(BENCHMARKS))
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--linhas-contratos', type=int, help="Sobrescreve o número de registros do MunipCOn sintético (ex: 10000000).")
+    parser.add_argument('--saida', help="Arquivo JSON de resultado (padrão: benchmarks/resultados/<commit>_<escala>_<data>.json).")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior para comparar as medianas.")
+    parser.add_argument('--tolerancia', type=float, default=0.10, help="Aumento relativo da mediana considerado regressão.")
+    args = parser.parse_args()
+
+    nomes = args.apenas.split(',') if args.apenas else list(BENCHMARKS)
+    desconhecidos = [n for n in nomes if n not in BENCHMARKS]
+    if desconhecidos:
+        parser.error(f"Benchmarks desconhecidos: {desconhecidos}")
+
+    tamanhos = dict(ESCALAS[args.escala])
+    if args.linhas_contratos:
+        tamanhos['contratos'] = args.linhas_contratos
+
+    commit = _commit_atual()
+    resultado = {
+        'commit': commit,
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'escala': args.escala,
+        'tamanhos': tamanhos,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'plataforma': platform.platform(),
+        'resultados': {}
+    }
+
+    pasta = tempfile.mkdtemp(prefix='bench_')
+    try:
+        for nome in nomes:
+            print(f"Executando {nome}...", flush=True)
+            medicao = medir(nome, tamanhos, pasta, args.repeticoes)
+            resultado['resultados'][nome] = medicao
+            print(f"  mediana {medicao['mediana_s']:.4f}s, {medicao['linhas_por_s']:,.0f} linhas/s")
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    saida = args.saida or os.path.join(
+        PASTA_RESULTADOS, f"{commit or 'sem_commit'}_{args.escala}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(saida) or '.', exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados gravados em '{saida}'.")
+
+    if args.comparar and comparar(resultado, args.comparar, args.tolerancia):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()